@@ -1,10 +1,21 @@
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-from modules.data_loader import load_data
-from modules.calculations import calculate_price_changes
+import uuid
+from modules.data_loader import load_price_source, load_commodity_list, commodity_list_version, select_data_version
+from modules.calculations import calculate_store_price_changes, summarize_selection, PERCENT_COLUMNS
+from modules.catalog import build_catalog
 from modules.styling import configure_page_style, style_dataframe, display_market_metrics
+from modules.cache import cache_stats, SHOW_CACHE_STATS
+from modules.startup import lazy_import, timed, startup_timings
+from modules.prefetch import get_prefetcher
+from modules.trading_calendar import build_trading_calendar
+from modules.table_view import table_page, TABLE_PAGE_SIZE
+from modules.screening import screen_snapshot, DEFAULT_SIGMA
+from modules.risk import risk_snapshot, DEFAULT_BENCHMARK, BETA_WINDOW
+
+# Plotly is imported when the first chart is drawn, not before the page can render
+go = lazy_import("plotly.graph_objects")
+subplots = lazy_import("plotly.subplots")
 
 # --- PAGE CONFIGURATION ---
 st.set_page_config(
@@ -17,6 +28,196 @@ st.set_page_config(
 configure_page_style()
 
 
+# --- PAGE SECTIONS ---
+@st.fragment
+def render_screening_alerts(store, df_list, selected_date, commodities):
+    """
+    Screening matches (new 52W highs/lows, N-sigma daily moves, MA50/MA200 crosses) on the
+    selected date for the commodities in the current filters. The sigma slider reruns only this section.
+    """
+    with st.expander("Screening alerts"):
+        sigma = st.slider("Daily move threshold (sigma)", min_value=1.0, max_value=4.0, value=DEFAULT_SIGMA, step=0.5, key="screen_sigma")
+        matches = screen_snapshot(store, store.version, df_list, selected_date, sigma)
+        matches = matches[matches['Commodities'].isin(commodities)]
+        if matches.empty:
+            st.caption("No commodity matches a screening rule on this date.")
+            return
+        st.caption(" · ".join(f"{rule}: {count}" for rule, count in matches['Rule'].value_counts(sort=False).items()))
+        st.dataframe(
+            matches.drop(columns='Date'),
+            column_config={
+                'Current Price': st.column_config.NumberColumn(format="%,.0f"),
+                '%Day': st.column_config.NumberColumn(format="percent"),
+                'Day Z': st.column_config.NumberColumn(format="%.1f"),
+                'MA50': st.column_config.NumberColumn(format="%,.0f"),
+                'MA200': st.column_config.NumberColumn(format="%,.0f"),
+            },
+            hide_index=True,
+            use_container_width=True
+        )
+
+
+@st.fragment
+def render_price_table(filtered_df, store, selected_date):
+    """
+    Detailed price table. Up to `TABLE_PAGE_SIZE` rows it is shown whole; larger selections are
+    searched, sorted and paged on the server, and only the visible page is styled and sent.
+    Optional risk columns (rolling volatility, drawdown, beta) come from the cached risk panel.
+    Runs as a fragment, so paging, sorting or the risk options don't rerun the rest of the page.
+    """
+    risk_col, benchmark_col = st.columns([1, 2])
+    with risk_col:
+        show_risk = st.checkbox("Show risk columns", value=False, key="table_risk")
+    if show_risk:
+        names = list(store.names)
+        with benchmark_col:
+            benchmark = st.selectbox(
+                "Beta benchmark",
+                options=names,
+                index=names.index(DEFAULT_BENCHMARK) if DEFAULT_BENCHMARK in names else 0,
+                key="risk_benchmark"
+            )
+        risk = risk_snapshot(store, store.version, selected_date, benchmark)
+        # Joined into a new frame: the snapshot and the risk table are shared between sessions
+        filtered_df = filtered_df.join(risk, on='Commodities')
+        st.caption(
+            f"Vol: annualized volatility of daily returns over 20 and 60 trading days and one year. "
+            f"Drawdown: below the running peak; Max DD: deepest since the start of the history, with days "
+            f"from the peak to its recovery (or to the selected date). Beta: {BETA_WINDOW} daily-return beta vs {benchmark}."
+        )
+
+    table_df = filtered_df
+    if len(filtered_df) > TABLE_PAGE_SIZE:
+        search_col, sort_col, order_col, page_col = st.columns([3, 2, 2, 1])
+        with search_col:
+            query = st.text_input("Search", placeholder="Commodity, sector or nation", key="table_query")
+        with sort_col:
+            sort_by = st.selectbox("Sort by", options=list(filtered_df.columns), key="table_sort")
+        with order_col:
+            order = st.selectbox("Order", options=["Ascending", "Descending"], key="table_order")
+        with page_col:
+            page = st.number_input("Page", min_value=1, value=1, step=1, key="table_page")
+
+        table_df, matching_rows, page_count = table_page(
+            filtered_df, sort_by, order == "Ascending", query, page, TABLE_PAGE_SIZE
+        )
+        page = min(page, page_count)
+        first_row = (page - 1) * TABLE_PAGE_SIZE
+        st.caption(f"Rows {min(first_row + 1, matching_rows):,}–{first_row + len(table_df):,} of {matching_rows:,} · page {page} of {page_count}")
+        if table_df.empty:
+            st.info("No rows match the search.")
+            return
+
+    # Hàm style_dataframe giờ đã bao gồm cả việc ẩn index và set width 100%
+    styled_df_object = style_dataframe(table_df)
+
+    # Tạo bảng HTML
+    html_table = styled_df_object.to_html()
+
+    # Bọc bảng HTML vào một div có chiều cao cố định và thanh cuộn
+    scrollable_container = f"""
+    <div style="height: 500px; overflow-y: auto; width: 100%;">
+        {html_table}
+    </div>
+    """
+    st.markdown(scrollable_container, unsafe_allow_html=True)
+
+
+@st.fragment
+def render_performance_chart(filtered_df, summary):
+    """
+    Performance bar chart with its dropdown. Runs as a fragment: switching the chart reruns
+    only this function, not the data loading, metric cards and table around it.
+    """
+    if not filtered_df.empty:
+        # Dropdown to select chart type
+        chart_options = {
+            "Weekly Performance": "%Week",
+            "Daily Performance": "%Day",
+            "Monthly Performance": "%Month",
+            "Quarterly Performance": "%Quarter",
+            "YTD Performance": "%YTD"
+        }
+        selected_chart_label = st.selectbox(
+            "Select Chart to Display",
+            options=list(chart_options.keys())
+        )
+
+        selected_column = chart_options[selected_chart_label]
+
+        if selected_column in filtered_df.columns:
+            # Rows with a non-zero change, already sorted DESCENDING in the cached summary
+            chart_rows = summary['chart_order'][selected_column]
+
+            if len(chart_rows) > 0:
+                chart_names = summary['names'][chart_rows]
+                chart_values = summary['values'][chart_rows, PERCENT_COLUMNS.index(selected_column)]
+
+                # --- Create a single figure with two subplots (columns) ---
+                fig = subplots.make_subplots(
+                    rows=1, cols=2,
+                    shared_yaxes=True,
+                    column_widths=[0.8, 0.2],
+                    horizontal_spacing=0.04
+                )
+
+                # --- Trace 1: Performance Bars ---
+                # KEY CHANGE: Apply new color scheme
+                fig.add_trace(go.Bar(
+                    y=chart_names,
+                    x=chart_values,
+                    orientation='h',
+                    marker_color=summary['colors'][selected_column][chart_rows],
+                    text=summary['labels'][selected_column][chart_rows],
+                    textposition='outside',
+                    hoverinfo='none',
+                    showlegend=False
+                ), row=1, col=1)
+
+                # --- Trace 2: Impact Text ---
+                fig.add_trace(go.Scatter(
+                    y=chart_names,
+                    x=[-5] * len(chart_rows),
+                    mode='text',
+                    text=summary['impact'][chart_rows],
+                    textposition="middle left",
+                    textfont=dict(size=11, color='#333'),
+                    hoverinfo='none',
+                    showlegend=False
+                ), row=1, col=2)
+
+                # --- General Layout Updates ---
+                chart_height = max(200, len(chart_rows) * 20)
+                fig.update_layout(
+                    template="plotly_white",
+                    height=chart_height,
+                    margin=dict(l=20, r=20, t=50, b=20),
+                    font=dict(family="Manrope, sans-serif"),
+                    # --- Main Title ---
+                    title=dict(
+                        text=f"<b>{selected_chart_label}</b>",
+                        x=0.35,
+                        xanchor='center',
+                        y=0.98
+                    )
+                )
+
+                # --- Axis Updates ---
+                fig.update_yaxes(autorange="reversed", showticklabels=True, row=1, col=1)
+                fig.update_yaxes(showticklabels=False, showgrid=False, zeroline=False, row=1, col=2)
+                fig.update_xaxes(title_text="Change", tickformat=".0%", row=1, col=1)
+                fig.update_xaxes(visible=False, showgrid=False, zeroline=False, row=1, col=2)
+
+                st.plotly_chart(fig, use_container_width=True)
+
+            else:
+                st.info(f"No data available for '{selected_chart_label}' with the selected filters (after removing 0% changes).")
+        else:
+             st.warning(f"Could not generate chart. The required data column '{selected_column}' is missing.")
+    else:
+        st.warning("No data to display in the chart with the current filters.")
+
+
 # --- HEADER ---
 st.markdown("""
     <h1 style='
@@ -31,15 +232,20 @@ st.markdown("""
 
 
 # --- DATA LOADING (with caching) ---
-df_data, df_list = load_data()
+# "Latest", or an earlier recorded data version for point-in-time snapshots
+as_of = select_data_version()
+# The first run in a process records these stages in the cold-start breakdown
+with timed("load price data"):
+    store = load_price_source(as_of)
+with timed("load commodity list"):
+    df_list = load_commodity_list()
 
 # --- SIDEBAR FILTERS ---
 st.sidebar.header("Filter Options")
 
-if df_data is not None and df_list is not None:
+if store is not None and df_list is not None:
     # Date Selector
-    min_date = df_data['Date'].min()
-    max_date = df_data['Date'].max()
+    min_date, max_date = store.date_bounds()
     selected_date = st.sidebar.date_input(
         "Select Date",
         value=max_date,
@@ -48,44 +254,56 @@ if df_data is not None and df_list is not None:
     )
 
     # Sector Filter
-    unique_sectors = sorted(df_list['Sector'].astype(str).unique())
+    catalog = build_catalog(df_list)
     selected_sectors = st.sidebar.multiselect(
         "Filter by Sector",
-        options=unique_sectors,
+        options=catalog.sectors,
         default=[]
     )
 
     # Commodity Filter
-    if selected_sectors:
-        commodity_options = sorted(df_list[df_list['Sector'].isin(selected_sectors)]['Commodities'].astype(str).unique())
-    else:
-        commodity_options = sorted(df_list['Commodities'].astype(str).unique())
-    
     selected_commodities = st.sidebar.multiselect(
         "Filter by Commodity",
-        options=commodity_options,
+        options=catalog.commodity_options(selected_sectors),
         default=[]
     )
     
     # --- DATA CALCULATION ---
-    analysis_df = calculate_price_changes(df_data, df_list, selected_date)
+    analysis_df = calculate_store_price_changes(store, store.version, df_list, selected_date)
+
+    # Warm the cache in the background for the dates this session is likely to open next
+    prefetch_owner = st.session_state.setdefault('prefetch_owner', uuid.uuid4().hex)
+    get_prefetcher().schedule(prefetch_owner, store, df_list, selected_date, build_trading_calendar(store, store.version))
 
     # --- MAIN CONTENT ---
     
 
     if not analysis_df.empty:
         # --- Filter Data based on selection ---
-        filtered_df = analysis_df.copy()
-        
-        if selected_sectors:
-            filtered_df = filtered_df[filtered_df['Sector'].isin(selected_sectors)]
-            
-        if selected_commodities:
-            filtered_df = filtered_df[filtered_df['Commodities'].isin(selected_commodities)]
+        # The cached snapshot is shared by all sessions: filter into a new frame, never modify it
+        row_codes = catalog.codes_for(analysis_df['Commodities'])
+        row_mask = catalog.filter_mask(row_codes, selected_sectors, selected_commodities)
+        filtered_df = analysis_df if row_mask.all() else analysis_df[row_mask]
+
+        # Card metrics, top movers and bar-chart arrays for this selection, computed once and reused
+        # by every rerun that keeps the same date and filters
+        # Sectors and impact come from the commodity list, which the price data version doesn't cover under SQLite
+        selection_key = (store.version, commodity_list_version(), str(selected_date), tuple(selected_sectors), tuple(selected_commodities))
+        summary = summarize_selection(filtered_df, selection_key)
 
         # --- Display Key Market Metrics ---
        
-        display_market_metrics(filtered_df)
+        display_market_metrics(filtered_df, summary['metrics'])
+        if not filtered_df.empty:
+            with st.expander("Top movers by sector (weekly)"):
+                top_movers = summary['top_movers']
+                st.dataframe(
+                    top_movers[top_movers['Period'] == '%Week'].drop(columns='Period'),
+                    column_config={'Change': st.column_config.NumberColumn(format="percent")},
+                    hide_index=True,
+                    use_container_width=True
+                )
+            render_screening_alerts(store, df_list, selected_date, filtered_df['Commodities'])
         
 
         # --- Display Data Table ---
@@ -102,22 +320,9 @@ if df_data is not None and df_list is not None:
         """, unsafe_allow_html=True)
         
         if not filtered_df.empty:
-            display_table = filtered_df.copy()
-            # Hàm style_dataframe giờ đã bao gồm cả việc ẩn index và set width 100%
-            styled_df_object = style_dataframe(display_table)
-            
-            # Tạo bảng HTML
-            html_table = styled_df_object.to_html()
-
-            # Bọc bảng HTML vào một div có chiều cao cố định và thanh cuộn
-            scrollable_container = f"""
-            <div style="height: 500px; overflow-y: auto; width: 100%;">
-                {html_table}
-            
-            """
+            render_price_table(filtered_df, store, selected_date)
         else:
             st.warning("No data matches your filter criteria.")
-        st.markdown(scrollable_container, unsafe_allow_html=True)
 
         # --- DYNAMIC BAR CHART SECTION (using Plotly) ---
         st.markdown("""
@@ -132,101 +337,27 @@ if df_data is not None and df_list is not None:
         """, unsafe_allow_html=True)
        
 
-        if not filtered_df.empty:
-            # Dropdown to select chart type
-            chart_options = {
-                "Weekly Performance": "%Week",
-                "Daily Performance": "%Day",
-                "Monthly Performance": "%Month",
-                "Quarterly Performance": "%Quarter",
-                "YTD Performance": "%YTD"
-            }
-            selected_chart_label = st.selectbox(
-                "Select Chart to Display",
-                options=list(chart_options.keys())
-            )
-            
-            selected_column = chart_options[selected_chart_label]
-
-            if selected_column in filtered_df.columns:
-                chart_data = filtered_df[['Commodities', selected_column, 'Impact']].copy()
-                chart_data.dropna(subset=[selected_column], inplace=True)
-                
-                # Filter out commodities with 0% change
-                chart_data = chart_data[chart_data[selected_column] != 0]
-                
-                if not chart_data.empty:
-                    # Sort DESCENDING to have positive values first
-                    chart_data = chart_data.sort_values(by=selected_column, ascending=False)
-                    
-                    # --- Create a single figure with two subplots (columns) ---
-                    fig = make_subplots(
-                        rows=1, cols=2,
-                        shared_yaxes=True,
-                        column_widths=[0.8, 0.2],
-                        horizontal_spacing=0.04
-                    )
-
-                    # --- Trace 1: Performance Bars ---
-                    # KEY CHANGE: Apply new color scheme
-                    colors = ['#10b981' if val > 0 else '#e11d48' for val in chart_data[selected_column]]
-                    fig.add_trace(go.Bar(
-                        y=chart_data['Commodities'],
-                        x=chart_data[selected_column],
-                        orientation='h',
-                        marker_color=colors,
-                        text=chart_data[selected_column].apply(lambda x: f'{x:.1%}'),
-                        textposition='outside',
-                        hoverinfo='none',
-                        showlegend=False
-                    ), row=1, col=1)
-
-                    # --- Trace 2: Impact Text ---
-                    fig.add_trace(go.Scatter(
-                        y=chart_data['Commodities'],
-                        x=[-5] * len(chart_data),
-                        mode='text',
-                        text=chart_data['Impact'].fillna(''),
-                        textposition="middle left",
-                        textfont=dict(size=11, color='#333'),
-                        hoverinfo='none',
-                        showlegend=False
-                    ), row=1, col=2)
-                    
-                    # --- General Layout Updates ---
-                    chart_height = max(200, len(chart_data) * 20)
-                    fig.update_layout(
-                        template="plotly_white",
-                        height=chart_height,
-                        margin=dict(l=20, r=20, t=50, b=20),
-                        font=dict(family="Manrope, sans-serif"),
-                        # --- Main Title ---
-                        title=dict(
-                            text=f"<b>{selected_chart_label}</b>",
-                            x=0.35,
-                            xanchor='center',
-                            y=0.98
-                        )
-                    )
-
-                    # --- Axis Updates ---
-                    fig.update_yaxes(autorange="reversed", showticklabels=True, row=1, col=1)
-                    fig.update_yaxes(showticklabels=False, showgrid=False, zeroline=False, row=1, col=2)
-                    fig.update_xaxes(title_text="Change", tickformat=".0%", row=1, col=1)
-                    fig.update_xaxes(visible=False, showgrid=False, zeroline=False, row=1, col=2)
-
-                    st.plotly_chart(fig, use_container_width=True)
-
-                else:
-                    st.info(f"No data available for '{selected_chart_label}' with the selected filters (after removing 0% changes).")
-            else:
-                 st.warning(f"Could not generate chart. The required data column '{selected_column}' is missing.")
-        else:
-            st.warning("No data to display in the chart with the current filters.")
-        st.markdown('</div>', unsafe_allow_html=True)
+        # Only this section reruns when the chart dropdown changes
+        render_performance_chart(filtered_df, summary)
 
 else:
     st.error("Failed to load data files. Please check the 'data' directory.")
 
+# --- CACHE STATISTICS (COMMO_CACHE_STATS=1) ---
+if SHOW_CACHE_STATS:
+    with st.sidebar.expander("Cache statistics"):
+        stats = cache_stats()
+        st.caption(f"{stats['entries']} entries, {stats['bytes'] / 1024 ** 2:.1f} of {stats['max_bytes'] / 1024 ** 2:.0f} MB")
+        st.dataframe(pd.DataFrame.from_dict(stats['namespaces'], orient='index'), use_container_width=True)
+    with st.sidebar.expander("Cold-start breakdown"):
+        timings = startup_timings()
+        st.caption(f"{timings['Seconds'].sum():.2f}s spent in first-time stages of this server process")
+        st.dataframe(
+            timings,
+            column_config={'Seconds': st.column_config.NumberColumn(format="%.3f"), 'Share': st.column_config.NumberColumn(format="percent")},
+            hide_index=True,
+            use_container_width=True
+        )
+
 
 
@@ -0,0 +1,227 @@
+"""
+Headless command-line tools for the Commodity Dashboard.
+
+Run from the project root (the same directory used for `streamlit run Home.py`):
+
+    python cli.py export --start 2025-08-01 --formats csv html --per-sector
+    python cli.py db-import
+    python cli.py ingest --chunksize 500000
+    python cli.py versions
+    python cli.py screen --start 2025-08-01 --sigma 2.5
+    python cli.py loadtest --sessions 8 --iterations 2 --max-p95 2000
+    python cli.py serve -- --server.port 8501
+"""
+import argparse
+import os
+import sys
+
+
+def _run_export(args):
+    from modules.export import export_snapshots
+
+    summary = export_snapshots(
+        dates=args.dates,
+        start=args.start,
+        end=args.end,
+        sectors=args.sectors,
+        per_sector=args.per_sector,
+        formats=args.formats,
+        output_dir=args.output_dir,
+        workers=args.workers,
+        force=args.force,
+    )
+    print(f"Done: {summary['written']} date(s) written, {summary['skipped']} skipped.")
+
+
+def _run_db_import(args):
+    from modules.data_loader import DATA_PATH, VERSIONING
+    from modules.database import import_csv, DB_PATH, DatabasePriceStore
+
+    csv_path = args.csv or DATA_PATH
+    db_path = args.db or DB_PATH
+    total = import_csv(csv_path, db_path, chunksize=args.chunksize)
+    print(f"Done: {total:,} rows upserted into {db_path}.")
+    if VERSIONING and not args.no_version:
+        _record_version(DatabasePriceStore(db_path).to_frame(), source=db_path)
+
+
+def _record_version(df, source, fingerprint=None):
+    from modules.data_loader import record_data_version
+
+    try:
+        entry = record_data_version(df, source=source, fingerprint=fingerprint)
+    except OSError as e:
+        print(f"Data version not recorded: {e}")
+        return
+    if entry is None:
+        print("Data unchanged since the last recorded version.")
+    else:
+        print(f"Recorded data version {entry['version']}: +{entry['inserted']} ~{entry['changed']} -{entry['deleted']} rows.")
+
+
+def _run_ingest(args):
+    import time
+    import numpy as np
+    from modules.data_loader import DATA_PATH, PRICE_DTYPE, stream_price_store, file_fingerprint, VERSIONING
+
+    csv_path = args.csv or DATA_PATH
+
+    def report(rows, bytes_read, total_bytes):
+        print(f"{rows:,} rows read ({bytes_read / max(total_bytes, 1):.0%} of {total_bytes / 1024 ** 2:,.1f} MB)...")
+
+    started = time.perf_counter()
+    store = stream_price_store(csv_path, chunksize=args.chunksize, price_dtype=args.price_dtype or PRICE_DTYPE, progress=report)
+    first, last = store.date_bounds()
+    print(f"Done: {len(store):,} rows, {len(store.names)} commodities, {first:%Y-%m-%d} to {last:%Y-%m-%d}, "
+          f"{store.nbytes / 1024 ** 2:,.1f} MB in memory, {time.perf_counter() - started:.1f}s.")
+    if args.no_version or not VERSIONING:
+        return
+    if store.prices.dtype != np.float64:
+        print("Data version not recorded: versions keep exact float64 prices.")
+        return
+    _record_version(store.to_frame(), source=csv_path, fingerprint=file_fingerprint(csv_path))
+
+
+def _run_versions(args):
+    from modules.versions import VersionLog
+
+    log = VersionLog()
+    versions = log.versions()
+    if versions.empty:
+        print(f"No data versions recorded in {log.path}.")
+        return
+    versions['Created'] = versions['Created'].dt.strftime('%Y-%m-%d %H:%M:%S')
+    print(versions.drop(columns='Fingerprint').to_string(index=False))
+
+
+def _run_screen(args):
+    from modules.data_loader import load_price_source, load_commodity_list
+    from modules.screening import screen_range, SCREEN_RULES, DEFAULT_SIGMA
+
+    unknown = set(args.rules or []) - set(SCREEN_RULES)
+    if unknown:
+        raise ValueError(f"Unknown rule(s): {', '.join(sorted(unknown))}. Choose from: {', '.join(SCREEN_RULES)}")
+    store = load_price_source()
+    df_list = load_commodity_list()
+    if store is None or df_list is None:
+        raise FileNotFoundError("price data or Commo_list.csv not found")
+    last_date = store.date_bounds()[1]
+    start = args.start or args.end or last_date
+    end = args.end or (last_date if args.start else start)
+    sigma = DEFAULT_SIGMA if args.sigma is None else args.sigma
+    matches = screen_range(store, df_list, start, end, sigma=sigma, rules=args.rules)
+    if args.output:
+        matches.to_csv(args.output, index=False)
+        print(f"Done: {len(matches)} match(es) written to {args.output}.")
+    elif matches.empty:
+        print("No matches.")
+    else:
+        print(matches.to_string(index=False))
+
+
+def _run_loadtest(args):
+    from modules.loadtest import run_load_test, format_report
+
+    report = run_load_test(scenarios=args.scenarios, sessions=args.sessions, iterations=args.iterations, timeout=args.timeout, seed=args.seed,
+                           project_dir=os.path.dirname(os.path.abspath(__file__)), warm=not args.cold, url=args.url)
+    print(format_report(report))
+    if args.output:
+        report['reruns'].to_csv(args.output, index=False)
+        print(f"Rerun timings written to {args.output}.")
+    if report['errors']:
+        raise ValueError(f"{report['errors']} rerun(s) raised an exception")
+    p95 = report['latency'].loc['all', 'p95']
+    if args.max_p95 is not None and p95 > args.max_p95:
+        raise ValueError(f"p95 rerun latency {p95:,.0f} ms is above the {args.max_p95:,.0f} ms budget")
+
+
+def _run_serve(args):
+    from modules.startup import warm_up, format_timings
+
+    # Warm the caches in this process, then start the server in it, so the first visitor finds them ready
+    if not args.no_warm_up:
+        warm_up()
+        print(format_timings())
+    from streamlit.web import cli as streamlit_cli
+
+    streamlit_args = [arg for arg in args.streamlit_args if arg != "--"]
+    sys.argv = ["streamlit", "run", os.path.join(os.path.dirname(os.path.abspath(__file__)), "Home.py"), *streamlit_args]
+    streamlit_cli.main()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Commodity Dashboard command-line tools.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export = subparsers.add_parser("export", help="Precompute and export Home page snapshots.")
+    export.add_argument("--dates", nargs="+", help="Explicit dates to export (YYYY-MM-DD).")
+    export.add_argument("--start", help="First date of the range to export (default: latest date).")
+    export.add_argument("--end", help="Last date of the range to export (default: latest date).")
+    export.add_argument("--sectors", nargs="+", default=[], help="Extra sector filters, in addition to 'All'.")
+    export.add_argument("--per-sector", action="store_true", help="Also export one snapshot per sector.")
+    export.add_argument("--formats", nargs="+", default=["csv"], choices=["csv", "parquet", "html"])
+    export.add_argument("--output-dir", default="exports")
+    export.add_argument("--workers", type=int, default=None, help="Process pool size (default: CPU count).")
+    export.add_argument("--force", action="store_true", help="Rewrite outputs even if they are up to date.")
+    export.set_defaults(func=_run_export)
+
+    db_import = subparsers.add_parser("db-import", help="Import/upsert a price CSV into the SQLite price database.")
+    db_import.add_argument("--csv", help="CSV to import (default: data/Data.csv).")
+    db_import.add_argument("--db", help="Database file (default: COMMO_DB_PATH or data/prices.sqlite).")
+    db_import.add_argument("--chunksize", type=int, default=200_000)
+    db_import.add_argument("--no-version", action="store_true", help="Do not record the imported data as a new data version.")
+    db_import.set_defaults(func=_run_db_import)
+
+    ingest = subparsers.add_parser("ingest", help="Stream a price CSV into the compact in-memory store and report its size.")
+    ingest.add_argument("--csv", help="CSV to read (default: data/Data.csv).")
+    ingest.add_argument("--chunksize", type=int, default=200_000)
+    ingest.add_argument("--price-dtype", choices=["float64", "float32"], help="Price precision (default: COMMO_PRICE_DTYPE or float64).")
+    ingest.add_argument("--no-version", action="store_true", help="Do not record the data as a new data version.")
+    ingest.set_defaults(func=_run_ingest)
+
+    versions = subparsers.add_parser("versions", help="List the recorded data versions (point-in-time snapshots).")
+    versions.set_defaults(func=_run_versions)
+
+    # Defaults and rule names are resolved in _run_screen, so building the parser doesn't import pandas
+    screen = subparsers.add_parser("screen", help="Screen all commodities for 52W highs/lows, sigma moves and MA crosses.")
+    screen.add_argument("--start", help="First date to screen (default: latest date).")
+    screen.add_argument("--end", help="Last date to screen (default: latest date, or --start alone).")
+    screen.add_argument("--sigma", type=float, help="Threshold for 'Daily move above N sigma' (default: 2.0).")
+    screen.add_argument("--rules", nargs="+", metavar="RULE", help="Rules to evaluate, by name (default: all).")
+    screen.add_argument("--output", help="Write matches to this CSV instead of printing them.")
+    screen.set_defaults(func=_run_screen)
+
+    loadtest = subparsers.add_parser("loadtest", help="Replay interaction scripts in concurrent simulated sessions and report rerun latency.")
+    loadtest.add_argument("--sessions", type=int, default=4, help="Concurrent simulated sessions.")
+    loadtest.add_argument("--iterations", type=int, default=1, help="Times each session replays its script.")
+    # Scenario names are checked by run_load_test, so building the parser doesn't import the harness
+    loadtest.add_argument("--scenarios", nargs="+", metavar="SCENARIO",
+                          help="Scripts to replay (date_scrub, sector_filter, add_commodities, chart_options), assigned to sessions round-robin (default: all).")
+    loadtest.add_argument("--timeout", type=float, default=120, help="Seconds a single rerun may take before failing.")
+    loadtest.add_argument("--seed", type=int, default=0, help="Seed for the random choices in the scripts.")
+    loadtest.add_argument("--url", help="Load an already running server (e.g. http://localhost:8501) instead of starting one.")
+    loadtest.add_argument("--cold", action="store_true", help="Start the server without warming it up; measure cold-cache reruns.")
+    loadtest.add_argument("--max-p95", type=float, help="Fail (exit code 1) if the overall p95 rerun latency in ms is above this.")
+    loadtest.add_argument("--output", help="Write every timed rerun to this CSV.")
+    loadtest.set_defaults(func=_run_loadtest)
+
+    serve = subparsers.add_parser("serve", help="Warm up the data and caches, then start the Streamlit server in the same process.")
+    serve.add_argument("--no-warm-up", action="store_true", help="Start the server without pre-loading anything.")
+    serve.add_argument("streamlit_args", nargs=argparse.REMAINDER, help="Options passed on to 'streamlit run' (after --).")
+    serve.set_defaults(func=_run_serve)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        args.func(args)
+    except (ValueError, FileNotFoundError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+import threading
+import pandas as pd
+import numpy as np
+from modules.cache import bounded_cache, VERSIONS_IN_MEMORY
+
+# Pyramid levels above the daily closes: level -> pandas period frequency
+LEVELS = {'W': 'W-FRI', 'M': 'M'}
+RESOLUTION_LABELS = {'D': 'Daily', 'W': 'Weekly', 'M': 'Monthly'}
+_AVERAGE_DAYS = {'D': 1.0, 'W': 7.0, 'M': 30.44}
+
+BAR_COLUMNS = ['Commodities', 'Date', 'Open', 'High', 'Low', 'Close', 'First Date', 'Last Date']
+
+
+def aggregate_ohlc(df, level):
+    """
+    Aggregates daily Date/Commodities/Price[/Volume] rows into OHLC bars for `level` ('W' or 'M').
+    Each bar is dated at the end of its period; 'First Date'/'Last Date' are the first and last
+    daily rows it covers.
+    """
+    ordered = df.sort_values(['Commodities', 'Date'], kind='stable')
+    period_end = ordered['Date'].dt.to_period(LEVELS[level]).dt.end_time.dt.normalize().rename('Bar Date')
+    grouped = ordered.groupby([ordered['Commodities'], period_end], sort=True)
+
+    bars = grouped['Price'].agg(Open='first', High='max', Low='min', Close='last')
+    bars['First Date'] = grouped['Date'].min()
+    bars['Last Date'] = grouped['Date'].max()
+    if 'Volume' in ordered.columns:
+        bars['Volume'] = grouped['Volume'].sum(min_count=1)
+    bars = bars.reset_index().rename(columns={'Bar Date': 'Date'})
+    return bars[BAR_COLUMNS + (['Volume'] if 'Volume' in bars.columns else [])]
+
+
+def daily_ohlc(df):
+    """Daily closes as degenerate bars (Open = High = Low = Close), so every level has the same columns."""
+    bars = df.rename(columns={'Price': 'Close'})
+    return bars.assign(Open=bars['Close'], High=bars['Close'], Low=bars['Close'], **{'First Date': bars['Date'], 'Last Date': bars['Date']})
+
+
+def choose_resolution(start, end, target_points=400):
+    """
+    Bar size for a date range, given the points the plot can show (`target_points`, roughly the
+    plot width in pixels divided by the pixels per point): the finest level that fits. Ranges of
+    at most `target_points` days are shown as daily closes, ranges of at most `target_points`
+    weeks as weekly bars and longer ranges as monthly bars.
+    """
+    span_days = (pd.Timestamp(end) - pd.Timestamp(start)).days + 1
+    for level in ('D', 'W'):
+        if span_days / _AVERAGE_DAYS[level] <= target_points:
+            return level
+    return 'M'
+
+
+def _merge_bars(bars):
+    """Combines bars of the same commodity and date into one, earlier rows first (for `OHLCPyramid.update`)."""
+    grouped = bars.groupby(['Commodities', 'Date'], sort=True)
+    merged = grouped.agg({'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'First Date': 'min', 'Last Date': 'max'})
+    if 'Volume' in bars.columns:
+        merged['Volume'] = grouped['Volume'].sum(min_count=1)
+    return merged.reset_index()[list(bars.columns)]
+
+
+def _row_hashes(daily):
+    # Order-independent fingerprint terms of daily rows; their (wrapping) sum identifies a commodity's history
+    columns = [col for col in ('Date', 'Price', 'Volume') if col in daily.columns]
+    return pd.util.hash_pandas_object(daily[columns], index=False).to_numpy()
+
+
+class OHLCPyramid:
+    """
+    Weekly and monthly OHLC (+ volume when `Data.csv` has a Volume column) bars per commodity.
+
+    Built from the daily history, then kept current with `update`, which only touches the
+    last bar of each commodity that received new days. Charts read any level without resampling.
+    """
+
+    def __init__(self, daily=None):
+        self.has_volume = daily is not None and 'Volume' in daily.columns
+        self._bars = {level: {} for level in LEVELS}
+        # commodity -> (last Date aggregated, sum of its daily row hashes), to tell appended days from corrections
+        self._history = {}
+        if daily is not None:
+            self.update(daily)
+
+    @classmethod
+    def from_source(cls, source, previous=None, batch_size=32):
+        """
+        Builds the pyramid of a price source (`PriceStore`, `DatabasePriceStore`, ...) reading
+        `batch_size` commodities at a time, so the full history is never held as a single frame.
+        A commodity whose daily rows up to the last day of `previous` are unchanged keeps the bars
+        of `previous` and only has its later days folded in with `update`; any other commodity is
+        aggregated from scratch.
+        """
+        pyramid = cls()
+        names = list(source.names)
+        for first in range(0, len(names), batch_size):
+            daily = source.to_frame(names[first:first + batch_size])
+            pyramid.has_volume |= 'Volume' in daily.columns
+            dates = daily['Date'].to_numpy()
+            hashes = _row_hashes(daily)
+            keep = []
+            for commodity, rows in daily.groupby('Commodities', sort=False).indices.items():
+                if previous is not None and commodity in previous._history:
+                    last_date, digest = previous._history[commodity]
+                    aggregated = dates[rows] <= np.datetime64(last_date)
+                    if hashes[rows[aggregated]].sum() == digest:
+                        # Bar frames are never modified in place, so both pyramids can share them
+                        for level in LEVELS:
+                            pyramid._bars[level][commodity] = previous._bars[level][commodity]
+                        pyramid._history[commodity] = previous._history[commodity]
+                        rows = rows[~aggregated]
+                keep.append(rows)
+            if keep and sum(map(len, keep)):
+                pyramid.update(daily.iloc[np.sort(np.concatenate(keep))])
+        return pyramid
+
+    def bars(self, level, commodities, start=None, end=None):
+        """Bars of `level` for the commodities, keeping every bar that overlaps [start, end]."""
+        frames = []
+        for commodity in commodities:
+            bars = self._bars[level].get(commodity)
+            if bars is None:
+                continue
+            keep = np.ones(len(bars), dtype=bool)
+            if start is not None:
+                keep &= (bars['Last Date'] >= pd.Timestamp(start)).to_numpy()
+            if end is not None:
+                keep &= (bars['First Date'] <= pd.Timestamp(end)).to_numpy()
+            frames.append(bars[keep])
+        if not frames:
+            return pd.DataFrame(columns=BAR_COLUMNS)
+        return pd.concat(frames, ignore_index=True)
+
+    def update(self, new_rows):
+        """
+        Folds newly arrived daily rows into the pyramid. Rows must be later than the last day
+        already aggregated for their commodity; corrected history needs a rebuild.
+        """
+        dates = new_rows['Date'].to_numpy()
+        hashes = _row_hashes(new_rows)
+        groups = new_rows.groupby('Commodities', sort=False).indices
+        for commodity, rows in groups.items():
+            last_date, _ = self._history.get(commodity, (None, None))
+            if last_date is not None and dates[rows].min() <= np.datetime64(last_date):
+                raise ValueError(f"New rows for '{commodity}' overlap existing history; rebuild the pyramid instead.")
+        for commodity, rows in groups.items():
+            _, digest = self._history.get(commodity, (None, np.uint64(0)))
+            self._history[commodity] = (pd.Timestamp(dates[rows].max()), np.add(digest, hashes[rows].sum()))
+        for level in LEVELS:
+            new_bars = aggregate_ohlc(new_rows, level)
+            existing = {commodity: self._bars[level][commodity] for commodity in new_bars['Commodities'].unique()
+                        if len(self._bars[level].get(commodity, ()))}
+            if existing:
+                # Re-aggregating each commodity's last bar with its new bars merges them when the open period continues
+                new_bars = _merge_bars(pd.concat([*(bars.iloc[-1:] for bars in existing.values()), new_bars], ignore_index=True))
+            for commodity, bars in new_bars.groupby('Commodities', sort=False):
+                if commodity in existing:
+                    bars = pd.concat([existing[commodity].iloc[:-1], bars])
+                self._bars[level][commodity] = bars.reset_index(drop=True)
+
+
+_latest_pyramid = None
+_latest_pyramid_lock = threading.Lock()
+
+
+@bounded_cache(max_entries=VERSIONS_IN_MEMORY)
+def build_ohlc_pyramid(_store, store_version):
+    """
+    Builds the `OHLCPyramid` for a price source once per data version. The pyramid of the
+    previously built version is extended with the days added since, instead of re-aggregating
+    every commodity's full history.
+    """
+    global _latest_pyramid
+    with _latest_pyramid_lock:
+        _latest_pyramid = OHLCPyramid.from_source(_store, previous=_latest_pyramid)
+        return _latest_pyramid
@@ -0,0 +1,205 @@
+import os
+import sys
+import time
+import inspect
+import threading
+import functools
+import datetime
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+# Per-process budget shared by every `bounded_cache` function
+CACHE_BUDGET_MB = float(os.environ.get("COMMO_CACHE_MB", "256"))
+CACHE_MAX_ENTRIES = int(os.environ.get("COMMO_CACHE_ENTRIES", "1024"))
+# COMMO_CACHE_STATS=1 shows the statistics in the Home sidebar while tuning the budget
+SHOW_CACHE_STATS = os.environ.get("COMMO_CACHE_STATS", "0") == "1"
+DEFAULT_TTL = 3600
+# Data versions (the current data and recorded as-of versions) whose stores and per-version
+# structures are kept in memory at once
+VERSIONS_IN_MEMORY = 4
+
+
+def estimate_nbytes(value):
+    """
+    Approximate in-memory size of a cached result: frames and arrays by their buffers,
+    containers recursively, objects by their `nbytes` if they report one, else by their
+    attributes, anything else by `sys.getsizeof`.
+    """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(index=True, deep=True) if isinstance(value, pd.Series) else value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            return int(pd.Series(value.ravel()).memory_usage(index=False, deep=True))
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_nbytes(k) + estimate_nbytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(estimate_nbytes(v) for v in value)
+    nbytes = getattr(value, 'nbytes', None)
+    if isinstance(nbytes, (int, np.integer)):
+        return int(nbytes)
+    if hasattr(value, '__dict__') and not callable(value):
+        # Calendars, catalogs, pyramids, cubes and panels: the arrays and frames they hold
+        return sys.getsizeof(value) + estimate_nbytes(vars(value))
+    return sys.getsizeof(value)
+
+
+def _key_part(value):
+    # Hashable stand-in for an argument; frames are keyed by content like `st.cache_data` does
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return (type(value).__name__, value.shape, int(pd.util.hash_pandas_object(value, index=True).sum()))
+    if isinstance(value, np.ndarray):
+        return ('ndarray', value.dtype.str, value.shape, hash(value.tobytes()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_key_part(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _key_part(v)) for k, v in value.items()))
+    if isinstance(value, (datetime.date, np.datetime64)):
+        return pd.Timestamp(value)
+    return value
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache for computed results with an entry limit and a byte budget.
+
+    Entries are keyed by (namespace, key); the least recently used entries of any namespace
+    are evicted first once the budget is exceeded. Values are shared, not copied, so callers
+    must treat them as read-only. Hits, misses, evictions and bytes are counted per namespace.
+    """
+
+    def __init__(self, max_bytes, max_entries=None):
+        self.max_bytes = int(max_bytes)
+        self.max_entries = max_entries
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _counters(self, namespace):
+        return self._stats.setdefault(namespace, {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0, 'oversized': 0})
+
+    def get(self, namespace, key, default=None):
+        """Cached value for `key`, or `default` on a miss (expired entries count as misses)."""
+        with self._lock:
+            counters = self._counters(namespace)
+            entry = self._entries.get((namespace, key))
+            if entry is not None and entry[2] is not None and time.monotonic() > entry[2]:
+                self._remove((namespace, key))
+                counters['expired'] += 1
+                entry = None
+            if entry is None:
+                counters['misses'] += 1
+                return default
+            self._entries.move_to_end((namespace, key))
+            counters['hits'] += 1
+            return entry[0]
+
+    def __contains__(self, namespaced_key):
+        with self._lock:
+            entry = self._entries.get(namespaced_key)
+            return entry is not None and (entry[2] is None or time.monotonic() <= entry[2])
+
+    def put(self, namespace, key, value, ttl=DEFAULT_TTL, max_entries=None):
+        """
+        Stores `value`, then evicts least recently used entries until the limits hold,
+        including at most `max_entries` entries of `namespace` when given.
+        """
+        size = estimate_nbytes(value)
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            if size > self.max_bytes:
+                # Caching it would flush everything else; leave it uncached
+                self._counters(namespace)['oversized'] += 1
+                return value
+            self._remove((namespace, key))
+            self._entries[(namespace, key)] = (value, size, expires)
+            self.nbytes += size
+            if max_entries is not None:
+                own = [k for k in self._entries if k[0] == namespace]
+                for namespaced_key in own[:max(len(own) - max_entries, 0)]:
+                    self._remove(namespaced_key)
+                    self._counters(namespace)['evictions'] += 1
+            while self._entries and (self.nbytes > self.max_bytes or
+                                     (self.max_entries is not None and len(self._entries) > self.max_entries)):
+                (evicted_namespace, _), (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.nbytes -= evicted_size
+                self._counters(evicted_namespace)['evictions'] += 1
+        return value
+
+    def _remove(self, namespaced_key):
+        entry = self._entries.pop(namespaced_key, None)
+        if entry is not None:
+            self.nbytes -= entry[1]
+
+    def clear(self, namespace=None):
+        """Drops every entry (or only those of `namespace`); statistics are kept."""
+        with self._lock:
+            for namespaced_key in [k for k in self._entries if namespace is None or k[0] == namespace]:
+                self._remove(namespaced_key)
+
+    def stats(self):
+        """
+        {'entries', 'bytes', 'max_bytes', 'max_entries', 'namespaces': {name: counters}}, where each
+        namespace also reports its current 'entries' and 'bytes'.
+        """
+        with self._lock:
+            namespaces = {name: dict(counters, entries=0, bytes=0) for name, counters in self._stats.items()}
+            for (namespace, _), (_, size, _) in self._entries.items():
+                namespaces[namespace]['entries'] += 1
+                namespaces[namespace]['bytes'] += size
+            return {
+                'entries': len(self._entries),
+                'bytes': self.nbytes,
+                'max_bytes': self.max_bytes,
+                'max_entries': self.max_entries,
+                'namespaces': namespaces,
+            }
+
+
+RESULT_CACHE = ResultCache(CACHE_BUDGET_MB * 1024 ** 2, CACHE_MAX_ENTRIES)
+
+
+def bounded_cache(func=None, *, ttl=DEFAULT_TTL, max_entries=None, cache=None):
+    """
+    Decorator caching a function's results in the shared `RESULT_CACHE`.
+
+    Like `st.cache_data`, parameters whose names start with an underscore are not part of the
+    key, and frames are keyed by their content. Unlike it, results are not copied and are
+    evicted LRU-first when the process budget (COMMO_CACHE_MB / COMMO_CACHE_ENTRIES) is reached,
+    or when the function holds more than `max_entries` results.
+    The wrapper gets `cache_key(*args, **kwargs)` and `clear()` helpers.
+    """
+    if func is None:
+        return functools.partial(bounded_cache, ttl=ttl, max_entries=max_entries, cache=cache)
+
+    signature = inspect.signature(func)
+    namespace = f"{func.__module__}.{func.__qualname__}"
+
+    def cache_key(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        return tuple((name, _key_part(value)) for name, value in bound.arguments.items() if not name.startswith('_'))
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        target = cache or RESULT_CACHE
+        key = cache_key(*args, **kwargs)
+        missing = object()
+        value = target.get(namespace, key, missing)
+        if value is missing:
+            value = target.put(namespace, key, func(*args, **kwargs), ttl=ttl, max_entries=max_entries)
+        return value
+
+    wrapper.cache_key = cache_key
+    wrapper.namespace = namespace
+    wrapper.clear = lambda: (cache or RESULT_CACHE).clear(namespace)
+    return wrapper
+
+
+def cache_stats():
+    """Statistics of the shared result cache (see `ResultCache.stats`)."""
+    return RESULT_CACHE.stats()
@@ -1,62 +1,95 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+from modules.parallel import map_commodities
+from modules.trading_calendar import TradingCalendar, DEFAULT_HORIZONS, build_trading_calendar
+from modules.cache import bounded_cache
 
-@st.cache_data(ttl=3600)
-def calculate_price_changes(df_data, df_list, selected_date):
+def _commodity_metrics(df_snapshot, reference):
     """
-    Calculates price changes and key metrics based on a selected date.
+    Per-commodity part of `calculate_price_changes`: current price, period changes, 52W range and 30D average.
+    `reference` holds the dates from `TradingCalendar.reference_dates`.
+    Each commodity only reads its own rows, so this can be run on commodity shards by `map_commodities`.
     """
-    if df_data is None or df_list is None:
-        return pd.DataFrame()
-
-    # Convert selected_date to Pandas Timestamp for robust comparison
-    selected_date = pd.to_datetime(selected_date)
-
-    # --- Initial Data Snapshot ---
-    df_snapshot = df_data[df_data['Date'] <= selected_date].copy()
-    if df_snapshot.empty:
-        return pd.DataFrame()
+    # Sorted once by (commodity, date): the last row of each group is its price as of a cut-off
+    ordered = df_snapshot.sort_values(by=['Commodities', 'Date'], kind='stable')
+    dates = ordered['Date']
 
     # --- Get Current Price (most recent price on or before selected_date) ---
-    current_data = df_snapshot.sort_values(by=['Commodities', 'Date'], ascending=[True, False])
-    current_data = current_data.drop_duplicates(subset='Commodities', keep='first').set_index('Commodities')
-
-    # --- Calculate Price at different past points ---
-    end_of_last_day = selected_date - pd.DateOffset(days=1)
-    end_of_last_week = selected_date - pd.offsets.Week(weekday=4)
-    end_of_last_month = selected_date - pd.offsets.MonthEnd(1)
-    end_of_last_quarter = selected_date - pd.offsets.QuarterEnd(1)
-    end_of_last_year = selected_date - pd.offsets.YearEnd(1)
+    current_data = ordered.groupby('Commodities').tail(1).set_index('Commodities')
 
     def get_price_at(date_cutoff):
-        past_data = df_snapshot[df_snapshot['Date'] <= date_cutoff]
-        if past_data.empty:
+        if date_cutoff is None:
             return pd.Series(dtype=float)
-        return past_data.sort_values('Date', ascending=False).drop_duplicates(subset='Commodities', keep='first').set_index('Commodities')['Price']
+        return ordered[dates <= date_cutoff].groupby('Commodities')['Price'].last()
 
     # --- Calculate Percentage Changes ---
-    current_data['%Day'] = current_data['Price'].div(get_price_at(end_of_last_day)).subtract(1)
-    current_data['%Week'] = current_data['Price'].div(get_price_at(end_of_last_week)).subtract(1)
-    current_data['%Month'] = current_data['Price'].div(get_price_at(end_of_last_month)).subtract(1)
-    current_data['%Quarter'] = current_data['Price'].div(get_price_at(end_of_last_quarter)).subtract(1)
-    current_data['%YTD'] = current_data['Price'].div(get_price_at(end_of_last_year)).subtract(1)
+    for name, base_date in reference['horizons'].items():
+        current_data['%' + name] = current_data['Price'].div(get_price_at(base_date)).subtract(1)
 
     # --- Calculate New Metrics ---
-    fifty_two_weeks_ago = selected_date - pd.DateOffset(weeks=52)
-    df_52w = df_snapshot[df_snapshot['Date'] >= fifty_two_weeks_ago]
+    df_52w = ordered[dates >= reference['windows']['52W']]
     stats_52w = df_52w.groupby('Commodities')['Price'].agg(['max', 'min']).rename(columns={'max': '52W High', 'min': '52W Low'})
 
-    thirty_days_ago = selected_date - pd.DateOffset(days=30)
-    df_30d = df_snapshot[df_snapshot['Date'] >= thirty_days_ago]
+    df_30d = ordered[dates >= reference['windows']['30D']]
     avg_30d = df_30d.groupby('Commodities')['Price'].mean().rename('30D Avg')
-    
+
+    current_data.rename(columns={'Price': 'Current Price'}, inplace=True)
+    return current_data.join(stats_52w, how='left').join(avg_30d, how='left')
+
+def history_start(selected_date, calendar, horizons=DEFAULT_HORIZONS):
+    """
+    Earliest date `calculate_price_changes` reads for `selected_date` (besides each commodity's
+    last price before it). Used to load only the history window a snapshot needs.
+    """
+    position = calendar.position_of(pd.to_datetime(selected_date))
+    if position < 0:
+        return None
+    reference = calendar.reference_dates(position, horizons)
+    dates = [d for group in reference.values() for d in group.values() if d is not None]
+    return min(dates) if dates else None
+
+def compute_price_changes(df_data, df_list, selected_date, backend=None, workers=None,
+                          calendar=None, horizons=DEFAULT_HORIZONS):
+    """
+    Calculates price changes and key metrics based on a selected date.
+
+    Reference dates come from a `TradingCalendar` (built from `df_data` if not given): the
+    selected date is moved back to the last trading day, '%Day' compares with the previous
+    trading day, and '%Week'/'%Month'/'%Quarter'/'%YTD' with the last trading day of the
+    previous week/month/quarter/year. Extra horizons (e.g. '3Y', '5Y') add '%3Y'-style columns.
+    `backend`/`workers` choose how the per-commodity work is executed (see `modules.parallel`);
+    every backend returns the same frame.
+    """
+    if df_data is None or df_list is None:
+        return pd.DataFrame()
+
+    # Convert selected_date to Pandas Timestamp for robust comparison
+    selected_date = pd.to_datetime(selected_date)
+
+    if calendar is None:
+        calendar = TradingCalendar(df_data['Date'])
+    position = calendar.position_of(selected_date)
+    if position < 0:
+        return pd.DataFrame()
+
+    # --- Initial Data Snapshot ---
+    # Data sorted by date (as loaded) is cut with a slice, which shares memory instead of copying
+    dates = df_data['Date']
+    if dates.is_monotonic_increasing:
+        df_snapshot = df_data.iloc[:dates.searchsorted(selected_date, side='right')]
+    else:
+        df_snapshot = df_data[dates <= selected_date]
+    if df_snapshot.empty:
+        return pd.DataFrame()
+
+    reference = calendar.reference_dates(position, horizons)
+    current_data = map_commodities(_commodity_metrics, df_snapshot, reference, backend=backend, workers=workers)
+
     current_data['Change type'] = np.where(current_data['%Week'] > 0, 'Positive', np.where(current_data['%Week'] < 0, 'Negative', 'Neutral'))
 
     # --- ROBUST MERGE SECTION ---
-    current_data.rename(columns={'Price': 'Current Price'}, inplace=True)
-    final_df = current_data.join(stats_52w, how='left').join(avg_30d, how='left')
-    final_df.reset_index(inplace=True) # Turn 'Commodities' index into a column
+    final_df = current_data.reset_index() # Turn 'Commodities' index into a column
 
     # Prepare df_list for a clean merge
     list_subset = df_list[['Commodities', 'Sector', 'Nation', 'Impact']].drop_duplicates(subset='Commodities', keep='first').copy()
@@ -71,7 +104,7 @@ def calculate_price_changes(df_data, df_list, selected_date):
     # --- Define and order final columns for display ---
     display_cols = [
         'Commodities', 'Sector', 'Nation', 'Current Price',
-        '%Day', '%Week', '%Month', '%Quarter', '%YTD',
+        *['%' + name for name in horizons],
         '30D Avg', '52W High', '52W Low',
         'Change type', 'Impact'
     ]
@@ -81,3 +114,175 @@ def calculate_price_changes(df_data, df_list, selected_date):
             final_df[col] = np.nan
 
     return final_df[display_cols]
+
+@bounded_cache
+def calculate_price_changes(df_data, df_list, selected_date, backend=None, workers=None):
+    """
+    Cached version of `compute_price_changes` for the pages (shared result, treat as read-only).
+    """
+    return compute_price_changes(df_data, df_list, selected_date, backend=backend, workers=workers)
+
+def compute_store_price_changes(store, df_list, selected_date, calendar):
+    """
+    `compute_price_changes` on a `PriceStore`: only the window from `history_start` to the
+    selected date is materialized.
+    """
+    start = history_start(selected_date, calendar)
+    if start is None:
+        return pd.DataFrame()
+    history = store.window_frame(start, selected_date)
+    return compute_price_changes(history, df_list, selected_date, calendar=calendar)
+
+@bounded_cache
+def calculate_store_price_changes(_store, store_version, df_list, selected_date):
+    """
+    Cached `compute_store_price_changes`. The store itself is not hashed; `store_version` keys the cache.
+
+    The result is one shared object for every session (no per-rerun deserialized copy),
+    so callers must treat it as read-only. It lives in the bounded `RESULT_CACHE`.
+    """
+    calendar = build_trading_calendar(_store, store_version)
+    return compute_store_price_changes(_store, df_list, selected_date, calendar)
+
+PERCENT_COLUMNS = ['%Day', '%Week', '%Month', '%Quarter', '%YTD']
+POSITIVE_COLOR = '#10b981'
+NEGATIVE_COLOR = '#e11d48'
+
+def summarize_snapshot(df, top_n=3):
+    """
+    One vectorized pass over the percent-change columns of a (filtered) snapshot.
+
+    Returns a dict with:
+      - 'metrics': the Key Market Metrics card values (see `compute_market_metrics`)
+      - 'names', 'impact': per-row arrays
+      - 'values': (rows x PERCENT_COLUMNS) float matrix
+      - 'labels', 'colors': per-column arrays of '12.3%' bar labels and bar colors
+      - 'chart_order': per-column row indices of non-zero values, largest first
+      - 'top_movers': top-N gainers and losers per sector for every column
+    Everything the bar chart needs for any dropdown choice is precomputed here.
+    """
+    names = df['Commodities'].to_numpy(dtype=object)
+    impact = df['Impact'].fillna('').to_numpy(dtype=object) if 'Impact' in df.columns else np.full(len(df), '', dtype=object)
+    values = df.reindex(columns=PERCENT_COLUMNS).to_numpy(dtype=float)
+    valid = ~np.isnan(values)
+
+    # Column-wise arg-extremes and means with NaNs masked out (first occurrence wins, like idxmax).
+    # An empty selection has no extremes: every column's count is 0, so its metrics come out as N/A
+    if len(df):
+        best = np.where(valid, values, -np.inf).argmax(axis=0)
+        worst = np.where(valid, values, np.inf).argmin(axis=0)
+    else:
+        best = worst = np.zeros(len(PERCENT_COLUMNS), dtype=int)
+    counts = valid.sum(axis=0)
+    means = np.where(valid, values, 0.0).sum(axis=0) / np.maximum(counts, 1)
+    means = np.where(counts > 0, means, np.nan)
+
+    def extreme(column, rows):
+        j = PERCENT_COLUMNS.index(column)
+        if counts[j] == 0:
+            return None, np.nan
+        return names[rows[j]], values[rows[j], j]
+
+    most_bullish, most_bullish_change = extreme('%Week', best)
+    most_bearish, most_bearish_change = extreme('%Week', worst)
+    monthly_leader, monthly_leader_change = extreme('%Month', best)
+    metrics = {
+        'most_bullish': most_bullish,
+        'most_bullish_change': most_bullish_change,
+        'most_bearish': most_bearish,
+        'most_bearish_change': most_bearish_change,
+        'avg_weekly_change': means[PERCENT_COLUMNS.index('%Week')] if len(df) else 0,
+        'monthly_leader': monthly_leader,
+        'monthly_leader_change': monthly_leader_change,
+    }
+
+    # Bar labels and colors for every column at once
+    label_matrix = np.where(valid, np.char.mod('%.1f%%', np.nan_to_num(values) * 100), '')
+    color_matrix = np.where(values > 0, POSITIVE_COLOR, NEGATIVE_COLOR)
+
+    labels, colors, chart_order = {}, {}, {}
+    for j, column in enumerate(PERCENT_COLUMNS):
+        rows = np.flatnonzero(valid[:, j] & (values[:, j] != 0))
+        chart_order[column] = rows[np.argsort(-values[rows, j], kind='stable')]
+        labels[column] = label_matrix[:, j]
+        colors[column] = color_matrix[:, j]
+
+    return {
+        'metrics': metrics,
+        'names': names,
+        'impact': impact,
+        'values': values,
+        'labels': labels,
+        'colors': colors,
+        'chart_order': chart_order,
+        'top_movers': _top_movers(df, names, values, valid, top_n),
+    }
+
+def _top_movers(df, names, values, valid, top_n):
+    # Rank rows within each sector by sorting on (sector, value) once per column and side
+    columns = ['Period', 'Sector', 'Side', 'Rank', 'Commodities', 'Change']
+    if top_n <= 0 or len(df) == 0 or 'Sector' not in df.columns:
+        return pd.DataFrame(columns=columns)
+    sector_codes, sectors = pd.factorize(df['Sector'].astype(str), sort=True)
+    frames = []
+    for j, column in enumerate(PERCENT_COLUMNS):
+        rows = np.flatnonzero(valid[:, j])
+        for side, sign in (('Gainer', -1), ('Loser', 1)):
+            ordered = rows[np.lexsort((sign * values[rows, j], sector_codes[rows]))]
+            groups = sector_codes[ordered]
+            group_start = np.searchsorted(groups, groups, side='left')
+            rank = np.arange(len(ordered)) - group_start
+            keep = ordered[rank < top_n]
+            frames.append(pd.DataFrame({
+                'Period': column,
+                'Sector': sectors[sector_codes[keep]],
+                'Side': side,
+                'Rank': rank[rank < top_n] + 1,
+                'Commodities': names[keep],
+                'Change': values[keep, j],
+            }))
+    return pd.concat(frames, ignore_index=True)[columns]
+
+@bounded_cache
+def summarize_selection(_df, selection_key, top_n=3):
+    """
+    Cached `summarize_snapshot` for the Home page. `_df` is not hashed: `selection_key`
+    (data version, commodity list version, date and filters) identifies it, so widget changes that don't touch the
+    selection, like the chart dropdown, reuse the stored summary.
+    """
+    return summarize_snapshot(_df, top_n=top_n)
+
+def compute_market_metrics(df):
+    """
+    Computes the values shown on the Key Market Metrics cards.
+    Returns a flat dict so it can be rendered as HTML or written out as a CSV row.
+    """
+    return summarize_snapshot(df, top_n=0)['metrics']
+
+def _performance_metrics(df):
+    # One row per commodity with at least two prices, ordered by commodity name
+    prices = df.sort_values(['Commodities', 'Date']).groupby('Commodities')['Price']
+    stats = prices.agg(['first', 'last', 'min', 'max', 'std', 'count'])
+    return stats[stats['count'] > 1].drop(columns='count')
+
+def calculate_performance_metrics(df, backend=None, workers=None):
+    """
+    Start/end price, % change, range and volatility per commodity over the rows given.
+    Used by the Comparison tab of Chart Analysis.
+    """
+    stats = map_commodities(_performance_metrics, df, backend=backend, workers=workers)
+    stats['change_pct'] = (stats['last'] - stats['first']) / stats['first'] * 100
+    return stats
+
+def _monthly_returns(df):
+    monthly_prices = df.sort_values('Date').set_index('Date').groupby('Commodities')['Price'].resample('ME').last()
+    return monthly_prices.groupby(level='Commodities').pct_change() * 100
+
+def calculate_monthly_returns(df, backend=None, workers=None):
+    """
+    Month-over-month % returns, one column per commodity (month-end index).
+    """
+    monthly_returns = map_commodities(_monthly_returns, df, backend=backend, workers=workers).unstack(level='Commodities')
+    # Unstacking merged shards can infer a month-end `freq` the single-frame path doesn't; keep the index identical
+    monthly_returns.index = pd.DatetimeIndex(monthly_returns.index, freq=None)
+    return monthly_returns
@@ -0,0 +1,92 @@
+import pandas as pd
+import numpy as np
+from modules.cache import bounded_cache, VERSIONS_IN_MEMORY
+
+
+class CommodityCatalog:
+    """
+    Read-only index over `Commo_list.csv` used by the sidebar filters.
+
+    Every commodity gets an integer code (its position in the name-sorted list), and every
+    sector a boolean bitmap over those codes. Option lists are sorted once, and filtering a
+    frame is a bitmap union plus one gather instead of repeated string `isin` scans.
+    """
+
+    def __init__(self, df_list: pd.DataFrame):
+        # A commodity listed more than once belongs to the sector of its first row, the same row
+        # that fills the Sector column of the price tables, so the filters and the tables agree
+        first_rows = df_list.drop_duplicates(subset='Commodities', keep='first')
+        names = first_rows['Commodities'].astype(str)
+        sectors = first_rows['Sector'].astype(str)
+
+        self.commodities = np.array(sorted(names.unique()), dtype=object)
+        self.sectors = sorted(sectors.unique())
+        self._index = pd.Index(self.commodities)
+
+        # Bitmaps carry one extra False slot so unknown commodities (code -1) never match a filter
+        codes = self._index.get_indexer(names)
+        self.sector_codes = {}
+        self._sector_bitmaps = {}
+        for sector in self.sectors:
+            sector_codes = np.unique(codes[(sectors == sector).to_numpy()])
+            bitmap = np.zeros(len(self.commodities) + 1, dtype=bool)
+            bitmap[sector_codes] = True
+            self.sector_codes[sector] = sector_codes
+            self._sector_bitmaps[sector] = bitmap
+
+        self.metadata = {row['Commodities']: row for row in first_rows.to_dict('records')}
+
+        self.all_options = self.commodities.tolist()
+
+    def codes_for(self, names):
+        """Integer codes for a sequence of commodity names; -1 for names not in the catalog."""
+        return self._index.get_indexer(pd.Index(names).astype(str))
+
+    def _sector_bitmap(self, selected_sectors):
+        bitmap = np.zeros(len(self.commodities) + 1, dtype=bool)
+        for sector in selected_sectors:
+            if sector in self._sector_bitmaps:
+                bitmap |= self._sector_bitmaps[sector]
+        return bitmap
+
+    def commodity_options(self, selected_sectors=None):
+        """Sorted commodity names for the sidebar, restricted to the selected sectors if any."""
+        if not selected_sectors:
+            return self.all_options
+        return self.commodities[self._sector_bitmap(selected_sectors)[:-1]].tolist()
+
+    def selection_bitmap(self, selected_sectors=None, selected_commodities=None):
+        """
+        Bitmap over commodity codes (plus the trailing 'unknown' slot) for the current filters,
+        or None when no filter is active.
+        """
+        if not selected_sectors and not selected_commodities:
+            return None
+        bitmap = np.ones(len(self.commodities) + 1, dtype=bool)
+        bitmap[-1] = False
+        if selected_sectors:
+            bitmap &= self._sector_bitmap(selected_sectors)
+        if selected_commodities:
+            chosen = np.zeros_like(bitmap)
+            codes = self.codes_for(selected_commodities)
+            chosen[codes[codes >= 0]] = True
+            bitmap &= chosen
+        return bitmap
+
+    def filter_mask(self, codes, selected_sectors=None, selected_commodities=None):
+        """
+        Boolean row mask for rows whose commodity codes are `codes` (from `codes_for`).
+        Rows are kept when they match both the sector and the commodity filters.
+        """
+        bitmap = self.selection_bitmap(selected_sectors, selected_commodities)
+        if bitmap is None:
+            return np.ones(len(codes), dtype=bool)
+        return bitmap[codes]
+
+
+@bounded_cache(max_entries=VERSIONS_IN_MEMORY)
+def build_catalog(df_list):
+    """
+    Builds the `CommodityCatalog` once per dataset and shares it across sessions.
+    """
+    return CommodityCatalog(df_list)
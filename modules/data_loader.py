@@ -1,6 +1,80 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import os
+import logging
+from modules.cache import VERSIONS_IN_MEMORY
+from modules.store import PriceStore, PriceStoreBuilder
+from modules.database import DatabasePriceStore, DB_PATH
+from modules.derived import DerivedExpression, DerivedPriceSource, load_definitions, DERIVED_PATH
+from modules.versions import VersionLog, version_label
+
+DATA_PATH = os.path.join("data", "Data.csv")
+LIST_PATH = os.path.join("data", "Commo_list.csv")
+
+PRICE_DTYPE = os.environ.get("COMMO_PRICE_DTYPE", "float64")
+# "memory" (parse Data.csv into a PriceStore) or "sqlite" (query the database built by `cli.py db-import`)
+DATA_BACKEND = os.environ.get("COMMO_DATA_BACKEND", "memory")
+# Rows per chunk when streaming `Data.csv` into the PriceStore; 0 reads the whole file at once
+INGEST_CHUNKSIZE = int(os.environ.get("COMMO_INGEST_CHUNKSIZE", "0"))
+_DATA_COLUMNS = {'Date', 'Commodities', 'Price', 'Volume'}
+# Record each new state of the price data in the version log (data/versions); 0 turns it off
+VERSIONING = os.environ.get("COMMO_VERSIONING", "1") != "0"
+
+logger = logging.getLogger(__name__)
+
+def data_version():
+    """
+    Fingerprint of the source CSVs (modification time and size), used to key caches.
+    """
+    stats = [os.stat(path) for path in (DATA_PATH, LIST_PATH) if os.path.exists(path)]
+    return "-".join(f"{s.st_mtime_ns}:{s.st_size}" for s in stats)
+
+def file_fingerprint(path):
+    """Modification time and size of one file, used to skip re-recording an unchanged source."""
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+def _clean_data(df_data):
+    """
+    Cleans a raw `Data.csv` frame: strips names, parses prices and dates, drops incomplete rows.
+    Rows are returned sorted by Date, which lets date cut-offs be taken as slices.
+    """
+    # 1. Clean column names by stripping whitespace
+    df_data.columns = [col.strip() for col in df_data.columns]
+
+    # 2. KEY FIX: Clean the 'Commodities' column immediately upon loading
+    if 'Commodities' in df_data.columns:
+        df_data['Commodities'] = df_data['Commodities'].astype(str).str.strip()
+
+    # 3. Clean 'Price' column
+    if 'Price' in df_data.columns:
+        df_data['Price'] = df_data['Price'].astype(str).str.replace(',', '').str.strip()
+        df_data['Price'] = pd.to_numeric(df_data['Price'], errors='coerce')
+
+    # Optional trading volume, cleaned like 'Price' (missing volumes are kept as NaN)
+    if 'Volume' in df_data.columns:
+        df_data['Volume'] = pd.to_numeric(df_data['Volume'].astype(str).str.replace(',', '').str.strip(), errors='coerce')
+
+    # 4. Convert 'Date' column to datetime objects
+    if 'Date' in df_data.columns:
+        df_data['Date'] = pd.to_datetime(df_data['Date'], errors='coerce')
+
+    # 5. Drop rows where essential data is missing
+    df_data.dropna(subset=['Date', 'Commodities', 'Price'], inplace=True)
+    if not df_data['Date'].is_monotonic_increasing:
+        df_data.sort_values('Date', kind='stable', inplace=True)
+    return df_data
+
+def _clean_list(df_list):
+    """
+    Cleans a raw `Commo_list.csv` frame.
+    """
+    df_list.columns = [col.strip() for col in df_list.columns]
+    if 'Commodities' in df_list.columns:
+        df_list['Commodities'] = df_list['Commodities'].astype(str).str.strip()
+    df_list.dropna(subset=['Commodities'], inplace=True)
+    return df_list
 
 @st.cache_data(ttl=3600)
 def load_data():
@@ -8,38 +82,213 @@ def load_data():
     Loads and preprocesses data from CSV files.
     This function is cached to improve performance.
     """
-    data_path = os.path.join("data", "Data.csv")
-    list_path = os.path.join("data", "Commo_list.csv")
-
     try:
-        df_data = pd.read_csv(data_path)
-        df_list = pd.read_csv(list_path)
-
-        # --- PREPROCESSING ---
-        # 1. Clean column names by stripping whitespace
-        df_data.columns = [col.strip() for col in df_data.columns]
-        df_list.columns = [col.strip() for col in df_list.columns]
-
-        # 2. KEY FIX: Clean the 'Commodities' column in BOTH dataframes immediately upon loading
-        if 'Commodities' in df_data.columns:
-            df_data['Commodities'] = df_data['Commodities'].astype(str).str.strip()
-        if 'Commodities' in df_list.columns:
-            df_list['Commodities'] = df_list['Commodities'].astype(str).str.strip()
-
-        # 3. Clean 'Price' column
-        if 'Price' in df_data.columns:
-            df_data['Price'] = df_data['Price'].astype(str).str.replace(',', '').str.strip()
-            df_data['Price'] = pd.to_numeric(df_data['Price'], errors='coerce')
-
-        # 4. Convert 'Date' column to datetime objects
-        if 'Date' in df_data.columns:
-            df_data['Date'] = pd.to_datetime(df_data['Date'], errors='coerce')
-        
-        # 5. Drop rows where essential data is missing
-        df_data.dropna(subset=['Date', 'Commodities', 'Price'], inplace=True)
-        df_list.dropna(subset=['Commodities'], inplace=True)
-
+        df_data = _clean_data(pd.read_csv(DATA_PATH))
+        df_list = _clean_list(pd.read_csv(LIST_PATH))
         return df_data, df_list
     except FileNotFoundError:
         st.error(f"Error: Make sure `Data.csv` and `Commo_list.csv` are in the 'data' directory.")
         return None, None
+
+def derived_fingerprint():
+    """`file_fingerprint` of `Derived.csv` (None without one), so its caches see edits to the file."""
+    return file_fingerprint(DERIVED_PATH) if os.path.exists(DERIVED_PATH) else None
+
+@st.cache_data(ttl=3600)
+def load_derived_definitions(fingerprint=None):
+    """
+    Loads `Derived.csv` (spread/ratio definitions). Returns (definitions, errors for skipped rows).
+    `fingerprint` (see `derived_fingerprint`) only keys the cache.
+    """
+    return load_definitions(DERIVED_PATH)
+
+@st.cache_data(ttl=3600)
+def usable_derived_definitions(known_names, fingerprint=None):
+    """
+    The `Derived.csv` series that can be computed from the commodities `known_names` (a tuple of a
+    price source's names), as {name: (expression, sector)}. Skipped rows (bad expression, unknown
+    leg, name already a commodity) go to the server log once per set of names and version of the
+    file, not on every rerun.
+    """
+    definitions, errors = load_derived_definitions(fingerprint)
+    known = set(known_names)
+    usable = {}
+    for row in definitions.itertuples(index=False):
+        legs = DerivedExpression(row.Expression).legs
+        if row.Commodities in known:
+            errors = errors + [f"{row.Commodities}: the name is already a commodity"]
+        elif not set(legs) <= known:
+            errors = errors + [f"{row.Commodities}: unknown commodity {', '.join(sorted(set(legs) - known))}"]
+        else:
+            usable[row.Commodities] = (row.Expression, row.Sector)
+    for error in errors:
+        logger.warning("Derived series skipped (%s).", error)
+    return usable
+
+def _price_names():
+    # Commodities of the current price data (see `load_price_source`), or none if it is missing
+    if DATA_BACKEND == "sqlite":
+        return tuple(DatabasePriceStore(DB_PATH).names) if os.path.exists(DB_PATH) else ()
+    store = load_price_store()
+    return tuple(store.names) if store is not None else ()
+
+def commodity_list_version():
+    """
+    Fingerprint of the files `load_commodity_list` reads (`Commo_list.csv` and `Derived.csv`),
+    for keying caches of results that depend on the commodity list.
+    """
+    return "-".join(file_fingerprint(path) for path in (LIST_PATH, DERIVED_PATH) if os.path.exists(path))
+
+def load_commodity_list():
+    """
+    Loads only `Commo_list.csv` (sector, nation and impact metadata), plus one row per derived
+    series from `Derived.csv` that the price data can serve, so they can be filtered like any
+    other commodity. Derived rows have a sector but no nation.
+    """
+    return _load_commodity_list(commodity_list_version())
+
+@st.cache_data(ttl=3600)
+def _load_commodity_list(list_version):
+    try:
+        df_list = _clean_list(pd.read_csv(LIST_PATH))
+    except FileNotFoundError:
+        st.error(f"Error: Make sure `Commo_list.csv` is in the 'data' directory.")
+        return None
+    listed = set(df_list['Commodities'])
+    usable = usable_derived_definitions(_price_names(), derived_fingerprint())
+    derived = {name: sector for name, (_, sector) in usable.items() if name not in listed}
+    if not derived:
+        return df_list
+    derived_rows = pd.DataFrame({'Commodities': list(derived), 'Sector': list(derived.values()), 'Nation': np.nan})
+    return pd.concat([df_list, derived_rows], ignore_index=True)
+
+def iter_clean_chunks(csv_path=DATA_PATH, chunksize=200_000, progress=None):
+    """
+    Reads a `Data.csv`-style file `chunksize` rows at a time and yields each chunk cleaned by
+    `_clean_data`. Columns other than Date/Commodities/Price/Volume are never parsed.
+    `progress(rows, bytes_read, total_bytes)` is called after each chunk.
+    """
+    total_bytes = os.path.getsize(csv_path)
+    rows = 0
+    with open(csv_path, 'rb') as handle:
+        reader = pd.read_csv(handle, chunksize=chunksize, usecols=lambda col: col.strip() in _DATA_COLUMNS)
+        for chunk in reader:
+            rows += len(chunk)
+            yield _clean_data(chunk)
+            if progress is not None:
+                progress(rows, min(handle.tell(), total_bytes), total_bytes)
+
+def stream_price_store(csv_path=DATA_PATH, chunksize=200_000, price_dtype=PRICE_DTYPE, version=None, progress=None):
+    """
+    Builds a `PriceStore` from `csv_path` chunk by chunk. Each cleaned chunk is appended to a
+    `PriceStoreBuilder` and dropped, so peak memory is the compact store plus one raw chunk
+    instead of the whole file as strings.
+    """
+    builder = PriceStoreBuilder(price_dtype=np.dtype(price_dtype))
+    for chunk in iter_clean_chunks(csv_path, chunksize, progress):
+        builder.append(chunk)
+    return builder.build(version=version)
+
+def _log_progress(rows, bytes_read, total_bytes):
+    logger.info("Loading %s: %s rows, %.0f%%", os.path.basename(DATA_PATH), f"{rows:,}", 100 * bytes_read / max(total_bytes, 1))
+
+@st.cache_resource(ttl=3600, show_spinner="Loading price history...")
+def load_price_store(price_dtype=PRICE_DTYPE):
+    """
+    Loads `Data.csv` into a compact, read-only `PriceStore` shared by every session.
+    Set COMMO_PRICE_DTYPE=float32 to halve the price column at the cost of ~7 significant digits,
+    and COMMO_INGEST_CHUNKSIZE to stream large files in chunks (progress goes to the server log).
+    """
+    try:
+        if INGEST_CHUNKSIZE > 0:
+            return stream_price_store(DATA_PATH, INGEST_CHUNKSIZE, price_dtype, version=data_version(), progress=_log_progress)
+        df_data = _clean_data(pd.read_csv(DATA_PATH))
+    except FileNotFoundError:
+        st.error(f"Error: Make sure `Data.csv` is in the 'data' directory.")
+        return None
+    return PriceStore.from_frame(df_data, price_dtype=np.dtype(price_dtype), version=data_version())
+
+def record_data_version(df, source=DATA_PATH, fingerprint=None):
+    """
+    Adds the full cleaned dataset `df` to the version log if it changed (COMMO_VERSIONING=0
+    turns this off). Returns the new manifest entry, or None. Raises OSError if the log cannot be written.
+    Comparing against the previous version rebuilds it, so this runs from `cli.py ingest`/`db-import`
+    and the server warm-up, never from a page.
+    """
+    if not VERSIONING:
+        return None
+    entry = VersionLog().record(df, source=source, fingerprint=fingerprint)
+    if entry is not None:
+        logger.info("Recorded data version %s: +%s ~%s -%s rows", entry['version'], entry['inserted'], entry['changed'], entry['deleted'])
+    return entry
+
+def record_price_file_version():
+    """
+    Records `Data.csv` as served by the memory backend, unless its fingerprint matches the latest
+    version (checked before any rows are compared). Used by the server warm-up; the SQLite backend
+    is recorded by `cli.py db-import`. A log that cannot be written only costs the history, so the
+    error is logged. Returns the new manifest entry, or None.
+    """
+    # float32 prices would show up as changes against the exact recorded history
+    if not VERSIONING or DATA_BACKEND != "memory" or np.dtype(PRICE_DTYPE) != np.float64 or not os.path.exists(DATA_PATH):
+        return None
+    fingerprint = file_fingerprint(DATA_PATH)
+    entries = VersionLog().manifest()
+    if entries and entries[-1].get('fingerprint') == fingerprint:
+        return None
+    store = load_price_store()
+    if store is None:
+        return None
+    try:
+        return record_data_version(store.to_frame(), DATA_PATH, fingerprint)
+    except OSError as e:
+        logger.warning("Data version not recorded: %s", e)
+        return None
+
+@st.cache_resource(ttl=3600, max_entries=VERSIONS_IN_MEMORY, show_spinner="Rebuilding data version...")
+def load_version_store(version, price_dtype=PRICE_DTYPE):
+    """
+    `PriceStore` of a recorded data version, rebuilt from its checkpoint and deltas.
+    Only the few most recently selected versions are kept in memory.
+    """
+    return VersionLog().store(version, price_dtype=np.dtype(price_dtype))
+
+def select_data_version(key="data_version"):
+    """
+    Sidebar "As-of data version" selector. Returns None for the current data, or the number of
+    a recorded version to reproduce what the dashboard showed then. Hidden until there is history.
+    """
+    entries = VersionLog().manifest() if VERSIONING else []
+    if len(entries) < 2:
+        return None
+    labels = {entry['version']: version_label(entry) for entry in entries}
+    return st.sidebar.selectbox(
+        "As-of data version",
+        options=[None] + sorted(labels, reverse=True),
+        format_func=lambda version: "Latest" if version is None else labels[version],
+        key=key,
+        help="Show the prices as they were recorded at an earlier import (+inserted ~changed -deleted rows)."
+    )
+
+def load_price_source(as_of=None):
+    """
+    Returns the price source the pages read from, chosen by COMMO_DATA_BACKEND, or the
+    recorded data version `as_of` when one is given.
+    Both sources offer `date_bounds`, `trading_days`, `to_frame`, `window_frame` and `version`.
+    """
+    if as_of is not None:
+        base = load_version_store(as_of)
+    elif DATA_BACKEND == "sqlite":
+        # Opening the database is two small queries, so it is done per rerun and always sees the latest import
+        if not os.path.exists(DB_PATH):
+            st.error(f"Error: Price database `{DB_PATH}` not found. Create it with `python cli.py db-import`.")
+            return None
+        base = DatabasePriceStore(DB_PATH)
+    else:
+        base = load_price_store()
+    if base is None:
+        return None
+
+    # Spreads and ratios from `Derived.csv` are served as extra commodities
+    usable = {name: expression for name, (expression, _) in usable_derived_definitions(tuple(base.names), derived_fingerprint()).items()}
+    return DerivedPriceSource(base, usable) if usable else base
@@ -0,0 +1,165 @@
+import os
+import json
+import sqlite3
+import time
+import numpy as np
+import pandas as pd
+from modules.store import to_day_offsets, from_day_offsets
+
+DB_PATH = os.environ.get("COMMO_DB_PATH", os.path.join("data", "prices.sqlite"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS prices (
+    commodity TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    price REAL NOT NULL,
+    PRIMARY KEY (commodity, day)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_prices_day ON prices (day);
+CREATE TABLE IF NOT EXISTS commodities (
+    name TEXT PRIMARY KEY
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS imports (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source TEXT,
+    rows INTEGER,
+    imported_at REAL
+);
+"""
+
+_UPSERT = """
+INSERT INTO prices (commodity, day, price) VALUES (?, ?, ?)
+ON CONFLICT (commodity, day) DO UPDATE SET price = excluded.price
+"""
+
+
+def connect(db_path=DB_PATH, read_only=False):
+    """Opens the price database; read-only connections never create the file."""
+    if read_only:
+        return sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    connection = sqlite3.connect(db_path)
+    connection.executescript(_SCHEMA)
+    return connection
+
+
+def upsert_prices(connection, df, source=None):
+    """
+    Inserts or updates cleaned Date/Commodities/Price rows, keyed on (commodity, day).
+    Returns the number of rows written.
+    """
+    rows = zip(
+        df['Commodities'].astype(str).tolist(),
+        to_day_offsets(df['Date']).tolist(),
+        df['Price'].astype(float).tolist(),
+    )
+    with connection:
+        connection.executemany(_UPSERT, rows)
+        connection.executemany(
+            "INSERT OR IGNORE INTO commodities (name) VALUES (?)",
+            ((name,) for name in df['Commodities'].astype(str).unique()),
+        )
+        connection.execute(
+            "INSERT INTO imports (source, rows, imported_at) VALUES (?, ?, ?)",
+            (source, len(df), time.time()),
+        )
+    return len(df)
+
+
+def import_csv(csv_path, db_path=DB_PATH, chunksize=200_000, log=print):
+    """
+    Imports (or re-imports) a `Data.csv`-style file into the database in chunks.
+    Existing (commodity, date) rows are updated in place, so corrected files can be re-imported.
+    """
+    from modules.data_loader import _clean_data
+
+    connection = connect(db_path)
+    total = 0
+    try:
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+            total += upsert_prices(connection, _clean_data(chunk), source=os.path.basename(csv_path))
+            log(f"{total:,} rows imported...")
+    finally:
+        connection.close()
+    return total
+
+
+def _rows_to_frame(rows):
+    commodities, days, prices = zip(*rows) if rows else ((), (), ())
+    return pd.DataFrame({
+        'Date': from_day_offsets(np.asarray(days, dtype=np.int32)),
+        'Commodities': np.asarray(commodities, dtype=object),
+        'Price': np.asarray(prices, dtype=np.float64),
+    })
+
+
+class DatabasePriceStore:
+    """
+    `PriceStore`-compatible reader over the SQLite database.
+
+    Commodity and date filters are pushed down to SQL and served from the (commodity, day)
+    primary key, so memory use depends on the rows a page asks for, not on the history size.
+    """
+
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        last_import = self._query("SELECT MAX(id) FROM imports")[0][0]
+        self.names = np.array([row[0] for row in self._query("SELECT name FROM commodities ORDER BY name")], dtype=object)
+        self.version = f"sqlite:{os.path.abspath(db_path)}:{last_import}"
+
+    def _query(self, sql, params=()):
+        connection = connect(self.db_path, read_only=True)
+        try:
+            return connection.execute(sql, params).fetchall()
+        finally:
+            connection.close()
+
+    def date_bounds(self):
+        first, last = self._query("SELECT MIN(day), MAX(day) FROM prices")[0]
+        if first is None:
+            return None, None
+        dates = from_day_offsets([first, last])
+        return dates[0], dates[1]
+
+    def trading_days(self):
+        return np.array([row[0] for row in self._query("SELECT DISTINCT day FROM prices ORDER BY day")], dtype=np.int32)
+
+    def _day_clause(self, start, end):
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("day >= ?")
+            params.append(int(to_day_offsets([start])[0]))
+        if end is not None:
+            clauses.append("day <= ?")
+            params.append(int(to_day_offsets([end])[0]))
+        return clauses, params
+
+    def to_frame(self, commodities=None, start=None, end=None):
+        """Long Date/Commodities/Price frame for the given commodities and inclusive date range."""
+        clauses, params = self._day_clause(start, end)
+        if commodities is not None:
+            commodities = list(commodities)
+            if not commodities:
+                return _rows_to_frame([])
+            clauses.append(f"commodity IN ({', '.join('?' * len(commodities))})")
+            params.extend(commodities)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return _rows_to_frame(self._query(f"SELECT commodity, day, price FROM prices {where} ORDER BY day, commodity", params))
+
+    def window_frame(self, start, end):
+        """
+        All commodities between `start` and `end`, plus each commodity's last row before `start`.
+        """
+        start_day = int(to_day_offsets([start])[0])
+        end_day = int(to_day_offsets([end])[0])
+        # The anchor rows are one primary-key seek per commodity, not a scan of the older history
+        sql = """
+            SELECT commodity, day, price FROM prices WHERE day >= ? AND day <= ?
+            UNION ALL
+            SELECT p.commodity, p.day, p.price
+            FROM json_each(?) AS n
+            JOIN prices p ON p.commodity = n.value
+             AND p.day = (SELECT MAX(day) FROM prices WHERE commodity = n.value AND day < ?)
+            ORDER BY day, commodity
+        """
+        names = json.dumps(self.names.tolist())
+        return _rows_to_frame(self._query(sql, (start_day, end_day, names, start_day)))
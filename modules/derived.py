@@ -0,0 +1,194 @@
+import os
+import re
+import ast
+import hashlib
+import operator
+import streamlit as st
+import numpy as np
+import pandas as pd
+from modules.cache import bounded_cache, VERSIONS_IN_MEMORY
+from modules.store import PriceStore
+
+DERIVED_PATH = os.path.join("data", "Derived.csv")
+DERIVED_SECTOR = "Derived"
+
+_BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Pow: operator.pow,
+}
+_UNARY_OPERATORS = {ast.USub: operator.neg, ast.UAdd: operator.pos}
+_QUOTED_NAME = re.compile(r"`([^`]+)`")
+
+
+class DerivedExpression:
+    """
+    A spread/ratio expression over commodity names, e.g. "Brent - WTI", "Gold / Silver" or
+    "`1100 TC` - `1700 TC`" (names with spaces or symbols go in backticks).
+
+    Only numbers, commodity names, + - * / ** and parentheses are allowed. The expression is
+    parsed once; `evaluate` runs it as whole-column operations on a date-aligned price panel.
+    """
+
+    def __init__(self, expression):
+        self.expression = expression.strip()
+        legs = []
+
+        def placeholder(match):
+            name = match.group(1).strip()
+            if name not in legs:
+                legs.append(name)
+            return f"__leg{legs.index(name)}"
+
+        source = _QUOTED_NAME.sub(placeholder, self.expression)
+        try:
+            self._tree = ast.parse(source, mode='eval').body
+        except SyntaxError as e:
+            raise ValueError(f"Invalid expression '{self.expression}': {e.msg}") from None
+        self._names = {}
+        for node in ast.walk(self._tree):
+            if isinstance(node, ast.Name):
+                name = legs[int(node.id[5:])] if node.id.startswith("__leg") else node.id
+                if name not in legs:
+                    legs.append(name)
+                self._names[node.id] = name
+            elif not isinstance(node, (ast.BinOp, ast.UnaryOp, ast.Constant, ast.operator, ast.unaryop, ast.Load)):
+                raise ValueError(f"Invalid expression '{self.expression}': only numbers, commodity names and + - * / ** are allowed.")
+            elif isinstance(node, ast.BinOp) and type(node.op) not in _BINARY_OPERATORS:
+                raise ValueError(f"Invalid expression '{self.expression}': unsupported operator.")
+            elif isinstance(node, ast.UnaryOp) and type(node.op) not in _UNARY_OPERATORS:
+                raise ValueError(f"Invalid expression '{self.expression}': unsupported operator.")
+            elif isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+                raise ValueError(f"Invalid expression '{self.expression}': only numeric constants are allowed.")
+        self.legs = legs
+
+    def evaluate(self, panel):
+        """Evaluates on a wide frame (dates x commodities); returns a Series indexed like `panel`."""
+        def run(node):
+            if isinstance(node, ast.BinOp):
+                return _BINARY_OPERATORS[type(node.op)](run(node.left), run(node.right))
+            if isinstance(node, ast.UnaryOp):
+                return _UNARY_OPERATORS[type(node.op)](run(node.operand))
+            if isinstance(node, ast.Constant):
+                return node.value
+            return panel[self._names[node.id]]
+
+        result = run(self._tree)
+        if not isinstance(result, pd.Series):
+            result = pd.Series(result, index=panel.index, dtype=np.float64)
+        return result
+
+
+@bounded_cache
+def derived_prices(_store, store_version, expression):
+    """
+    Daily prices of a derived series, memoized per expression and data version.
+
+    Legs are aligned on the dates any of them trades, each carrying its last price forward;
+    dates before every leg has a price, and undefined results (e.g. division by zero), are dropped.
+    """
+    parsed = DerivedExpression(expression)
+    missing = [name for name in parsed.legs if name not in set(_store.names)]
+    if missing:
+        raise ValueError(f"Unknown commodity in '{expression}': {', '.join(missing)}")
+    legs = _store.to_frame(parsed.legs)
+    panel = legs.pivot_table(index='Date', columns='Commodities', values='Price', aggfunc='last').ffill().dropna()
+    values = parsed.evaluate(panel).replace([np.inf, -np.inf], np.nan).dropna()
+    return values.rename_axis('Date').rename('Price')
+
+
+def definitions_key(definitions):
+    """Short stable fingerprint of {name: expression}, used in the derived source's version."""
+    text = "\n".join(f"{name}={expression}" for name, expression in sorted(definitions.items()))
+    return hashlib.sha1(text.encode()).hexdigest()[:12]
+
+
+@bounded_cache(max_entries=VERSIONS_IN_MEMORY)
+def build_derived_store(_store, store_version, definitions):
+    """
+    `PriceStore` holding every derived series of `definitions` ((name, expression) pairs).
+    """
+    frames = [
+        derived_prices(_store, store_version, expression).reset_index().assign(Commodities=name)
+        for name, expression in definitions
+    ]
+    if not frames:
+        return PriceStore.from_frame(pd.DataFrame({'Date': pd.to_datetime([]), 'Commodities': [], 'Price': []}))
+    return PriceStore.from_frame(pd.concat(frames, ignore_index=True))
+
+
+class DerivedPriceSource:
+    """
+    A price source with derived series added as extra commodities.
+
+    Offers the same interface as `PriceStore`/`DatabasePriceStore` (`names`, `version`,
+    `date_bounds`, `trading_days`, `to_frame`, `window_frame`), so the table, charts,
+    correlation, heatmaps, screening and seasonality treat spreads and ratios like any
+    other commodity.
+    """
+
+    def __init__(self, base, definitions):
+        clashes = sorted(set(definitions) & set(base.names))
+        if clashes:
+            raise ValueError(f"Derived series names clash with commodities: {', '.join(clashes)}")
+        self.base = base
+        self.definitions = dict(definitions)
+        self.derived = build_derived_store(base, base.version, tuple(sorted(self.definitions.items())))
+        self.version = f"{base.version}|derived:{definitions_key(self.definitions)}"
+        self.names = np.array(sorted([*base.names, *self.derived.names]), dtype=object)
+
+    def date_bounds(self):
+        bounds = [b for b in (self.base.date_bounds(), self.derived.date_bounds()) if b[0] is not None]
+        if not bounds:
+            return None, None
+        return min(b[0] for b in bounds), max(b[1] for b in bounds)
+
+    def trading_days(self):
+        return np.union1d(self.base.trading_days(), self.derived.trading_days()).astype(np.int32)
+
+    def _combine(self, base_rows, derived_rows):
+        if derived_rows.empty:
+            return base_rows
+        if base_rows.empty:
+            return derived_rows
+        # Keep the date-major row order of the underlying stores
+        return pd.concat([base_rows, derived_rows], ignore_index=True).sort_values('Date', kind='stable', ignore_index=True)
+
+    def to_frame(self, commodities=None, start=None, end=None):
+        if commodities is None:
+            return self._combine(self.base.to_frame(None, start, end), self.derived.to_frame(None, start, end))
+        commodities = list(commodities)
+        base_names = [name for name in commodities if name not in self.definitions]
+        derived_names = [name for name in commodities if name in self.definitions]
+        return self._combine(self.base.to_frame(base_names, start, end), self.derived.to_frame(derived_names, start, end))
+
+    def window_frame(self, start, end):
+        return self._combine(self.base.window_frame(start, end), self.derived.window_frame(start, end))
+
+
+def load_definitions(path=DERIVED_PATH):
+    """
+    Reads derived series definitions (Commodities, Expression and optional Sector columns).
+    Returns (definitions frame, list of error messages for the rows that were skipped).
+    """
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=['Commodities', 'Expression', 'Sector']), []
+    df = pd.read_csv(path)
+    df.columns = [col.strip() for col in df.columns]
+    df = df.dropna(subset=['Commodities', 'Expression'])
+    df['Commodities'] = df['Commodities'].astype(str).str.strip()
+    if 'Sector' not in df.columns:
+        df['Sector'] = DERIVED_SECTOR
+    df['Sector'] = df['Sector'].fillna(DERIVED_SECTOR)
+
+    errors, valid = [], []
+    for row in df.itertuples(index=False):
+        try:
+            DerivedExpression(row.Expression)
+            valid.append(True)
+        except ValueError as e:
+            errors.append(f"{row.Commodities}: {e}")
+            valid.append(False)
+    return df[np.array(valid, dtype=bool)][['Commodities', 'Expression', 'Sector']], errors
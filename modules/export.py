@@ -0,0 +1,166 @@
+import os
+import re
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+from modules.data_loader import load_data, DATA_PATH, LIST_PATH
+from modules.calculations import compute_price_changes, compute_market_metrics
+from modules.styling import market_metrics_html, style_dataframe
+from modules.trading_calendar import TradingCalendar
+
+ALL_SECTORS = "All"
+SUPPORTED_FORMATS = ("csv", "parquet", "html")
+
+# Worker-side copies of the dataset, set once per process by `_init_worker`
+_worker_data = {}
+
+
+def _slugify(name):
+    return re.sub(r'[^A-Za-z0-9]+', '-', str(name)).strip('-').lower() or 'unnamed'
+
+
+def snapshot_paths(output_dir, snapshot_date, sector, formats):
+    """
+    Returns the output files for one (date, sector filter) snapshot, keyed by format.
+    Layout: <output_dir>/<YYYY-MM-DD>/<sector-slug>/{table.csv, metrics.csv, table.parquet, metrics.parquet, report.html}
+    """
+    folder = os.path.join(output_dir, pd.Timestamp(snapshot_date).strftime('%Y-%m-%d'), _slugify(sector))
+    paths = {}
+    for fmt in formats:
+        if fmt == 'html':
+            paths['html'] = [os.path.join(folder, 'report.html')]
+        else:
+            paths[fmt] = [os.path.join(folder, f'table.{fmt}'), os.path.join(folder, f'metrics.{fmt}')]
+    return paths
+
+
+def is_up_to_date(paths, source_mtime):
+    """A snapshot is up to date when every output exists and is newer than the source CSVs."""
+    files = [p for group in paths.values() for p in group]
+    return all(os.path.exists(p) and os.path.getmtime(p) >= source_mtime for p in files)
+
+
+def build_snapshot(df_data, df_list, snapshot_date, sectors, calendar=None):
+    """
+    Computes the Home page table and Key Market Metrics for one date, once per sector filter.
+    Returns {sector: (table_df, metrics_dict)}.
+    """
+    analysis_df = compute_price_changes(df_data, df_list, snapshot_date, calendar=calendar)
+    results = {}
+    for sector in sectors:
+        if analysis_df.empty:
+            table = analysis_df
+        elif sector == ALL_SECTORS:
+            table = analysis_df
+        else:
+            table = analysis_df[analysis_df['Sector'] == sector]
+        metrics = compute_market_metrics(table) if not table.empty else None
+        results[sector] = (table, metrics)
+    return results
+
+
+def _init_worker(df_data, df_list):
+    _worker_data['df_data'] = df_data
+    _worker_data['df_list'] = df_list
+    _worker_data['calendar'] = TradingCalendar(df_data['Date'])
+
+
+def _snapshot_task(snapshot_date, sectors):
+    data = _worker_data
+    return snapshot_date, build_snapshot(data['df_data'], data['df_list'], snapshot_date, sectors, data['calendar'])
+
+
+def _atomic_write(path, writer):
+    # Write to a temp file first so a crash never leaves a half-written file that looks up to date
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    writer(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _write_text(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def write_snapshot(paths, snapshot_date, sector, table, metrics):
+    """Writes one snapshot to every requested format."""
+    metrics_df = pd.DataFrame([{'Date': pd.Timestamp(snapshot_date).date(), 'Sector': sector, **(metrics or {})}])
+
+    for fmt, files in paths.items():
+        if fmt == 'csv':
+            _atomic_write(files[0], lambda p: table.to_csv(p, index=False))
+            _atomic_write(files[1], lambda p: metrics_df.to_csv(p, index=False))
+        elif fmt == 'parquet':
+            _atomic_write(files[0], lambda p: table.to_parquet(p, index=False))
+            _atomic_write(files[1], lambda p: metrics_df.to_parquet(p, index=False))
+        elif fmt == 'html':
+            title = f"Commodity Market Snapshot - {pd.Timestamp(snapshot_date):%Y-%m-%d} - {sector}"
+            metrics_block = market_metrics_html(metrics) if metrics else '<p>No data for this filter.</p>'
+            table_block = style_dataframe(table).to_html() if not table.empty else ''
+            html = (
+                f"<html><head><meta charset='utf-8'><title>{title}</title></head>"
+                f"<body style=\"font-family: Manrope, sans-serif;\"><h2>{title}</h2>"
+                f"{metrics_block}{table_block}</body></html>"
+            )
+            _atomic_write(files[0], lambda p: _write_text(p, html))
+
+
+def export_snapshots(dates=None, start=None, end=None, sectors=None, per_sector=False,
+                     formats=("csv",), output_dir="exports", workers=None, force=False, log=print):
+    """
+    Precomputes Home page snapshots for many dates and sector filters without Streamlit.
+
+    The dataset is loaded once in the parent and handed to each pool worker at start-up;
+    dates are computed in parallel and each snapshot is written as soon as it completes.
+    Dates whose outputs are newer than `Data.csv`/`Commo_list.csv` are skipped unless `force`.
+    Returns a dict with 'written' and 'skipped' date counts.
+    """
+    formats = tuple(formats)
+    unknown = set(formats) - set(SUPPORTED_FORMATS)
+    if unknown:
+        raise ValueError(f"Unsupported export format(s): {', '.join(sorted(unknown))}")
+    if 'parquet' in formats and not (importlib.util.find_spec('pyarrow') or importlib.util.find_spec('fastparquet')):
+        raise ValueError("Parquet export requires `pyarrow` or `fastparquet` to be installed.")
+
+    df_data, df_list = load_data()
+    if df_data is None or df_list is None:
+        raise FileNotFoundError("Make sure `Data.csv` and `Commo_list.csv` are in the 'data' directory.")
+
+    sector_filters = [ALL_SECTORS] + list(sectors or [])
+    if per_sector:
+        sector_filters += [s for s in sorted(df_list['Sector'].dropna().astype(str).unique()) if s not in sector_filters]
+
+    # Only dates that actually have prices are exported
+    trading_dates = TradingCalendar(df_data['Date']).dates
+    if dates:
+        selected = pd.DatetimeIndex(pd.to_datetime(list(dates)))
+    else:
+        lower = pd.to_datetime(start) if start else trading_dates.max()
+        upper = pd.to_datetime(end) if end else trading_dates.max()
+        selected = trading_dates[(trading_dates >= lower) & (trading_dates <= upper)]
+
+    source_mtime = max(os.path.getmtime(DATA_PATH), os.path.getmtime(LIST_PATH))
+    pending = []
+    for snapshot_date in selected:
+        all_paths = [snapshot_paths(output_dir, snapshot_date, s, formats) for s in sector_filters]
+        if not force and all(is_up_to_date(p, source_mtime) for p in all_paths):
+            continue
+        pending.append(snapshot_date)
+
+    skipped = len(selected) - len(pending)
+    log(f"{len(pending)} date(s) to export, {skipped} already up to date.")
+    if not pending:
+        return {'written': 0, 'skipped': skipped}
+
+    written = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(df_data, df_list)) as pool:
+        futures = [pool.submit(_snapshot_task, d, sector_filters) for d in pending]
+        for future in as_completed(futures):
+            snapshot_date, results = future.result()
+            for sector, (table, metrics) in results.items():
+                write_snapshot(snapshot_paths(output_dir, snapshot_date, sector, formats), snapshot_date, sector, table, metrics)
+            written += 1
+            log(f"[{written}/{len(pending)}] {snapshot_date:%Y-%m-%d} exported.")
+
+    return {'written': written, 'skipped': skipped}
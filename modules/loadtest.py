@@ -0,0 +1,406 @@
+import os
+import sys
+import time
+import socket
+import asyncio
+import tempfile
+import subprocess
+import urllib.request
+from collections import namedtuple
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+import streamlit
+from websockets.asyncio.client import connect
+from websockets.exceptions import WebSocketException
+
+# Pages by URL path, as the browser asks for them ('' is Home.py, the main script)
+HOME_PAGE = ""
+CHART_PAGE = "Chart_Analysis"
+PERCENTILES = (50, 90, 95, 99)
+# Seconds the server may take to warm up and answer its health check
+STARTUP_TIMEOUT = 300
+# Streamlit release line whose websocket messages `StreamlitWire` speaks. They are the private
+# protocol between the server and its frontend, so another release needs the adapter re-checked.
+PINNED_STREAMLIT = "1.66"
+
+# A widget on the page as the scripts see it; `default` holds the proto defaults as a list
+# (date strings for a date input, option indices for a multiselect, one value for a checkbox)
+Widget = namedtuple('Widget', ['id', 'label', 'options', 'default', 'fragment_id'])
+
+
+def _as_list(value):
+    # Repeated proto fields as lists, single values as one-item lists, missing fields as []
+    if value is None:
+        return []
+    if isinstance(value, (str, bytes, bool, int, float)):
+        return [value]
+    return list(value)
+
+
+def check_streamlit_version(version=None):
+    """Raises RuntimeError unless `version` (default: the installed Streamlit) is the pinned release line."""
+    version = version or streamlit.__version__
+    if version.split('.')[:2] != PINNED_STREAMLIT.split('.'):
+        raise RuntimeError(
+            f"The load test speaks the websocket protocol of Streamlit {PINNED_STREAMLIT}.x, but Streamlit "
+            f"{version} is installed. Check `StreamlitWire` against it, then update PINNED_STREAMLIT."
+        )
+
+
+class StreamlitWire:
+    """
+    The only part of the harness that knows Streamlit's private websocket messages: it encodes
+    rerun requests (BackMsg) and decodes what the server streams back (ForwardMsg).
+    """
+
+    def __init__(self):
+        check_streamlit_version()
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+        self._back_msg, self._forward_msg, self._widget_state = BackMsg, ForwardMsg, WidgetState
+
+    def strings_state(self, widget_id, values):
+        """State of a date input or multiselect set to `values`."""
+        state = self._widget_state(id=widget_id)
+        state.string_array_value.data.extend(values)
+        return state
+
+    def string_state(self, widget_id, value):
+        """State of a radio or selectbox set to `value`."""
+        return self._widget_state(id=widget_id, string_value=value)
+
+    @staticmethod
+    def state_strings(state):
+        return list(state.string_array_value.data)
+
+    def rerun_request(self, page, fragment_id, states):
+        """Serialized request to rerun `page` (or one fragment of it) with the given widget states."""
+        message = self._back_msg()
+        message.rerun_script.query_string = ""
+        message.rerun_script.page_name = page
+        message.rerun_script.fragment_id = fragment_id
+        message.rerun_script.widget_states.widgets.extend(states)
+        return message.SerializeToString()
+
+    def parse(self, data):
+        """
+        One server message as (kind, value): ('widget', Widget), ('error', None) for an exception
+        shown on the page, ('finished', True if the script failed to compile), or (None, None).
+        """
+        message = self._forward_msg()
+        message.ParseFromString(data)
+        kind = message.WhichOneof('type')
+        if kind == 'delta' and message.delta.WhichOneof('type') == 'new_element':
+            element = message.delta.new_element
+            element_type = element.WhichOneof('type')
+            if element_type == 'exception':
+                return 'error', None
+            proto = getattr(element, element_type)
+            if getattr(proto, 'id', ''):
+                return 'widget', Widget(proto.id, getattr(proto, 'label', None), _as_list(getattr(proto, 'options', None)),
+                                        _as_list(getattr(proto, 'default', None)), message.delta.fragment_id)
+        elif kind == 'script_finished':
+            return 'finished', message.script_finished == self._forward_msg.FINISHED_WITH_COMPILE_ERROR
+        return None, None
+
+
+class SimulatedSession:
+    """
+    One browser tab on a running dashboard server: a websocket session that reruns its page
+    with the widget values it has set, like the Streamlit frontend does.
+
+    Setting a widget inside an `st.fragment` reruns only that fragment, as in the browser;
+    anything else reruns the whole page.
+    """
+
+    def __init__(self, websocket, page, timeout, wire=None):
+        self._websocket = websocket
+        self._wire = wire or StreamlitWire()
+        self.page = page
+        self.timeout = timeout
+        # Widgets rendered by the last runs: id -> Widget
+        self.widgets = {}
+        self._states = {}
+        self._changed_fragments = set()
+
+    def widget(self, label=None, key=None):
+        for widget_id, widget in self.widgets.items():
+            if label is not None and widget.label == label:
+                return widget
+            if key is not None and widget_id.endswith(f"-{key}"):
+                return widget
+        raise LookupError(f"No widget {'labelled ' + repr(label) if label is not None else 'with key ' + repr(key)} on the page")
+
+    def strings(self, widget):
+        """Current value of a date input or multiselect, as the strings the frontend sends."""
+        state = self._states.get(widget.id)
+        return self._wire.state_strings(state) if state is not None else list(widget.default)
+
+    def _set(self, widget, state):
+        self._states[widget.id] = state
+        self._changed_fragments.add(self.widgets[widget.id].fragment_id)
+
+    def set_strings(self, widget, values):
+        self._set(widget, self._wire.strings_state(widget.id, values))
+
+    def set_string(self, widget, value):
+        self._set(widget, self._wire.string_state(widget.id, value))
+
+    async def rerun(self):
+        """Reruns the page (or the one fragment that changed) and returns the number of errors it showed."""
+        fragments = self._changed_fragments
+        fragment_id = next(iter(fragments)) if len(fragments) == 1 else ""
+        self._changed_fragments = set()
+
+        await self._websocket.send(self._wire.rerun_request(self.page, fragment_id, self._states.values()))
+        widgets, errors = await asyncio.wait_for(self._read_run(), self.timeout)
+
+        if fragment_id:
+            self.widgets.update(widgets)
+        else:
+            # Like the frontend, forget the values of widgets that are no longer on the page
+            self.widgets = widgets
+            self._states = {widget_id: state for widget_id, state in self._states.items() if widget_id in widgets}
+        return errors
+
+    async def _read_run(self):
+        widgets, errors = {}, 0
+        while True:
+            kind, value = self._wire.parse(await self._websocket.recv())
+            if kind == 'widget':
+                widgets[value.id] = value
+            elif kind == 'error':
+                errors += 1
+            elif kind == 'finished':
+                return widgets, errors + int(value)
+
+
+def _date_scrub(session, rng, steps=5):
+    # Step the Home date picker back one day at a time, like an analyst scrubbing through history
+    for _ in range(steps):
+        picker = session.widget(label="Select Date")
+        current = pd.Timestamp(session.strings(picker)[0]) - pd.Timedelta(days=1)
+        session.set_strings(picker, [current.strftime('%Y-%m-%d')])
+        yield "date_scrub"
+
+
+def _sector_filter(session, rng, steps=4):
+    # Random one- or two-sector filters on Home, then back to all sectors
+    sectors = list(session.widget(label="Filter by Sector").options)
+    for _ in range(steps):
+        chosen = rng.choice(sectors, size=min(len(sectors), int(rng.integers(1, 3))), replace=False)
+        session.set_strings(session.widget(label="Filter by Sector"), [str(sector) for sector in chosen])
+        yield "sector_filter"
+    session.set_strings(session.widget(label="Filter by Sector"), [])
+    yield "sector_filter"
+
+
+def _add_commodities(session, rng, steps=4):
+    # Build up a Chart Analysis selection one commodity at a time
+    options = list(session.widget(label="Select Commodities (max 10)").options)
+    chosen = []
+    for commodity in rng.choice(options, size=min(steps, len(options)), replace=False):
+        chosen.append(str(commodity))
+        session.set_strings(session.widget(label="Select Commodities (max 10)"), list(chosen))
+        yield "add_commodities"
+
+
+def _chart_options(session, rng, steps=3):
+    # Needs commodities on the page first; then flips the options inside the Price Charts and Seasonality fragments
+    commodities = session.widget(label="Select Commodities (max 10)")
+    session.set_strings(commodities, list(commodities.options[:2]))
+    yield "select_commodities"
+    for chart_type in ["Candlestick", "Area Chart", "Line Chart"][:steps]:
+        session.set_string(session.widget(key="chart_type"), chart_type)
+        yield "chart_options"
+    session.set_string(session.widget(key="season_frequency"), "Weekly")
+    yield "chart_options"
+
+
+# Interaction scripts: name -> (page, generator of steps). Each yielded step is followed by one timed rerun.
+SCENARIOS = {
+    'date_scrub': (HOME_PAGE, _date_scrub),
+    'sector_filter': (HOME_PAGE, _sector_filter),
+    'add_commodities': (CHART_PAGE, _add_commodities),
+    'chart_options': (CHART_PAGE, _chart_options),
+}
+
+
+def _process_memory(pid):
+    """(current, peak) resident set size of a process in bytes; (None, None) where /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            fields = dict(line.split(":", 1) for line in status if ":" in line)
+        return int(fields['VmRSS'].split()[0]) * 1024, int(fields['VmHWM'].split()[0]) * 1024
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def _wait_until_healthy(url, process, output, startup_timeout):
+    deadline = time.monotonic() + startup_timeout
+    while True:
+        if process.poll() is not None:
+            output.seek(0)
+            raise RuntimeError("The dashboard server exited during start-up:\n" + output.read().decode(errors='replace')[-2000:])
+        try:
+            with urllib.request.urlopen(f"{url}/_stcore/health", timeout=2) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            pass
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"The dashboard server did not answer within {startup_timeout}s")
+        time.sleep(0.5)
+
+
+@contextmanager
+def dashboard_server(project_dir=".", warm=True, startup_timeout=STARTUP_TIMEOUT):
+    """
+    Starts `python cli.py serve` on a free local port, waits until it answers, and stops it on
+    exit. Yields (url, pid). With `warm` the server pre-loads its caches like a deployment does.
+    """
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    command = [
+        sys.executable, "cli.py", "serve", *([] if warm else ["--no-warm-up"]), "--",
+        "--server.headless", "true",
+        "--server.address", "127.0.0.1",
+        "--server.port", str(port),
+        "--server.fileWatcherType", "none",
+        "--browser.gatherUsageStats", "false",
+    ]
+    url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryFile() as output:
+        process = subprocess.Popen(command, cwd=project_dir, stdout=output, stderr=subprocess.STDOUT)
+        try:
+            _wait_until_healthy(url, process, output, startup_timeout)
+            yield url, process.pid
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+
+@contextmanager
+def _external_server(url):
+    # A server the harness didn't start: its process (and memory) is not known
+    yield url, None
+
+
+async def _run_session(stream_url, wire, session_id, scenario, iterations, timeout, seed, record):
+    page, script = SCENARIOS[scenario]
+    rng = np.random.default_rng(seed + session_id)
+    for _ in range(iterations):
+        # Each iteration is a fresh browser tab: new connection, new server session
+        async with connect(stream_url, subprotocols=["streamlit"], max_size=None, open_timeout=timeout) as websocket:
+            session = SimulatedSession(websocket, page, timeout, wire)
+            steps = script(session, rng)
+            step = "initial_load"
+            while step is not None:
+                started = time.perf_counter()
+                try:
+                    errors = await session.rerun()
+                except (asyncio.TimeoutError, WebSocketException, OSError):
+                    # A rerun that never finishes, or a dropped connection, ends this tab
+                    record(session_id, scenario, step, time.perf_counter() - started, 1)
+                    break
+                record(session_id, scenario, step, time.perf_counter() - started, errors)
+                step = next(steps, None)
+
+
+async def _run_sessions(stream_url, wire, assignments, iterations, timeout, seed, record):
+    await asyncio.gather(*[
+        _run_session(stream_url, wire, session_id, scenario, iterations, timeout, seed, record)
+        for session_id, scenario in assignments
+    ])
+
+
+def run_load_test(scenarios=None, sessions=4, iterations=1, timeout=120, seed=0, project_dir=".",
+                  warm=True, url=None, startup_timeout=STARTUP_TIMEOUT, log=print):
+    """
+    Replays the interaction `scenarios` against one dashboard server from `sessions` concurrent
+    simulated browser sessions, each repeated `iterations` times. Sessions are assigned to the
+    scenarios round-robin and all start together.
+
+    The sessions talk to the server over its websocket like browser tabs, so their reruns share
+    the server's caches, script threads and GIL, and queue behind each other as real users' would.
+    Without `url` a server is started from `project_dir` for the run (`warm=False` skips its
+    warm-up, to measure cold caches); with `url` an already running server is used.
+
+    Returns a dict with every timed rerun ('reruns' frame), latency percentiles per step and
+    overall, throughput in reruns/second, error count, and the server's memory (RSS) before
+    and after the load and its peak (None for a server at `url`).
+    """
+    scenarios = list(scenarios or SCENARIOS)
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise ValueError(f"Unknown scenario(s): {', '.join(sorted(unknown))}. Choose from: {', '.join(SCENARIOS)}")
+    # Fails before starting a server when the installed Streamlit is not the pinned release line
+    wire = StreamlitWire()
+
+    rows = []
+
+    def record(session_id, scenario, step, seconds, errors):
+        rows.append({'session': session_id, 'scenario': scenario, 'step': step, 'seconds': seconds, 'errors': errors})
+
+    assignments = [(session_id, scenarios[session_id % len(scenarios)]) for session_id in range(sessions)]
+    with (dashboard_server(project_dir, warm, startup_timeout) if url is None else _external_server(url)) as (server_url, pid):
+        log(f"Running {sessions} session(s) x {iterations} iteration(s) against {server_url} over: {', '.join(scenarios)}")
+        rss_before, _ = _process_memory(pid) if pid else (None, None)
+        stream_url = server_url.replace("http", "ws", 1).rstrip("/") + "/_stcore/stream"
+        started = time.perf_counter()
+        asyncio.run(_run_sessions(stream_url, wire, assignments, iterations, timeout, seed, record))
+        wall_seconds = time.perf_counter() - started
+        rss_after, peak_rss = _process_memory(pid) if pid else (None, None)
+
+    reruns = pd.DataFrame(rows, columns=['session', 'scenario', 'step', 'seconds', 'errors'])
+    return {
+        'reruns': reruns,
+        'latency': latency_summary(reruns),
+        'wall_seconds': wall_seconds,
+        'throughput': len(reruns) / wall_seconds if wall_seconds > 0 else float('nan'),
+        'errors': int(reruns['errors'].sum()),
+        'rss_before': rss_before,
+        'rss_after': rss_after,
+        'peak_rss': peak_rss,
+    }
+
+
+def latency_summary(reruns, percentiles=PERCENTILES):
+    """Rerun latency (ms) per step and overall: count, mean, the given percentiles and max."""
+    def summarize(seconds):
+        ms = seconds.to_numpy() * 1000
+        summary = {'count': len(ms), 'mean': ms.mean() if len(ms) else np.nan}
+        for q in percentiles:
+            summary[f'p{q}'] = np.percentile(ms, q) if len(ms) else np.nan
+        summary['max'] = ms.max() if len(ms) else np.nan
+        return pd.Series(summary)
+
+    per_step = reruns.groupby('step')['seconds'].apply(summarize).unstack()
+    per_step.loc['all'] = summarize(reruns['seconds'])
+    return per_step
+
+
+def format_report(report):
+    """Plain-text report for the command line."""
+    mb = 1024 ** 2
+    if report['rss_after'] is None:
+        memory = "Server memory: not measured (external server)"
+    else:
+        memory = (f"Server memory: RSS {report['rss_before'] / mb:,.0f} MB before the load -> "
+                  f"{report['rss_after'] / mb:,.0f} MB after (peak {report['peak_rss'] / mb:,.0f} MB)")
+    lines = [
+        "Rerun latency (ms):",
+        report['latency'].round(1).to_string(),
+        "",
+        f"Throughput: {report['throughput']:.1f} reruns/s ({len(report['reruns'])} reruns in {report['wall_seconds']:.1f}s)",
+        f"Errors: {report['errors']}",
+        memory,
+    ]
+    return "\n".join(lines)
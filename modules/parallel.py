@@ -0,0 +1,120 @@
+import os
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+
+BACKENDS = ("serial", "thread", "process")
+
+# Defaults can be overridden per deployment without touching the pages
+DEFAULT_BACKEND = os.environ.get("COMMO_EXECUTION_BACKEND", "serial")
+DEFAULT_WORKERS = int(os.environ.get("COMMO_WORKERS", "0")) or None
+
+
+@lru_cache(maxsize=None)
+def _get_executor(backend, workers):
+    # Pools are created once per process and reused across reruns
+    if backend == "thread":
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="commo-shard")
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+def _shard_bounds(commodity_starts, n_shards):
+    """
+    Splits the per-commodity row blocks into at most `n_shards` contiguous groups of
+    roughly equal row counts. Returns a list of (first_row, last_row) pairs.
+    """
+    n_commodities = len(commodity_starts) - 1
+    n_shards = max(1, min(n_shards, n_commodities))
+    targets = np.linspace(0, commodity_starts[-1], n_shards + 1)
+    cuts = np.unique(np.searchsorted(commodity_starts, targets[1:-1]))
+    edges = np.concatenate(([0], cuts[(cuts > 0) & (cuts < n_commodities)], [n_commodities]))
+    return [(int(commodity_starts[a]), int(commodity_starts[b])) for a, b in zip(edges[:-1], edges[1:])]
+
+
+def _sort_by_commodity(df):
+    # Stable sort keeps the original date order inside each commodity block
+    codes, names = pd.factorize(df['Commodities'], sort=True)
+    order = np.argsort(codes, kind='stable')
+    starts = np.searchsorted(codes[order], np.arange(len(names) + 1))
+    return df.iloc[order], starts
+
+
+def _attach_shared(spec):
+    shm = shared_memory.SharedMemory(name=spec['name'])
+    array = np.ndarray(spec['shape'], dtype=spec['dtype'], buffer=shm.buf)
+    return shm, array
+
+
+def _process_shard(func, specs, categories, first, last, args):
+    # Runs inside a pool worker: the column arrays are read straight from shared memory
+    handles = {col: _attach_shared(spec) for col, spec in specs.items()}
+    try:
+        codes = handles['Commodities'][1][first:last]
+        shard = pd.DataFrame({
+            'Date': pd.to_datetime(handles['Date'][1][first:last]),
+            'Commodities': pd.Categorical.from_codes(codes, categories=categories).astype(str),
+            'Price': handles['Price'][1][first:last],
+        }, copy=False)
+        # Detach the result from the shared buffers before they are unmapped below
+        return func(shard, *args).copy()
+    finally:
+        for shm, _ in handles.values():
+            shm.close()
+
+
+def _to_shared(array):
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[:] = array
+    return shm, {'name': shm.name, 'shape': array.shape, 'dtype': array.dtype.str}
+
+
+def map_commodities(func, df, *args, backend=None, workers=None):
+    """
+    Applies `func(shard_df, *args)` to groups of whole commodities and concatenates the results.
+
+    `func` must only depend on the rows of the commodities it is given and return its rows ordered
+    by commodity name, so sharding never changes the answer. Shards are contiguous, sorted by
+    commodity name, and always merged in that order, so every backend returns exactly the same
+    frame as the serial path.
+
+    backend: "serial" (single call on the whole frame), "thread" (shards share the frame's arrays
+    directly) or "process" (Date/Price/commodity-code arrays are placed in shared memory once and
+    read by the workers without copying). `func` must be a module-level function for "process".
+    """
+    backend = backend or DEFAULT_BACKEND
+    workers = workers or DEFAULT_WORKERS or os.cpu_count() or 1
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown execution backend '{backend}'. Choose one of: {', '.join(BACKENDS)}")
+
+    if backend == "serial" or df.empty or workers <= 1:
+        return func(df, *args)
+
+    df_sorted, starts = _sort_by_commodity(df)
+    bounds = _shard_bounds(starts, workers)
+    if len(bounds) <= 1:
+        return func(df, *args)
+
+    executor = _get_executor(backend, workers)
+    if backend == "thread":
+        futures = [executor.submit(func, df_sorted.iloc[first:last], *args) for first, last in bounds]
+        return pd.concat([f.result() for f in futures])
+
+    codes, categories = pd.factorize(df_sorted['Commodities'], sort=True)
+    shared = {
+        'Date': _to_shared(df_sorted['Date'].to_numpy(dtype='datetime64[ns]')),
+        'Commodities': _to_shared(codes.astype(np.int32)),
+        'Price': _to_shared(df_sorted['Price'].to_numpy(dtype=np.float64)),
+    }
+    specs = {col: spec for col, (_, spec) in shared.items()}
+    try:
+        futures = [
+            executor.submit(_process_shard, func, specs, list(categories), first, last, args)
+            for first, last in bounds
+        ]
+        return pd.concat([f.result() for f in futures])
+    finally:
+        for shm, _ in shared.values():
+            shm.close()
+            shm.unlink()
@@ -0,0 +1,150 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from modules.cache import RESULT_CACHE
+from modules.calculations import calculate_store_price_changes, compute_store_price_changes
+
+# Background threads computing neighbouring snapshots; 0 disables prefetching
+PREFETCH_WORKERS = int(os.environ.get("COMMO_PREFETCH_WORKERS", "1"))
+# Trading days on each side of the selected date, and how many earlier month-ends to warm
+PREFETCH_RADIUS = 2
+PREFETCH_PERIOD_ENDS = 3
+
+
+def prefetch_positions(calendar, position, radius=PREFETCH_RADIUS, period_ends=PREFETCH_PERIOD_ENDS):
+    """
+    Calendar positions an analyst is likely to open next from trading day `position`, most likely
+    first: the adjacent trading days, then the previous week-, month- (`period_ends` of them),
+    quarter- and year-ends.
+    """
+    candidates = []
+    for step in range(1, radius + 1):
+        candidates += [position - step, position + step]
+    candidates.append(calendar.anchors['Week'][position])
+    month_end = position
+    for _ in range(period_ends):
+        month_end = calendar.anchors['Month'][month_end] if month_end >= 0 else -1
+        candidates.append(month_end)
+    candidates += [calendar.anchors['Quarter'][position], calendar.anchors['YTD'][position]]
+
+    positions = []
+    for candidate in candidates:
+        candidate = int(candidate)
+        if 0 <= candidate < len(calendar) and candidate != position and candidate not in positions:
+            positions.append(candidate)
+    return positions
+
+
+class Prefetcher:
+    """
+    Computes `calculate_store_price_changes` snapshots on background threads and stores them
+    in `RESULT_CACHE` under the same keys the pages look up, so the next date step is a cache hit.
+
+    Work is tracked per owner (one browser session). Scheduling again for an owner cancels its
+    queued dates, and dates that were queued for an older request are skipped when they come up.
+    An owner's entries are dropped as soon as its queued work is done, so sessions that end
+    leave nothing behind.
+    """
+
+    def __init__(self, workers=PREFETCH_WORKERS):
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="commo-prefetch") if workers > 0 else None
+        # Re-entrant: cancelling a future runs its done callback, which takes the lock, in the calling thread
+        self._lock = threading.RLock()
+        self._generations = {}
+        self._pending = {}
+        self.stats = {'scheduled': 0, 'computed': 0, 'cancelled': 0, 'skipped': 0, 'failed': 0}
+
+    def schedule(self, owner, store, df_list, selected_date, calendar):
+        """
+        Replaces `owner`'s pending work with the neighbours of `selected_date`.
+        Returns the dates queued (already cached dates are left out).
+        """
+        if self._executor is None:
+            return []
+        position = calendar.position_of(pd.to_datetime(selected_date))
+        with self._lock:
+            generation = self._generations.get(owner, 0) + 1
+            self._generations[owner] = generation
+            for future in self._pending.pop(owner, []):
+                if future.cancel():
+                    self.stats['cancelled'] += 1
+            if position < 0:
+                self._generations.pop(owner, None)
+                return []
+
+            queued, futures = [], []
+            for candidate in prefetch_positions(calendar, position):
+                date = calendar.dates[candidate]
+                key = calculate_store_price_changes.cache_key(store, store.version, df_list, date)
+                if (calculate_store_price_changes.namespace, key) in RESULT_CACHE:
+                    continue
+                futures.append(self._executor.submit(self._run, owner, generation, store, df_list, date, calendar, key))
+                queued.append(date)
+            self.stats['scheduled'] += len(futures)
+            if not futures:
+                self._generations.pop(owner, None)
+                return queued
+            self._pending[owner] = futures
+            # Added once the batch is registered, so a future that already finished sees all of it
+            for future in futures:
+                future.add_done_callback(lambda _, owner=owner, generation=generation: self._finished(owner, generation))
+        return queued
+
+    def _finished(self, owner, generation):
+        with self._lock:
+            if self._generations.get(owner) != generation:
+                return
+            if all(future.done() for future in self._pending.get(owner, [])):
+                self._pending.pop(owner, None)
+                self._generations.pop(owner, None)
+
+    def _run(self, owner, generation, store, df_list, date, calendar, key):
+        if self._generations.get(owner) != generation:
+            # The analyst has moved on since this date was queued
+            self._count('skipped')
+            return
+        namespace = calculate_store_price_changes.namespace
+        if (namespace, key) in RESULT_CACHE:
+            return
+        try:
+            result = compute_store_price_changes(store, df_list, date, calendar)
+        except Exception:
+            # Prefetching is best effort; the page computes (and reports) the date if it is opened
+            self._count('failed')
+            return
+        RESULT_CACHE.put(namespace, key, result)
+        self._count('computed')
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def forget(self, owner):
+        """Cancels and forgets everything queued for `owner`."""
+        with self._lock:
+            self._generations.pop(owner, None)
+            for future in self._pending.pop(owner, []):
+                future.cancel()
+
+    def wait(self):
+        """Blocks until the currently queued work is done (used by tools and tests)."""
+        with self._lock:
+            futures = [future for pending in self._pending.values() for future in pending]
+        for future in futures:
+            if not future.cancelled():
+                future.exception()
+
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+
+def get_prefetcher():
+    """The process-wide `Prefetcher`, created on first use."""
+    global _prefetcher
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = Prefetcher()
+        return _prefetcher
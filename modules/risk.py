@@ -0,0 +1,195 @@
+import numpy as np
+import pandas as pd
+from modules.cache import bounded_cache, VERSIONS_IN_MEMORY
+from modules.store import from_day_offsets
+
+# Rolling return-volatility windows: label -> rows of the trading calendar (None: one year of it)
+VOLATILITY_WINDOWS = {'20D': 20, '60D': 60, '1Y': None}
+BETA_WINDOW = '1Y'
+# Fewest returns in a window for a volatility or beta estimate
+MIN_OBSERVATIONS = 10
+DEFAULT_BENCHMARK = 'Brent'
+
+RISK_COLUMNS = [f'Vol {label}' for label in VOLATILITY_WINDOWS] + ['Drawdown', 'Max DD', 'Max DD Days', 'Beta']
+# Overlays for the price charts: label -> column of `RiskPanel.series`
+RISK_OVERLAYS = {
+    **{f'Volatility {label}': f'Vol {label}' for label in VOLATILITY_WINDOWS},
+    'Drawdown': 'Drawdown',
+    f'Beta {BETA_WINDOW}': 'Beta',
+}
+
+
+def periods_per_year(dates):
+    """Rows per year of a date calendar: ~252 for trading days, ~365 for daily data, 52 for weekly."""
+    dates = pd.DatetimeIndex(dates)
+    if len(dates) < 2:
+        return 252
+    years = (dates[-1] - dates[0]).days / 365.25
+    return max(int(round((len(dates) - 1) / years)), 1) if years > 0 else 252
+
+
+def _rolling_sum(values, window):
+    # Sum of the last `window` rows at every row (NaN counts as 0), from one cumulative sum
+    cumulative = np.concatenate([np.zeros((1, values.shape[1])), np.cumsum(np.nan_to_num(values), axis=0)])
+    ends = np.arange(1, len(values) + 1)
+    return cumulative[ends] - cumulative[np.maximum(ends - window, 0)]
+
+
+def _wide_prices(df):
+    # (date x commodity) prices, the last row winning where a commodity has several on one date
+    return df.pivot_table(index='Date', columns='Commodities', values='Price', aggfunc='last').sort_index()
+
+
+class RiskPanel:
+    """
+    Return-based risk measures for every commodity at once, on the wide (date x commodity) panel.
+
+    Each commodity's return on a date is its change since its previous price, so gaps in its
+    history don't count as flat days. Rolling volatilities are annualized standard deviations of
+    those returns; drawdowns are measured against the running peak of the as-of price. Everything
+    is computed with whole-panel array operations (cumulative sums and running maxima), not per commodity.
+    """
+
+    def __init__(self, df):
+        self._set_panel(_wide_prices(df))
+
+    @classmethod
+    def from_source(cls, source, batch_size=32):
+        """
+        Builds the panel of a price source (`PriceStore`, `DatabasePriceStore`, ...) reading
+        `batch_size` commodities at a time, so the full history is never held as a long frame.
+        """
+        dates = pd.DatetimeIndex(from_day_offsets(source.trading_days()), name='Date')
+        names = pd.Index(sorted(source.names), name='Commodities')
+        values = np.full((len(dates), len(names)), np.nan)
+        for start in range(0, len(names), batch_size):
+            batch = names[start:start + batch_size]
+            values[:, start:start + len(batch)] = _wide_prices(source.to_frame(batch)).reindex(index=dates, columns=batch).to_numpy()
+        # Like a panel built from a frame, it only has columns for commodities that have prices
+        priced = ~np.isnan(values).all(axis=0)
+        panel = cls.__new__(cls)
+        panel._set_panel(pd.DataFrame(values[:, priced], index=dates, columns=names[priced]))
+        return panel
+
+    def _set_panel(self, panel):
+        self.dates = panel.index
+        self.names = pd.Index(panel.columns, name='Commodities')
+        self.periods_per_year = periods_per_year(self.dates)
+        self.windows = {label: rows or self.periods_per_year for label, rows in VOLATILITY_WINDOWS.items()}
+
+        observed = panel.notna().to_numpy()
+        self.prices = panel.ffill().to_numpy(dtype=np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            returns = self.prices[1:] / self.prices[:-1] - 1
+        returns = np.concatenate([np.full((1, len(self.names)), np.nan), returns])
+        returns[~observed | ~np.isfinite(returns)] = np.nan
+        self.returns = returns
+
+        self.volatility = {label: self._rolling_std(window) for label, window in self.windows.items()}
+
+        peak = np.fmax.accumulate(self.prices, axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.drawdown = self.prices / peak - 1
+        # Row where the running peak was first reached, at every date (flat days keep the earlier row)
+        previous_peak = np.concatenate([np.full((1, len(self.names)), np.nan), peak[:-1]])
+        new_peak = (self.prices > previous_peak) | (np.isnan(previous_peak) & ~np.isnan(self.prices))
+        rows = np.arange(len(self.dates))[:, None]
+        self._peak_row = np.maximum.accumulate(np.where(new_peak, rows, 0), axis=0)
+        self._betas = {}
+
+    def _rolling_std(self, window):
+        valid = ~np.isnan(self.returns)
+        count = _rolling_sum(valid, window)
+        total = _rolling_sum(self.returns, window)
+        squares = _rolling_sum(self.returns ** 2, window)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            variance = np.maximum(squares - total ** 2 / count, 0) / (count - 1)
+        return np.where(count >= MIN_OBSERVATIONS, np.sqrt(variance * self.periods_per_year), np.nan)
+
+    def beta(self, benchmark, window=BETA_WINDOW):
+        """(dates x commodities) rolling beta of daily returns against `benchmark`, on dates both have a return."""
+        key = (benchmark, window)
+        if key not in self._betas:
+            position = self.names.get_indexer([benchmark])[0]
+            if position < 0:
+                raise KeyError(benchmark)
+            rows = self.windows[window]
+            market = self.returns[:, [position]]
+            paired = ~np.isnan(self.returns) & ~np.isnan(market)
+            x = np.where(paired, market, 0.0)
+            y = np.where(paired, self.returns, 0.0)
+            count = _rolling_sum(paired, rows)
+            sum_x, sum_y = _rolling_sum(x, rows), _rolling_sum(y, rows)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                covariance = _rolling_sum(x * y, rows) - sum_x * sum_y / count
+                variance = _rolling_sum(x * x, rows) - sum_x ** 2 / count
+                beta = covariance / variance
+            self._betas[key] = np.where((count >= MIN_OBSERVATIONS) & (variance > 0), beta, np.nan)
+        return self._betas[key]
+
+    def _row(self, date):
+        return int(np.searchsorted(self.dates, pd.Timestamp(date), side='right')) - 1
+
+    def max_drawdown(self, date):
+        """
+        Per commodity, the deepest drawdown from the start of the history to `date` and its
+        duration in days: from the peak to the recovery of that peak, or to `date` if not recovered.
+        """
+        row = self._row(date)
+        if row < 0:
+            return pd.DataFrame({'Max DD': np.nan, 'Max DD Days': np.nan}, index=self.names)
+        drawdown = self.drawdown[:row + 1]
+        columns = np.arange(len(self.names))
+        trough = np.argmin(np.where(np.isnan(drawdown), np.inf, drawdown), axis=0)
+        deepest = drawdown[trough, columns]
+        peak = self._peak_row[trough, columns]
+        # The peak is recovered at the first row after the trough that is back at the peak price
+        rows = np.arange(row + 1)[:, None]
+        recovered = (self.prices[:row + 1] >= self.prices[peak, columns]) & (rows > trough)
+        end = np.where(recovered.any(axis=0), recovered.argmax(axis=0), row)
+        days = (self.dates[end] - self.dates[peak]).days.to_numpy().astype(float)
+        days[deepest == 0] = 0
+        days[np.isnan(deepest)] = np.nan
+        return pd.DataFrame({'Max DD': deepest, 'Max DD Days': days}, index=self.names)
+
+    def snapshot(self, date, benchmark=None):
+        """One row per commodity with `RISK_COLUMNS` as of `date` (Beta only with a benchmark)."""
+        row = self._row(date)
+        frame = pd.DataFrame(index=self.names, columns=RISK_COLUMNS, dtype=float)
+        if row < 0:
+            return frame
+        for label, volatility in self.volatility.items():
+            frame[f'Vol {label}'] = volatility[row]
+        frame['Drawdown'] = self.drawdown[row]
+        frame[['Max DD', 'Max DD Days']] = self.max_drawdown(date)
+        if benchmark is not None and benchmark in self.names:
+            frame['Beta'] = self.beta(benchmark)[row]
+        return frame
+
+    def series(self, commodity, benchmark=None, start=None, end=None):
+        """Daily risk history of one commodity (volatilities, drawdown and, with a benchmark, beta)."""
+        position = self.names.get_indexer([commodity])[0]
+        if position < 0:
+            raise KeyError(commodity)
+        columns = {f'Vol {label}': volatility[:, position] for label, volatility in self.volatility.items()}
+        columns['Drawdown'] = self.drawdown[:, position]
+        if benchmark is not None and benchmark in self.names:
+            columns['Beta'] = self.beta(benchmark)[:, position]
+        frame = pd.DataFrame(columns, index=self.dates)
+        return frame.loc[start:end]
+
+
+@bounded_cache(max_entries=VERSIONS_IN_MEMORY)
+def build_risk_panel(_store, store_version):
+    """
+    Builds the `RiskPanel` for a price source once per data version.
+    """
+    return RiskPanel.from_source(_store)
+
+
+@bounded_cache
+def risk_snapshot(_store, store_version, selected_date, benchmark=None):
+    """
+    Cached `RiskPanel.snapshot` for the Home table: one row per commodity, indexed by name.
+    """
+    return build_risk_panel(_store, store_version).snapshot(selected_date, benchmark)
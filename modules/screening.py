@@ -0,0 +1,260 @@
+import pandas as pd
+import numpy as np
+from modules.cache import bounded_cache
+from modules.calculations import calculate_store_price_changes, compute_store_price_changes
+from modules.trading_calendar import TradingCalendar, HORIZONS, WINDOWS, build_trading_calendar
+from modules.store import from_day_offsets
+
+# Screening rules: name -> boolean `DataFrame.eval` expression over one row per commodity.
+# Columns come from `calculate_price_changes` ('Current Price', '%Day', '52W High', ...) plus
+# `ScreeningEngine.indicators` ('Prev Price', 'MA50', 'Prev MA50', 'MA200', 'Prev MA200', 'Day Z').
+# `@sigma` is the threshold passed to `screen`.
+SCREEN_RULES = {
+    'New 52W high': "`Current Price` >= `52W High` and `%Day` > 0",
+    'New 52W low': "`Current Price` <= `52W Low` and `%Day` < 0",
+    'Daily move above N sigma': "abs(`Day Z`) > @sigma",
+    'Crossed above MA50': "`Prev Price` <= `Prev MA50` and `Current Price` > `MA50`",
+    'Crossed below MA50': "`Prev Price` >= `Prev MA50` and `Current Price` < `MA50`",
+    'Crossed above MA200': "`Prev Price` <= `Prev MA200` and `Current Price` > `MA200`",
+    'Crossed below MA200': "`Prev Price` >= `Prev MA200` and `Current Price` < `MA200`",
+}
+
+DEFAULT_SIGMA = 2.0
+# Daily returns used for the 'Day Z' volatility, and the fewest that give a usable estimate
+SIGMA_WINDOW = 60
+MIN_SIGMA_OBSERVATIONS = 20
+# Trading days kept by the engine: MA200 today and yesterday
+LOOKBACK = 201
+# Price rows kept for the 52W high/low: a 52-week window never spans more than 365 distinct dates
+HIGH_LOW_ROWS = 365
+# `calculate_price_changes` columns the engine keeps current by itself; rules using any other
+# (e.g. '%Week' or '30D Avg') make `screen_range` compute the full snapshot for every day
+ENGINE_COLUMNS = ['Current Price', '%Day', '52W High', '52W Low']
+LISTING_COLUMNS = ['Sector', 'Nation', 'Impact']
+
+MATCH_COLUMNS = ['Date', 'Rule', 'Commodities', 'Sector', 'Current Price', '%Day', 'Day Z', 'MA50', 'MA200']
+
+
+def register_screen(name, expression):
+    """Adds a screening rule, e.g. `register_screen('Above 30D avg', "`Current Price` > `30D Avg`")`."""
+    SCREEN_RULES[name] = expression
+
+
+def _window_start(date):
+    return WINDOWS['52W'](pd.DatetimeIndex([date]))[0].to_datetime64()
+
+
+def _reduce(function, rows, width):
+    # Column-wise max/min ignoring NaN; NaN for columns without any row
+    return function.reduce(rows, axis=0) if len(rows) else np.full(width, np.nan)
+
+
+class ScreeningEngine:
+    """
+    Trailing as-of price window (last `LOOKBACK` trading days x every commodity) for the
+    indicators the screening rules need, plus the running 52W high and low.
+
+    Both are ring buffers: `advance` adds one trading day and drops the oldest, so keeping
+    the screen current costs the same whatever the history length. Commodities without a
+    price on a day keep their previous price in the as-of window; the 52W high/low only count
+    actual prices, like `calculate_price_changes`. They are updated with the new day's prices
+    and only recomputed, for the affected commodities, when a high or low leaves the window.
+    """
+
+    def __init__(self, names, dates, prices, lookback=LOOKBACK, observed_dates=(), observed=None):
+        self.names = pd.Index(names, name='Commodities')
+        self.lookback = lookback
+        prices = np.asarray(prices, dtype=np.float64)[-lookback:]
+        self._buffer = np.full((lookback, len(self.names)), np.nan)
+        self._buffer[lookback - len(prices):] = prices
+        self._head = 0
+        self.dates = list(pd.DatetimeIndex(dates)[-lookback:])
+
+        # Actual prices (NaN: no row that day) of the last `HIGH_LOW_ROWS` trading days
+        observed = np.empty((0, len(self.names))) if observed is None else np.asarray(observed, dtype=np.float64)[-HIGH_LOW_ROWS:]
+        self._observed = np.full((HIGH_LOW_ROWS, len(self.names)), np.nan)
+        self._observed[HIGH_LOW_ROWS - len(observed):] = observed
+        self._observed_days = np.full(HIGH_LOW_ROWS, np.datetime64('NaT'), dtype='datetime64[ns]')
+        self._observed_days[HIGH_LOW_ROWS - len(observed):] = pd.DatetimeIndex(observed_dates)[-HIGH_LOW_ROWS:]
+        self._observed_head = 0
+        self._cutoff = _window_start(self.dates[-1]) if self.dates else np.datetime64('NaT')
+        inside = self._observed[self._observed_days >= self._cutoff]
+        self.high = _reduce(np.fmax, inside, len(self.names))
+        self.low = _reduce(np.fmin, inside, len(self.names))
+
+    @classmethod
+    def from_store(cls, store, calendar, date, lookback=LOOKBACK):
+        """Engine as of trading day `date`, built from the last `lookback` trading days of a price store."""
+        position = calendar.position_of(pd.to_datetime(date))
+        if position < 0:
+            return cls(store.names, [], np.empty((0, len(store.names))), lookback)
+        window_dates = calendar.dates[max(0, position - lookback + 1):position + 1]
+        high_low_dates = calendar.dates[calendar.window_starts['52W'][position]:position + 1]
+        history = store.window_frame(min(window_dates[0], high_low_dates[0]), window_dates[-1])
+        panel = history.pivot_table(index='Date', columns='Commodities', values='Price', aggfunc='last')
+        panel = panel.reindex(columns=store.names)
+        observed = panel.reindex(high_low_dates)
+        # Anchor rows before the window carry each commodity's price into it
+        panel = panel.reindex(panel.index.union(window_dates)).ffill().reindex(window_dates)
+        return cls(store.names, window_dates, panel.to_numpy(), lookback, high_low_dates, observed.to_numpy())
+
+    @property
+    def last_date(self):
+        return self.dates[-1] if self.dates else None
+
+    def window(self):
+        """(lookback, commodities) as-of prices, oldest first."""
+        return np.concatenate([self._buffer[self._head:], self._buffer[:self._head]])
+
+    def advance(self, date, day_rows):
+        """
+        Adds trading day `date` from its Commodities/Price rows. Only that day's rows are read;
+        unknown commodities are ignored.
+        """
+        date = pd.Timestamp(date)
+        if self.dates and date <= self.dates[-1]:
+            raise ValueError(f"{date:%Y-%m-%d} is not after the engine's last day ({self.dates[-1]:%Y-%m-%d}).")
+        today = np.full(len(self.names), np.nan)
+        codes = self.names.get_indexer(day_rows['Commodities'])
+        known = codes >= 0
+        today[codes[known]] = day_rows['Price'].to_numpy(dtype=np.float64)[known]
+
+        last = self._buffer[self._head - 1].copy()
+        last[~np.isnan(today)] = today[~np.isnan(today)]
+        self._buffer[self._head] = last
+        self._head = (self._head + 1) % self.lookback
+        self.dates = (self.dates + [date])[-self.lookback:]
+
+        # Days that fall out of the 52W window: a high or low among them is recomputed from the rest
+        cutoff = _window_start(date)
+        leaving = (self._observed_days >= self._cutoff) & (self._observed_days < cutoff)
+        self._cutoff = cutoff
+        if leaving.any():
+            inside = self._observed_days >= cutoff
+            for running, function in ((self.high, np.fmax), (self.low, np.fmin)):
+                stale = np.any(self._observed[leaving] == running, axis=0)
+                if stale.any():
+                    running[stale] = _reduce(function, self._observed[inside][:, stale], int(stale.sum()))
+        # The slot overwritten is the oldest day, already outside the window
+        self._observed[self._observed_head] = today
+        self._observed_days[self._observed_head] = date.to_datetime64()
+        self._observed_head = (self._observed_head + 1) % HIGH_LOW_ROWS
+        np.fmax(self.high, today, out=self.high)
+        np.fmin(self.low, today, out=self.low)
+
+    def metrics(self, df_list):
+        """
+        `ENGINE_COLUMNS` for the last day, one row per commodity that has a price, with Sector,
+        Nation and Impact from the commodity list: the part of `calculate_price_changes` the
+        engine maintains itself.
+        """
+        prices = self.window()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            day_change = prices[-1] / prices[-2] - 1
+        frame = pd.DataFrame({
+            'Current Price': prices[-1],
+            '%Day': day_change,
+            '52W High': self.high,
+            '52W Low': self.low,
+        }, index=self.names)
+        listing = df_list.drop_duplicates('Commodities', keep='first').set_index('Commodities')
+        frame = frame.join(listing.reindex(columns=LISTING_COLUMNS), how='left')
+        return frame[frame['Current Price'].notna()].reset_index()
+
+    def indicators(self):
+        """Prev Price, MA50/MA200 for today and yesterday, and the daily-return volatility, per commodity."""
+        prices = self.window()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            returns = prices[1:] / prices[:-1] - 1
+            # Volatility of the returns before today, so today's move is measured against it
+            past = returns[-SIGMA_WINDOW - 1:-1]
+            count = np.sum(~np.isnan(past), axis=0)
+            mean = np.nansum(past, axis=0) / count
+            variance = np.nansum((past - mean) ** 2, axis=0) / (count - 1)
+            return_std = np.where(count >= MIN_SIGMA_OBSERVATIONS, np.sqrt(variance), np.nan)
+        # A moving average needs a full window; any gap (not yet listed) gives NaN
+        return pd.DataFrame({
+            'Prev Price': prices[-2],
+            'MA50': prices[-50:].mean(axis=0),
+            'Prev MA50': prices[-51:-1].mean(axis=0),
+            'MA200': prices[-200:].mean(axis=0),
+            'Prev MA200': prices[-201:-1].mean(axis=0),
+            'Return Std': return_std,
+        }, index=self.names)
+
+
+def screen(metrics, indicators, rules=None, sigma=DEFAULT_SIGMA, date=None):
+    """
+    Evaluates `rules` (names from `SCREEN_RULES`, default all) across every commodity at once.
+    `metrics` is a `calculate_price_changes` frame. Returns one row per (rule, commodity) match.
+    """
+    if metrics.empty:
+        return pd.DataFrame(columns=MATCH_COLUMNS)
+    frame = metrics.set_index('Commodities').join(indicators, how='left')
+    frame['Day Z'] = frame['%Day'] / frame['Return Std'].replace(0, np.nan)
+
+    matches = []
+    for name in (rules or SCREEN_RULES):
+        hits = frame.eval(SCREEN_RULES[name], local_dict={'sigma': sigma}, engine='python').fillna(False).astype(bool)
+        if hits.any():
+            matches.append(frame[hits.to_numpy()].reset_index().assign(Rule=name, Date=date))
+    if not matches:
+        return pd.DataFrame(columns=MATCH_COLUMNS)
+    return pd.concat(matches, ignore_index=True)[MATCH_COLUMNS]
+
+
+@bounded_cache
+def screen_snapshot(_store, store_version, df_list, selected_date, sigma=DEFAULT_SIGMA, rules=None):
+    """
+    Screening matches for one date, reusing the cached `calculate_store_price_changes` snapshot.
+    """
+    calendar = build_trading_calendar(_store, store_version)
+    position = calendar.position_of(pd.to_datetime(selected_date))
+    if position < 0:
+        return pd.DataFrame(columns=MATCH_COLUMNS)
+    metrics = calculate_store_price_changes(_store, store_version, df_list, selected_date)
+    engine = ScreeningEngine.from_store(_store, calendar, calendar.dates[position])
+    return screen(metrics, engine.indicators(), rules, sigma, date=calendar.dates[position])
+
+
+def _snapshot_columns():
+    # Snapshot columns the engine doesn't maintain: every horizon but '%Day', the 30D average and the change type
+    horizons = [f'%{name}' for name in HORIZONS if name != 'Day']
+    return [*horizons, '30D Avg', 'Change type']
+
+
+def screen_range(store, df_list, start, end, sigma=DEFAULT_SIGMA, rules=None, calendar=None):
+    """
+    Screens every trading day from `start` to `end`. The engine is built once for the first day
+    and then advanced one day at a time, reading only each new day's rows. Rules that use
+    columns other than `ENGINE_COLUMNS` need the full `calculate_price_changes` snapshot, which
+    reads a year of history per day.
+    """
+    if calendar is None:
+        calendar = TradingCalendar(from_day_offsets(store.trading_days()))
+    first, last = calendar.position_of(pd.to_datetime(start)), calendar.position_of(pd.to_datetime(end))
+    first = max(first, 0)
+    if last < first:
+        return pd.DataFrame(columns=MATCH_COLUMNS)
+
+    full_snapshot = any(
+        column in SCREEN_RULES[name]
+        for name in (rules or SCREEN_RULES)
+        for column in _snapshot_columns()
+    )
+    engine = ScreeningEngine.from_store(store, calendar, calendar.dates[first])
+    results = []
+    for position in range(first, last + 1):
+        date = calendar.dates[position]
+        if position > first:
+            engine.advance(date, store.to_frame(start=date, end=date))
+        if full_snapshot:
+            metrics = compute_store_price_changes(store, df_list, date, calendar)
+        else:
+            metrics = engine.metrics(df_list)
+        matches = screen(metrics, engine.indicators(), rules, sigma, date=date)
+        if not matches.empty:
+            results.append(matches)
+    if not results:
+        return pd.DataFrame(columns=MATCH_COLUMNS)
+    return pd.concat(results, ignore_index=True)
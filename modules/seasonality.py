@@ -0,0 +1,145 @@
+import pandas as pd
+import numpy as np
+from modules.cache import bounded_cache, VERSIONS_IN_MEMORY
+
+# Calendar periods: frequency -> (periods per year, label of each period)
+FREQUENCIES = {
+    'M': (12, [pd.Timestamp(2000, month, 1).strftime('%b') for month in range(1, 13)]),
+    'W': (52, [f"W{week}" for week in range(1, 53)]),
+}
+
+
+def period_of(dates, frequency):
+    """0-based calendar period of each date: month, or week of year (days 358+ fold into week 52)."""
+    dates = pd.DatetimeIndex(dates)
+    if frequency == 'M':
+        return dates.month.to_numpy() - 1
+    return np.minimum((dates.dayofyear.to_numpy() - 1) // 7, 51)
+
+
+def _period_closes(df, names, years, frequency):
+    """
+    (commodity x year*period) array of the last price of each of `names` in every calendar period
+    of `years`, written into a flat timeline per commodity (NaN where there is no price).
+    """
+    periods_per_year = FREQUENCIES[frequency][0]
+    closes = np.full((len(names), len(years) * periods_per_year), np.nan)
+    if not len(df):
+        return closes
+    dates = pd.DatetimeIndex(df['Date'])
+    codes = names.get_indexer(df['Commodities'])
+    slots = (dates.year.to_numpy() - years[0]) * periods_per_year + period_of(dates, frequency)
+    order = np.lexsort((dates.to_numpy(), slots, codes))
+    codes, slots = codes[order], slots[order]
+    last = np.ones(len(order), dtype=bool)
+    last[:-1] = (codes[1:] != codes[:-1]) | (slots[1:] != slots[:-1])
+    closes[codes[last], slots[last]] = df['Price'].to_numpy(dtype=np.float64)[order][last]
+    return closes
+
+
+class SeasonalityCube:
+    """
+    Period returns for every commodity, year and calendar period, as one
+    (commodity x year x period) array computed from the full history.
+
+    `returns[c, y, p]` is the % change of commodity `c` from the end of the period before `p`
+    to the end of `p` in year `years[y]` (NaN where the history does not cover it). Profiles and
+    year-over-year overlays are reductions or slices of the cube; nothing is resampled per request.
+    """
+
+    def __init__(self, df, frequency='M'):
+        dates = pd.DatetimeIndex(df['Date'])
+        names = pd.Index(sorted(df['Commodities'].unique()), name='Commodities')
+        years = np.arange(dates.year.min(), dates.year.max() + 1) if len(df) else np.array([], dtype=int)
+        self._set_closes(names, years, _period_closes(df, names, years, frequency), frequency)
+
+    @classmethod
+    def from_source(cls, source, frequency='M', batch_size=32):
+        """
+        Builds the cube of a price source (`PriceStore`, `DatabasePriceStore`, ...) reading
+        `batch_size` commodities at a time, so the full history is never held as a single frame.
+        """
+        first, last = source.date_bounds()
+        years = np.arange(first.year, last.year + 1) if first is not None else np.array([], dtype=int)
+        names = pd.Index(sorted(source.names), name='Commodities')
+        closes = np.full((len(names), len(years) * FREQUENCIES[frequency][0]), np.nan)
+        for start in range(0, len(names), batch_size):
+            batch = names[start:start + batch_size]
+            closes[start:start + len(batch)] = _period_closes(source.to_frame(batch), batch, years, frequency)
+        # Like a cube built from a frame, it only lists commodities that have prices
+        priced = ~np.isnan(closes).all(axis=1)
+        cube = cls.__new__(cls)
+        cube._set_closes(names[priced], years, closes[priced], frequency)
+        return cube
+
+    def _set_closes(self, names, years, closes, frequency):
+        periods_per_year, self.labels = FREQUENCIES[frequency]
+        self.frequency = frequency
+        self.names = names
+        self.years = years
+        with np.errstate(invalid='ignore', divide='ignore'):
+            changes = closes[:, 1:] / closes[:, :-1] - 1
+        returns = np.concatenate([np.full((len(names), 1), np.nan), changes], axis=1)
+        self.returns = returns.reshape(len(names), len(years), periods_per_year)
+
+    def _commodity(self, commodity):
+        position = self.names.get_indexer([commodity])[0]
+        if position < 0:
+            raise KeyError(commodity)
+        return self.returns[position]
+
+    def profile(self, commodity, percentiles=(25, 75)):
+        """
+        Per calendar period: mean and median return, the given percentiles, the share of
+        positive years and the number of years observed.
+        """
+        by_year = self._commodity(commodity)
+        observed = ~np.isnan(by_year)
+        count = observed.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.nansum(by_year, axis=0) / count
+            positive = np.sum(by_year > 0, axis=0) / count
+        # nanpercentile warns on all-NaN periods, so those are left NaN explicitly
+        sorted_years = np.sort(np.where(observed, by_year, np.inf), axis=0)
+        columns = {'Mean': mean, 'Median': self._quantile(sorted_years, count, 50)}
+        for q in percentiles:
+            columns[f'P{q}'] = self._quantile(sorted_years, count, q)
+        columns['Positive Share'] = positive
+        columns['Years'] = count
+        return pd.DataFrame(columns, index=pd.Index(self.labels, name='Period'))
+
+    @staticmethod
+    def _quantile(sorted_values, count, q):
+        # Linear-interpolation percentile over the first `count` sorted values of each column
+        position = (count - 1) * q / 100
+        lower = np.floor(position).astype(int).clip(min=0)
+        upper = np.ceil(position).astype(int).clip(min=0)
+        columns = np.arange(sorted_values.shape[1])
+        low = sorted_values[lower, columns] if len(sorted_values) else np.full(len(columns), np.nan)
+        high = sorted_values[upper, columns] if len(sorted_values) else np.full(len(columns), np.nan)
+        with np.errstate(invalid='ignore'):
+            values = low + (high - low) * (position - lower)
+        return np.where(count > 0, values, np.nan)
+
+    def year_overlay(self, commodity):
+        """Cumulative return since the start of each year, one row per year and one column per period."""
+        by_year = self._commodity(commodity)
+        growth = np.nancumprod(1 + by_year, axis=1) - 1
+        # Periods after the last observation of a year stay empty instead of repeating the total
+        last_observed = np.where(~np.isnan(by_year), np.arange(by_year.shape[1]), -1).max(axis=1)
+        growth[np.arange(by_year.shape[1]) > last_observed[:, None]] = np.nan
+        first_observed = np.where(~np.isnan(by_year), np.arange(by_year.shape[1]), by_year.shape[1]).min(axis=1)
+        growth[np.arange(by_year.shape[1]) < first_observed[:, None]] = np.nan
+        return pd.DataFrame(growth, index=pd.Index(self.years, name='Year'), columns=self.labels)
+
+    def table(self, commodity):
+        """Year x period returns for one commodity (the heatmap view of the cube)."""
+        return pd.DataFrame(self._commodity(commodity), index=pd.Index(self.years, name='Year'), columns=self.labels)
+
+
+@bounded_cache(max_entries=VERSIONS_IN_MEMORY * len(FREQUENCIES))
+def build_seasonality(_store, store_version, frequency='M'):
+    """
+    Builds the `SeasonalityCube` for a price source once per data version and frequency.
+    """
+    return SeasonalityCube.from_source(_store, frequency)
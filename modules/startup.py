@@ -0,0 +1,141 @@
+import time
+import logging
+import importlib
+import threading
+from contextlib import contextmanager
+import pandas as pd
+
+# Cold-start breakdown of this process: stage -> seconds, first measurement only
+STARTUP_TIMINGS = {}
+_timings_lock = threading.Lock()
+_warm_up_lock = threading.Lock()
+_warmed_up = False
+_BARE_MODE_LOGGERS = (
+    "streamlit.runtime.caching.cache_data_api",
+    "streamlit.runtime.scriptrunner_utils.script_run_context",
+)
+
+
+@contextmanager
+def timed(stage):
+    """Records how long the block takes under `stage`, the first time that stage runs in this process."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _timings_lock:
+            STARTUP_TIMINGS.setdefault(stage, time.perf_counter() - started)
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is imported on first attribute access, e.g.
+    `go = lazy_import("plotly.graph_objects")` and later `go.Figure()`.
+    The import time is recorded in `STARTUP_TIMINGS`.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            with timed(f"import {self._name}"):
+                self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+def lazy_import(name):
+    return LazyModule(name)
+
+
+def warm_up(log=print):
+    """
+    Loads everything a first request would otherwise pay for: plotting libraries, the price
+    source with its derived series, the commodity list and catalog, the trading calendar, the
+    latest Home snapshot and screen, the Chart Analysis OHLC pyramid and seasonality cube, and
+    the risk panel. A changed `Data.csv` is also recorded in the data version log.
+
+    Results land in the process-wide Streamlit and result caches, so run it in the server
+    process before it takes traffic (see `python cli.py serve`). Runs once per process;
+    returns the `STARTUP_TIMINGS` breakdown.
+    """
+    global _warmed_up
+    with _warm_up_lock:
+        if _warmed_up:
+            return dict(STARTUP_TIMINGS)
+
+        with timed("import plotly.graph_objects"):
+            importlib.import_module("plotly.graph_objects")
+        with timed("import plotly.subplots"):
+            importlib.import_module("plotly.subplots")
+        with timed("import modules"):
+            from modules.data_loader import load_price_source, load_commodity_list, record_price_file_version
+            from modules.catalog import build_catalog
+            from modules.trading_calendar import build_trading_calendar
+            from modules.calculations import calculate_store_price_changes
+            from modules.screening import screen_snapshot
+            from modules.aggregation import build_ohlc_pyramid
+            from modules.seasonality import build_seasonality
+            from modules.risk import build_risk_panel
+
+        # Cached loaders called outside a script run warn that there is no session; nothing is wrong
+        quiet = [logging.getLogger(name) for name in _BARE_MODE_LOGGERS]
+        levels = [logger.level for logger in quiet]
+        for logger in quiet:
+            logger.setLevel(logging.ERROR)
+        try:
+            with timed("load price data"):
+                store = load_price_source()
+            # Pages never write the version log; a changed Data.csv is recorded here, before traffic
+            with timed("record data version"):
+                entry = record_price_file_version()
+            if entry is not None:
+                log(f"Recorded data version {entry['version']}: +{entry['inserted']} ~{entry['changed']} -{entry['deleted']} rows")
+            with timed("load commodity list"):
+                df_list = load_commodity_list()
+            if store is None or df_list is None:
+                raise FileNotFoundError("price data or Commo_list.csv not found")
+            with timed("commodity catalog"):
+                build_catalog(df_list)
+            with timed("trading calendar"):
+                build_trading_calendar(store, store.version)
+            last_date = store.date_bounds()[1]
+            with timed("latest snapshot"):
+                calculate_store_price_changes(store, store.version, df_list, last_date)
+            with timed("latest screen"):
+                screen_snapshot(store, store.version, df_list, last_date)
+            with timed("OHLC pyramid"):
+                build_ohlc_pyramid(store, store.version)
+            with timed("seasonality cube"):
+                build_seasonality(store, store.version, 'M')
+            with timed("risk panel"):
+                build_risk_panel(store, store.version)
+        finally:
+            for logger, level in zip(quiet, levels):
+                logger.setLevel(level)
+        _warmed_up = True
+        log(f"Warm-up done in {sum(STARTUP_TIMINGS.values()):.2f}s.")
+        return dict(STARTUP_TIMINGS)
+
+
+def startup_timings():
+    """`STARTUP_TIMINGS` as a frame (Stage, Seconds, Share), in the order the stages ran."""
+    with _timings_lock:
+        timings = pd.Series(STARTUP_TIMINGS, name='Seconds', dtype=float)
+    frame = timings.rename_axis('Stage').reset_index()
+    total = frame['Seconds'].sum()
+    frame['Share'] = frame['Seconds'] / total if total > 0 else 0.0
+    return frame
+
+
+def format_timings():
+    """Plain-text cold-start breakdown for the command line."""
+    frame = startup_timings()
+    if frame.empty:
+        return "No startup stages recorded."
+    lines = ["Cold-start breakdown:"]
+    for row in frame.itertuples(index=False):
+        lines.append(f"  {row.Stage:<30} {row.Seconds * 1000:>9,.1f} ms  {row.Share:>5.0%}")
+    lines.append(f"  {'total':<30} {frame['Seconds'].sum() * 1000:>9,.1f} ms")
+    return "\n".join(lines)
@@ -0,0 +1,204 @@
+import numpy as np
+import pandas as pd
+
+EPOCH = np.datetime64('1970-01-01', 'D')
+
+
+def to_day_offsets(dates):
+    """Converts datetime-like values to int32 day offsets from `EPOCH`."""
+    return (np.asarray(pd.to_datetime(dates), dtype='datetime64[D]') - EPOCH).astype(np.int32)
+
+
+def from_day_offsets(days):
+    """Converts int32 day offsets back to a DatetimeIndex."""
+    return pd.DatetimeIndex(np.asarray(days).astype('datetime64[D]').astype('datetime64[ns]'))
+
+
+class PriceStore:
+    """
+    Compact, read-only columnar copy of `Data.csv`.
+
+    Rows are sorted by (commodity code, day) and held in three contiguous arrays:
+    int16 commodity codes (int32 beyond 32k commodities), int32 day offsets from 1970-01-01
+    and float64 or float32 prices (plus optional volumes). `offsets[c]:offsets[c + 1]` is the row block of commodity
+    code `c`, so every per-commodity or date-range lookup is a slice plus a binary search
+    and returns views into the shared arrays.
+    """
+
+    def __init__(self, names, codes, days, prices, version=None, volumes=None):
+        self.version = version
+        self.names = np.asarray(names, dtype=object)
+        self.codes = codes
+        self.days = days
+        self.prices = prices
+        self.volumes = volumes
+        self.offsets = np.searchsorted(codes, np.arange(len(self.names) + 1)).astype(np.int64)
+        self._code_of = {name: code for code, name in enumerate(self.names)}
+        for array in (self.codes, self.days, self.prices, self.offsets, self.volumes):
+            if array is not None:
+                array.flags.writeable = False
+
+    @classmethod
+    def from_frame(cls, df, price_dtype=np.float64, version=None):
+        """
+        Builds a store from a cleaned long frame with Date, Commodities and Price columns.
+        `version` identifies the source data and is used as a cache key by callers.
+        """
+        codes, names = pd.factorize(df['Commodities'], sort=True)
+        code_dtype = np.int16 if len(names) <= np.iinfo(np.int16).max else np.int32
+        days = to_day_offsets(df['Date'])
+        order = np.lexsort((days, codes))
+        return cls(
+            names,
+            np.ascontiguousarray(codes[order], dtype=code_dtype),
+            np.ascontiguousarray(days[order]),
+            np.ascontiguousarray(df['Price'].to_numpy()[order], dtype=price_dtype),
+            version=version,
+            volumes=np.ascontiguousarray(df['Volume'].to_numpy()[order], dtype=price_dtype) if 'Volume' in df.columns else None,
+        )
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def nbytes(self):
+        volume_bytes = self.volumes.nbytes if self.volumes is not None else 0
+        return self.codes.nbytes + self.days.nbytes + self.prices.nbytes + self.offsets.nbytes + volume_bytes
+
+    def date_bounds(self):
+        """(first date, last date) across all commodities."""
+        if len(self) == 0:
+            return None, None
+        dates = from_day_offsets([self.days.min(), self.days.max()])
+        return dates[0], dates[1]
+
+    def trading_days(self):
+        """Sorted unique day offsets present in the data."""
+        return np.unique(self.days)
+
+    def series(self, name):
+        """(days, prices) views for one commodity; empty arrays if it is unknown."""
+        code = self._code_of.get(name)
+        if code is None:
+            return self.days[:0], self.prices[:0]
+        block = slice(self.offsets[code], self.offsets[code + 1])
+        return self.days[block], self.prices[block]
+
+    def _row_ranges(self, codes, start, end, include_anchor=False):
+        # Per-commodity [first, last) row ranges for the date window, found by binary search
+        ranges = []
+        start_day = to_day_offsets([start])[0] if start is not None else None
+        end_day = to_day_offsets([end])[0] if end is not None else None
+        for code in codes:
+            lo, hi = self.offsets[code], self.offsets[code + 1]
+            block_days = self.days[lo:hi]
+            first = lo + (np.searchsorted(block_days, start_day, 'left') if start_day is not None else 0)
+            last = lo + (np.searchsorted(block_days, end_day, 'right') if end_day is not None else hi - lo)
+            if include_anchor and first > lo:
+                # Keep the last price before the window so as-of lookups at the window start stay exact
+                first -= 1
+            if last > first:
+                ranges.append((first, last))
+        return ranges
+
+    def _take(self, ranges):
+        if ranges:
+            rows = np.concatenate([np.arange(first, last) for first, last in ranges])
+            # Date-major order, like `load_data`, so callers can cut the frame by date with a slice
+            rows = rows[np.argsort(self.days[rows], kind='stable')]
+        else:
+            rows = np.array([], dtype=np.int64)
+        columns = {
+            'Date': from_day_offsets(self.days[rows]),
+            'Commodities': self.names[self.codes[rows]],
+            'Price': self.prices[rows],
+        }
+        if self.volumes is not None:
+            columns['Volume'] = self.volumes[rows]
+        return pd.DataFrame(columns)
+
+    def to_frame(self, commodities=None, start=None, end=None):
+        """
+        Long Date/Commodities/Price frame for the given commodities and inclusive date range.
+        Only the matching rows are materialized; no scan over the full history.
+        """
+        if commodities is None:
+            codes = range(len(self.names))
+        else:
+            codes = [self._code_of[name] for name in commodities if name in self._code_of]
+        return self._take(self._row_ranges(codes, start, end))
+
+    def window_frame(self, start, end):
+        """
+        All commodities between `start` and `end`, plus each commodity's last row before `start`.
+        Any as-of lookup at or after `start` gives the same answer as on the full history.
+        """
+        return self._take(self._row_ranges(range(len(self.names)), start, end, include_anchor=True))
+
+
+class PriceStoreBuilder:
+    """
+    Builds a `PriceStore` from cleaned chunks without holding the raw file in memory.
+
+    Each chunk is converted straight into growable typed buffers (commodity codes in order of
+    first appearance, int32 day offsets, prices and optional volumes); `build` then renumbers
+    the codes by name and sorts once. Peak memory is the buffers plus the chunk being appended.
+    """
+
+    def __init__(self, price_dtype=np.float64, capacity=1 << 16):
+        self.price_dtype = np.dtype(price_dtype)
+        self.rows = 0
+        self._codes_of = {}
+        self._codes = np.empty(capacity, dtype=np.int32)
+        self._days = np.empty(capacity, dtype=np.int32)
+        self._prices = np.empty(capacity, dtype=self.price_dtype)
+        self._volumes = None
+
+    def _reserve(self, extra):
+        needed = self.rows + extra
+        if needed <= len(self._codes):
+            return
+        capacity = max(needed, 2 * len(self._codes))
+        for attr in ('_codes', '_days', '_prices', '_volumes'):
+            old = getattr(self, attr)
+            if old is not None:
+                new = np.empty(capacity, dtype=old.dtype)
+                new[:self.rows] = old[:self.rows]
+                setattr(self, attr, new)
+
+    def append(self, df):
+        """Appends a cleaned Date/Commodities/Price[/Volume] chunk."""
+        n = len(df)
+        if n == 0:
+            return
+        self._reserve(n)
+        chunk_codes, chunk_names = pd.factorize(df['Commodities'])
+        mapping = np.array([self._codes_of.setdefault(name, len(self._codes_of)) for name in chunk_names], dtype=np.int32)
+        rows = slice(self.rows, self.rows + n)
+        self._codes[rows] = mapping[chunk_codes]
+        self._days[rows] = to_day_offsets(df['Date'])
+        self._prices[rows] = df['Price'].to_numpy(dtype=self.price_dtype)
+        if 'Volume' in df.columns and self._volumes is None:
+            # Volume first seen in this chunk: earlier rows have no volume
+            self._volumes = np.full(len(self._codes), np.nan, dtype=self.price_dtype)
+        if self._volumes is not None:
+            self._volumes[rows] = df['Volume'].to_numpy(dtype=self.price_dtype) if 'Volume' in df.columns else np.nan
+        self.rows += n
+
+    def build(self, version=None):
+        """Finishes the store: codes renumbered in name order, rows sorted by (commodity, day)."""
+        names = np.array(sorted(self._codes_of), dtype=object)
+        renumber = np.empty(len(names), dtype=np.int32)
+        renumber[[self._codes_of[name] for name in names]] = np.arange(len(names), dtype=np.int32)
+        code_dtype = np.int16 if len(names) <= np.iinfo(np.int16).max else np.int32
+        codes = renumber[self._codes[:self.rows]]
+        days = self._days[:self.rows]
+        order = np.lexsort((days, codes))
+        return PriceStore(
+            names,
+            np.ascontiguousarray(codes[order], dtype=code_dtype),
+            np.ascontiguousarray(days[order]),
+            np.ascontiguousarray(self._prices[:self.rows][order]),
+            version=version,
+            volumes=np.ascontiguousarray(self._volumes[:self.rows][order]) if self._volumes is not None else None,
+        )
@@ -2,7 +2,9 @@ import streamlit as st
 import pandas as pd
 import base64
 import os
+from modules.calculations import compute_market_metrics
 
+@st.cache_resource
 def get_base64_of_bin_file(bin_file):
     """
     Encodes a binary file to a base64 string.
@@ -116,14 +118,14 @@ def configure_page_style():
     else:
         st.warning("Background image not found. Please ensure 'assets/DC.png' exists.")
 
-def display_market_metrics(df: pd.DataFrame):
+def _format_pct(value):
+    return f"{value:.1%}" if pd.notna(value) else 'N/A'
+
+def market_metrics_html(metrics: dict):
     """
-    Displays the Key Market Metrics with a new, cleaner style.
+    Builds the CSS + HTML for the Key Market Metrics cards from `compute_market_metrics`.
+    Shared by the Home page and the headless snapshot export.
     """
-    if df.empty:
-        st.info("No data available to display Key Market Metrics for the selected filters.")
-        return
-
     css_style = """
     <style>
         .metric-container {
@@ -172,53 +174,61 @@ def display_market_metrics(df: pd.DataFrame):
     </style>
     """
     
-    st.markdown("""
-    <h2 style='
-        color: #FFFFFF; 
-        font-size: 2.0rem; 
-        font-weight: 500;
-        text-align: left;
-    '>
-        Key Market Metrics
-    </h2>
-""", unsafe_allow_html=True)
-    
-    # Calculations
-    most_bullish = df.loc[df['%Week'].idxmax()] if not df['%Week'].empty and df['%Week'].notna().any() else None
-    most_bearish = df.loc[df['%Week'].idxmin()] if not df['%Week'].empty and df['%Week'].notna().any() else None
-    avg_weekly_change = df['%Week'].mean() if not df['%Week'].empty else 0
-    monthly_leader = df.loc[df['%Month'].idxmax()] if not df['%Month'].empty and df['%Month'].notna().any() else None
-
     # HTML Content
     html_content = f"""
     <div class="metric-container">
         <div class="metric-card bullish-card">
             <div class="title">↑ Most Bullish (Weekly)</div>
-            <div class="commodity-name">{most_bullish['Commodities'] if most_bullish is not None else 'N/A'}</div>
-            <div class="value">{f"{most_bullish['%Week']:.1%}" if most_bullish is not None and pd.notna(most_bullish['%Week']) else 'N/A'}</div>
+            <div class="commodity-name">{metrics['most_bullish'] or 'N/A'}</div>
+            <div class="value">{_format_pct(metrics['most_bullish_change'])}</div>
         </div>
         <div class="metric-card bearish-card">
             <div class="title">↓ Most Bearish (Weekly)</div>
-            <div class="commodity-name">{most_bearish['Commodities'] if most_bearish is not None else 'N/A'}</div>
-            <div class="value">{f"{most_bearish['%Week']:.1%}" if most_bearish is not None and pd.notna(most_bearish['%Week']) else 'N/A'}</div>
+            <div class="commodity-name">{metrics['most_bearish'] or 'N/A'}</div>
+            <div class="value">{_format_pct(metrics['most_bearish_change'])}</div>
         </div>
         <div class="metric-card avg-card">
             <div class="title">Avg. Weekly Change</div>
-            <div class="commodity-name" style="font-size: 28px;">{f"{avg_weekly_change:.1%}" if pd.notna(avg_weekly_change) else 'N/A'}</div>
+            <div class="commodity-name" style="font-size: 28px;">{_format_pct(metrics['avg_weekly_change'])}</div>
             <div class="value">All Selected</div>
         </div>
         <div class="metric-card leader-card">
             <div class="title">🏆 Monthly Leader</div>
-            <div class="commodity-name">{monthly_leader['Commodities'] if monthly_leader is not None else 'N/A'}</div>
-            <div class="value">{f"{monthly_leader['%Month']:.1%}" if monthly_leader is not None and pd.notna(monthly_leader['%Month']) else 'N/A'}</div>
+            <div class="commodity-name">{metrics['monthly_leader'] or 'N/A'}</div>
+            <div class="value">{_format_pct(metrics['monthly_leader_change'])}</div>
         </div>
     </div>
     """
     
-    st.markdown(css_style + html_content, unsafe_allow_html=True)
+    return css_style + html_content
+
+def display_market_metrics(df: pd.DataFrame, metrics: dict = None):
+    """
+    Displays the Key Market Metrics with a new, cleaner style.
+    Pass precomputed `metrics` (e.g. from `summarize_snapshot`) to skip recomputing them.
+    """
+    if df.empty:
+        st.info("No data available to display Key Market Metrics for the selected filters.")
+        return
+
+    st.markdown("""
+    <h2 style='
+        color: #FFFFFF; 
+        font-size: 2.0rem; 
+        font-weight: 500;
+        text-align: left;
+    '>
+        Key Market Metrics
+    </h2>
+""", unsafe_allow_html=True)
+    
+    if metrics is None:
+        metrics = compute_market_metrics(df)
+    st.markdown(market_metrics_html(metrics), unsafe_allow_html=True)
 
 def style_dataframe(df: pd.DataFrame):
-    df_to_style = df.copy()
+    # Styler never modifies its data, so the (possibly shared) frame is styled without a copy
+    df_to_style = df
 
     # Định dạng hiển thị (giữ nguyên)
     format_dict = {
@@ -231,7 +241,16 @@ def style_dataframe(df: pd.DataFrame):
         '%Month': '{:.1%}',
         '%Quarter': '{:.1%}',
         '%YTD': '{:.1%}',
+        # Risk columns, when the table includes them
+        'Vol 20D': '{:.1%}',
+        'Vol 60D': '{:.1%}',
+        'Vol 1Y': '{:.1%}',
+        'Drawdown': '{:.1%}',
+        'Max DD': '{:.1%}',
+        'Max DD Days': '{:,.0f}',
+        'Beta': '{:.2f}',
     }
+    format_dict = {col: fmt for col, fmt in format_dict.items() if col in df_to_style.columns}
     percent_cols = ['%Day', '%Week', '%Month', '%Quarter', '%YTD']
 
     # Hàm style (giữ nguyên)
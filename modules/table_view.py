@@ -0,0 +1,39 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Tables longer than this are shown one page at a time (only the visible page is styled and sent)
+TABLE_PAGE_SIZE = int(os.environ.get("COMMO_TABLE_PAGE_SIZE", "100"))
+SEARCH_COLUMNS = ['Commodities', 'Sector', 'Nation']
+
+
+def search_mask(df, query, columns=SEARCH_COLUMNS):
+    """Rows where any of `columns` contains `query` (case-insensitive); all rows for an empty query."""
+    query = (query or '').strip()
+    if not query:
+        return np.ones(len(df), dtype=bool)
+    mask = np.zeros(len(df), dtype=bool)
+    for col in columns:
+        if col in df.columns:
+            mask |= df[col].astype(str).str.contains(query, case=False, regex=False).to_numpy()
+    return mask
+
+
+def table_page(df, sort_by=None, ascending=True, query='', page=1, page_size=TABLE_PAGE_SIZE):
+    """
+    Server-side search, sort and pagination for the price table.
+
+    Returns (page_df, matching_rows, page_count). Sorting is stable with missing values last;
+    only the rows of `page` (1-based, clamped to the valid range) are materialized.
+    """
+    mask = search_mask(df, query)
+    positions = np.flatnonzero(mask)
+    if sort_by is not None and sort_by in df.columns:
+        keys = df[sort_by].iloc[positions].reset_index(drop=True)
+        positions = positions[keys.sort_values(ascending=ascending, na_position='last', kind='stable').index.to_numpy()]
+
+    matching_rows = len(positions)
+    page_count = max(1, -(-matching_rows // page_size))
+    page = min(max(int(page), 1), page_count)
+    first = (page - 1) * page_size
+    return df.iloc[positions[first:first + page_size]], matching_rows, page_count
@@ -0,0 +1,108 @@
+import pandas as pd
+import numpy as np
+from modules.cache import bounded_cache, VERSIONS_IN_MEMORY
+from modules.store import to_day_offsets, from_day_offsets
+
+# Change horizons: name -> function mapping trading dates to the cut-off whose last price is the base.
+# None means "the previous trading day". `calculate_price_changes` reports horizon X as column '%X'.
+HORIZONS = {
+    'Day': None,
+    'Week': lambda dates: dates - pd.offsets.Week(weekday=4),
+    'Month': lambda dates: dates - pd.offsets.MonthEnd(1),
+    'Quarter': lambda dates: dates - pd.offsets.QuarterEnd(1),
+    'YTD': lambda dates: dates - pd.offsets.YearEnd(1),
+    '3Y': lambda dates: dates - pd.DateOffset(years=3),
+    '5Y': lambda dates: dates - pd.DateOffset(years=5),
+}
+
+# Rolling windows: name -> function mapping trading dates to the first date inside the window
+WINDOWS = {
+    '52W': lambda dates: dates - pd.DateOffset(weeks=52),
+    '30D': lambda dates: dates - pd.DateOffset(days=30),
+}
+
+DEFAULT_HORIZONS = ('Day', 'Week', 'Month', 'Quarter', 'YTD')
+
+
+def register_horizon(name, cutoff):
+    """
+    Adds a change horizon. `cutoff` maps a DatetimeIndex of trading dates to the dates whose
+    last available price is the base of the change. Calendars that are already built (and
+    cached) compute it the first time it is looked up.
+    """
+    HORIZONS[name] = cutoff
+
+
+def since(date):
+    """Cut-off function for a fixed start date, e.g. `register_horizon('Since Jan-24', since('2024-01-31'))`."""
+    fixed = pd.Timestamp(date)
+    return lambda dates: pd.DatetimeIndex(np.full(len(dates), fixed.to_datetime64()))
+
+
+class TradingCalendar:
+    """
+    The trading days actually present in the data, with every horizon precomputed.
+
+    `anchors[h][i]` is the position of the last trading day on or before horizon `h`'s cut-off
+    for trading day `i` (-1 when the history does not reach back that far), and
+    `window_starts[w][i]` the first trading day inside window `w`. Looking up the reference
+    dates for any selected day is then plain array indexing.
+    """
+
+    def __init__(self, dates):
+        days = np.unique(to_day_offsets(pd.DatetimeIndex(dates).dropna()))
+        self.days = days
+        self.dates = from_day_offsets(days)
+        self.anchors = {}
+        self.window_starts = {}
+        for name, cutoff in HORIZONS.items():
+            self.add_horizon(name, cutoff)
+        for name, start in WINDOWS.items():
+            self.add_window(name, start)
+
+    def __len__(self):
+        return len(self.days)
+
+    def position_of(self, dates):
+        """Position of the last trading day on or before each date (-1 if before the first)."""
+        scalar = np.ndim(dates) == 0
+        positions = np.searchsorted(self.days, to_day_offsets(np.atleast_1d(dates)), side='right') - 1
+        return int(positions[0]) if scalar else positions
+
+    def add_horizon(self, name, cutoff):
+        if cutoff is None:
+            positions = np.arange(len(self.days)) - 1
+        else:
+            positions = self.position_of(pd.DatetimeIndex(cutoff(self.dates)))
+        self.anchors[name] = positions.astype(np.int32)
+
+    def anchor(self, name):
+        """`anchors[name]`, computed on first use for horizons registered after the calendar was built."""
+        if name not in self.anchors:
+            self.add_horizon(name, HORIZONS[name])
+        return self.anchors[name]
+
+    def add_window(self, name, start):
+        starts = to_day_offsets(pd.DatetimeIndex(start(self.dates)))
+        self.window_starts[name] = np.searchsorted(self.days, starts, side='left').astype(np.int32)
+
+    def _date_at(self, position):
+        return self.dates[position] if position >= 0 else None
+
+    def reference_dates(self, position, horizons=DEFAULT_HORIZONS):
+        """
+        Reference dates for trading day `position`:
+        {'horizons': {name: base date or None}, 'windows': {name: first date in window}}.
+        """
+        return {
+            'horizons': {name: self._date_at(self.anchor(name)[position]) for name in horizons},
+            'windows': {name: self._date_at(starts[position]) for name, starts in self.window_starts.items()},
+        }
+
+
+@bounded_cache(max_entries=VERSIONS_IN_MEMORY)
+def build_trading_calendar(_store, store_version):
+    """
+    Builds the `TradingCalendar` for a `PriceStore` (or `DatabasePriceStore`) once per data version.
+    """
+    return TradingCalendar(from_day_offsets(_store.trading_days()))
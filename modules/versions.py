@@ -0,0 +1,197 @@
+import os
+import json
+import time
+import threading
+import numpy as np
+import pandas as pd
+from modules.store import PriceStore, to_day_offsets, from_day_offsets
+
+VERSIONS_DIR = os.environ.get("COMMO_VERSIONS_DIR", os.path.join("data", "versions"))
+# Every Nth version is also written as a full checkpoint, so a reconstruction applies fewer than N deltas
+CHECKPOINT_EVERY = int(os.environ.get("COMMO_CHECKPOINT_EVERY", "10"))
+MANIFEST_NAME = "manifest.json"
+KEY_COLUMNS = ['Date', 'Commodities']
+VALUE_COLUMNS = ['Price', 'Volume']
+
+_write_lock = threading.Lock()
+
+
+def _rows_to_arrays(df):
+    # Compact columnar encoding: commodity names once, int32 codes and day offsets, float64 values
+    codes, names = pd.factorize(df['Commodities'], sort=True)
+    arrays = {
+        'names': np.asarray(names, dtype=str),
+        'codes': codes.astype(np.int32),
+        'days': to_day_offsets(df['Date']),
+        'prices': df['Price'].to_numpy(dtype=np.float64),
+    }
+    if 'Volume' in df.columns:
+        arrays['volumes'] = df['Volume'].to_numpy(dtype=np.float64)
+    return arrays
+
+
+def _arrays_to_rows(arrays):
+    columns = {
+        'Date': from_day_offsets(arrays['days']),
+        'Commodities': arrays['names'].astype(object)[arrays['codes']],
+        'Price': arrays['prices'],
+    }
+    if 'volumes' in arrays:
+        columns['Volume'] = arrays['volumes']
+    return pd.DataFrame(columns)
+
+
+def _keyed(df):
+    # One row per (Date, Commodities); the last row wins, like an upsert
+    columns = KEY_COLUMNS + [col for col in VALUE_COLUMNS if col in df.columns]
+    return df[columns].drop_duplicates(KEY_COLUMNS, keep='last')
+
+
+def compute_delta(previous, current):
+    """
+    Rows of `current` that are new or changed against `previous`, plus one row with a NaN
+    Price for every (Date, Commodities) that disappeared. Both are Date/Commodities/Price[/Volume]
+    frames. Returns (delta frame, counts dict with 'inserted', 'changed' and 'deleted').
+    """
+    previous, current = _keyed(previous), _keyed(current)
+    values = [col for col in VALUE_COLUMNS if col in current.columns or col in previous.columns]
+    merged = previous.merge(current, on=KEY_COLUMNS, how='outer', suffixes=('_old', ''), indicator=True)
+    for col in values:
+        for name in (col, f"{col}_old"):
+            if name not in merged.columns:
+                merged[name] = np.nan
+
+    inserted = (merged['_merge'] == 'right_only').to_numpy()
+    deleted = (merged['_merge'] == 'left_only').to_numpy()
+    changed = np.zeros(len(merged), dtype=bool)
+    for col in values:
+        new, old = merged[col].to_numpy(dtype=np.float64), merged[f"{col}_old"].to_numpy(dtype=np.float64)
+        changed |= ~((new == old) | (np.isnan(new) & np.isnan(old)))
+    changed &= (merged['_merge'] == 'both').to_numpy()
+
+    delta = merged[inserted | changed | deleted][KEY_COLUMNS + values].copy()
+    delta.loc[deleted[inserted | changed | deleted], values] = np.nan
+    counts = {'inserted': int(inserted.sum()), 'changed': int(changed.sum()), 'deleted': int(deleted.sum())}
+    return delta.sort_values(KEY_COLUMNS, ignore_index=True), counts
+
+
+def apply_deltas(base, deltas):
+    """Replays `deltas` (oldest first) over `base`; NaN-price rows delete their (Date, Commodities)."""
+    frames = [frame for frame in [base, *deltas] if not frame.empty]
+    if not frames:
+        return base
+    combined = _keyed(pd.concat(frames, ignore_index=True))
+    combined = combined[combined['Price'].notna()]
+    # Date-major order, like `load_data` and `PriceStore.to_frame`
+    return combined.sort_values(KEY_COLUMNS, kind='stable', ignore_index=True)
+
+
+class VersionLog:
+    """
+    Point-in-time history of the price data as an append-only log on disk.
+
+    Each recorded version is stored as a compressed delta against the previous one (inserted,
+    changed and deleted (date, commodity) rows); every `checkpoint_every`-th version stores the
+    full dataset instead. Any version is rebuilt from the nearest checkpoint at or before it plus
+    the deltas after it, so nothing but the manifest is held in memory between reconstructions.
+    """
+
+    def __init__(self, path=VERSIONS_DIR, checkpoint_every=CHECKPOINT_EVERY):
+        self.path = path
+        self.checkpoint_every = max(int(checkpoint_every), 1)
+
+    def _file(self, version, kind):
+        return os.path.join(self.path, f"v{version:06d}.{kind}.npz")
+
+    def manifest(self):
+        """Recorded versions, oldest first (list of dicts)."""
+        try:
+            with open(os.path.join(self.path, MANIFEST_NAME)) as handle:
+                return json.load(handle)
+        except FileNotFoundError:
+            return []
+
+    def versions(self):
+        """The manifest as a frame: Version, Created, Source, Rows, Inserted, Changed, Deleted, Checkpoint."""
+        columns = ['Version', 'Created', 'Source', 'Fingerprint', 'Rows', 'Inserted', 'Changed', 'Deleted', 'Checkpoint']
+        entries = self.manifest()
+        frame = pd.DataFrame([{col: entry.get(col.lower()) for col in columns} for entry in entries], columns=columns)
+        frame['Created'] = pd.to_datetime(frame['Created'], unit='s')
+        return frame
+
+    @property
+    def latest(self):
+        entries = self.manifest()
+        return entries[-1]['version'] if entries else None
+
+    def _write(self, version, kind, df):
+        # Written to a temporary name first, so readers never see a partial file
+        target = self._file(version, kind)
+        partial = target[:-len(".npz")] + ".partial.npz"
+        np.savez_compressed(partial, **_rows_to_arrays(df))
+        os.replace(partial, target)
+
+    def _read(self, version, kind):
+        with np.load(self._file(version, kind)) as arrays:
+            return _arrays_to_rows({name: arrays[name] for name in arrays.files})
+
+    def reconstruct(self, version=None):
+        """The dataset as of `version` (default: latest) as a Date/Commodities/Price[/Volume] frame."""
+        entries = self.manifest()
+        if version is None:
+            version = entries[-1]['version'] if entries else None
+        chain = [entry for entry in entries if entry['version'] <= (version or 0)]
+        if not chain or chain[-1]['version'] != version:
+            raise ValueError(f"Data version {version} is not recorded in {self.path}.")
+        start = max(i for i, entry in enumerate(chain) if entry['checkpoint'])
+        base = self._read(chain[start]['version'], "checkpoint")
+        return apply_deltas(base, [self._read(entry['version'], "delta") for entry in chain[start + 1:]])
+
+    def store(self, version=None, price_dtype=np.float64):
+        """`PriceStore` of `version`; its `version` attribute is stable because the content never changes."""
+        version = version or self.latest
+        return PriceStore.from_frame(self.reconstruct(version), price_dtype=price_dtype, version=f"dataset-v{version}")
+
+    def record(self, df, source=None, fingerprint=None):
+        """
+        Records `df` (the full cleaned dataset) as a new version if it differs from the latest one.
+        `fingerprint` (e.g. the CSV's modification time and size) lets an unchanged source be
+        skipped without comparing rows. Returns the new manifest entry, or None if nothing changed.
+        """
+        with _write_lock:
+            entries = self.manifest()
+            if fingerprint is not None and entries and entries[-1].get('fingerprint') == fingerprint:
+                return None
+            previous = self.reconstruct(entries[-1]['version']) if entries else df.iloc[:0]
+            delta, counts = compute_delta(previous, df)
+            if entries and not len(delta):
+                return None
+
+            os.makedirs(self.path, exist_ok=True)
+            version = entries[-1]['version'] + 1 if entries else 1
+            checkpoint = not entries or (version - 1) % self.checkpoint_every == 0
+            # A checkpoint version is rebuilt from its checkpoint alone, so its delta is not kept
+            if checkpoint:
+                self._write(version, "checkpoint", _keyed(df))
+            else:
+                self._write(version, "delta", delta)
+            entry = {
+                'version': version,
+                'created': time.time(),
+                'source': source,
+                'fingerprint': fingerprint,
+                'rows': int(len(_keyed(df))),
+                'checkpoint': checkpoint,
+                **counts,
+            }
+            manifest_path = os.path.join(self.path, MANIFEST_NAME)
+            with open(manifest_path + ".partial", "w") as handle:
+                json.dump(entries + [entry], handle, indent=1)
+            os.replace(manifest_path + ".partial", manifest_path)
+            return entry
+
+
+def version_label(entry):
+    """Short selector label, e.g. 'v3 · 2025-09-01 08:00 · +61 ~2 -0'."""
+    created = pd.Timestamp(entry['created'], unit='s').strftime('%Y-%m-%d %H:%M')
+    return f"v{entry['version']} · {created} · +{entry['inserted']} ~{entry['changed']} -{entry['deleted']}"
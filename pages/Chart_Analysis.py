@@ -1,10 +1,19 @@
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+import numpy as np
 from datetime import datetime, timedelta
-from modules.data_loader import load_data
+from modules.data_loader import load_price_source, load_commodity_list, select_data_version
+from modules.startup import lazy_import, timed
 from modules.styling import configure_page_style
+from modules.catalog import build_catalog
+from modules.aggregation import build_ohlc_pyramid, choose_resolution, daily_ohlc, RESOLUTION_LABELS
+from modules.seasonality import build_seasonality
+from modules.risk import build_risk_panel, RISK_OVERLAYS, DEFAULT_BENCHMARK
+from modules.calculations import calculate_performance_metrics, calculate_monthly_returns
+
+# Plotly is imported when the first chart is drawn, not before the page can render
+go = lazy_import("plotly.graph_objects")
+subplots = lazy_import("plotly.subplots")
 
 # --- PAGE CONFIGURATION ---
 st.set_page_config(
@@ -16,21 +25,57 @@ st.set_page_config(
 # --- APPLY CUSTOM STYLES ---
 configure_page_style()
 
-# --- HELPER FUNCTION ---
-def create_price_chart(data, title, chart_type="Line Chart", show_ma=False, ma_periods=[]):
-    """Create a price chart with optional moving averages"""
+# --- HELPER FUNCTIONS ---
+def _add_risk_overlay(fig, risk, row, col, showlegend=True):
+    """Draws a risk series (named Series indexed by date) on the secondary y-axis of a subplot"""
+    fig.add_trace(go.Scatter(
+        x=risk.index,
+        y=risk.to_numpy(),
+        mode='lines',
+        name=risk.name,
+        line=dict(color='#8b5cf6', width=1.2),
+        opacity=0.8,
+        showlegend=showlegend
+    ), row=row, col=col, secondary_y=True)
+    fig.update_yaxes(
+        title_text=risk.name if showlegend else None,
+        tickformat=None if risk.name.startswith("Beta") else ".0%",
+        showgrid=False,
+        secondary_y=True,
+        row=row, col=col
+    )
+
+
+def create_price_chart(data, title, chart_type="Line Chart", show_ma=False, ma_periods=[], show_volume=False, resolution='D', risk=None):
+    """Create a price chart (line/area/column/candlestick) with optional moving averages, volume bars and a risk overlay"""
     
-    fig = go.Figure()
+    with_volume = show_volume and 'Volume' in data.columns
+    price_spec = [{"secondary_y": risk is not None}]
+    if with_volume:
+        fig = subplots.make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.75, 0.25], vertical_spacing=0.03, specs=[price_spec, [{}]])
+    else:
+        fig = subplots.make_subplots(rows=1, cols=1, specs=[price_spec])
     
     # Main price chart
-    if chart_type == "Line Chart":
+    if chart_type == "Candlestick":
+        fig.add_trace(go.Candlestick(
+            x=data['Date'],
+            open=data['Open'],
+            high=data['High'],
+            low=data['Low'],
+            close=data['Price'],
+            name='Price',
+            increasing_line_color='#10b981',
+            decreasing_line_color='#e11d48'
+        ), row=1, col=1)
+    elif chart_type == "Line Chart":
         fig.add_trace(go.Scatter(
             x=data['Date'],
             y=data['Price'],
             mode='lines',
             name='Price',
             line=dict(color='#00816D', width=2)
-        ))
+        ), row=1, col=1)
     elif chart_type == "Area Chart":
         fig.add_trace(go.Scatter(
             x=data['Date'],
@@ -40,7 +85,7 @@ def create_price_chart(data, title, chart_type="Line Chart", show_ma=False, ma_p
             fill='tozeroy',
             line=dict(color='#00816D', width=2),
             fillcolor='rgba(0, 129, 109, 0.1)'
-        ))
+        ), row=1, col=1)
     elif chart_type == "Column Chart":
         fig.add_trace(go.Bar(
             x=data['Date'],
@@ -51,7 +96,7 @@ def create_price_chart(data, title, chart_type="Line Chart", show_ma=False, ma_p
                 colorscale='Teal',
                 line=dict(color='#00816D', width=0.5)
             )
-        ))
+        ), row=1, col=1)
     
     # Add moving averages
     if show_ma and ma_periods:
@@ -69,12 +114,25 @@ def create_price_chart(data, title, chart_type="Line Chart", show_ma=False, ma_p
                         width=1.5,
                         dash='dot'
                     )
-                ))
+                ), row=1, col=1)
     
+    if risk is not None:
+        _add_risk_overlay(fig, risk, row=1, col=1)
+
+    if with_volume:
+        fig.add_trace(go.Bar(
+            x=data['Date'],
+            y=data['Volume'],
+            name='Volume',
+            marker_color='rgba(0, 129, 109, 0.4)'
+        ), row=2, col=1)
+        fig.update_yaxes(title_text="Volume", row=2, col=1)
+    
+    resolution_label = f" ({RESOLUTION_LABELS[resolution]})" if resolution != 'D' else ""
     fig.update_layout(
-        title=f"{title} Price Chart",
-        xaxis_title="Date",
+        title=f"{title} Price Chart{resolution_label}",
         yaxis_title="Price",
+        xaxis_rangeslider_visible=False,
         hovermode='x unified',
         height=500,
         template="plotly_white",
@@ -91,18 +149,245 @@ def create_price_chart(data, title, chart_type="Line Chart", show_ma=False, ma_p
     return fig
 
 
+@st.fragment
+def render_seasonality(store, selected_commodities):
+    """
+    Seasonality tab: average/percentile returns by calendar month or week of year, and the
+    year-over-year overlay, read from the cached full-history `SeasonalityCube`.
+    """
+    commodity_col, frequency_col = st.columns([3, 2])
+    with commodity_col:
+        commodity = st.selectbox("Commodity", options=selected_commodities, key="season_commodity")
+    with frequency_col:
+        frequency_label = st.radio("Period", options=["Monthly", "Weekly"], horizontal=True, key="season_frequency")
+    cube = build_seasonality(store, store.version, 'M' if frequency_label == "Monthly" else 'W')
+    if commodity not in cube.names:
+        st.info("No history available for this commodity.")
+        return
+
+    profile = cube.profile(commodity)
+    profile[['Mean', 'Median', 'P25', 'P75']] *= 100
+    st.caption(f"Computed from the full history ({cube.years[0]}–{cube.years[-1]}), independent of the date range above.")
+
+    # Average return per period, with the 25th–75th percentile range as error bars
+    fig_profile = go.Figure()
+    fig_profile.add_trace(go.Bar(
+        x=profile.index,
+        y=profile['Mean'],
+        name='Mean',
+        marker_color=np.where(profile['Mean'] >= 0, '#10b981', '#e11d48'),
+        error_y=dict(
+            type='data',
+            symmetric=False,
+            array=(profile['P75'] - profile['Mean']).clip(lower=0),
+            arrayminus=(profile['Mean'] - profile['P25']).clip(lower=0),
+            color='#64748b'
+        ),
+        customdata=np.stack([profile['Median'], profile['Positive Share'], profile['Years']], axis=-1),
+        hovertemplate="%{x}: mean %{y:.1f}%, median %{customdata[0]:.1f}%<br>"
+                      "positive in %{customdata[1]:.0%} of %{customdata[2]} years<extra></extra>"
+    ))
+    fig_profile.update_layout(
+        title=f"{commodity}: Average {frequency_label} Return (P25–P75 range)",
+        yaxis_ticksuffix="%",
+        height=400,
+        template="plotly_white",
+        font=dict(family="Manrope, sans-serif"),
+        showlegend=False
+    )
+    st.plotly_chart(fig_profile, use_container_width=True)
+
+    # Cumulative return through each year, one line per year
+    overlay = cube.year_overlay(commodity) * 100
+    fig_overlay = go.Figure()
+    for year, growth in overlay.iterrows():
+        if growth.notna().any():
+            fig_overlay.add_trace(go.Scatter(
+                x=overlay.columns,
+                y=growth,
+                mode='lines+markers',
+                name=str(year),
+                line=dict(width=3 if year == overlay.index[-1] else 1.5)
+            ))
+    fig_overlay.update_layout(
+        title=f"{commodity}: Year-over-Year Cumulative Return",
+        yaxis_ticksuffix="%",
+        hovermode='x unified',
+        height=400,
+        template="plotly_white",
+        font=dict(family="Manrope, sans-serif")
+    )
+    st.plotly_chart(fig_overlay, use_container_width=True)
+
+
+@st.fragment
+def render_price_charts(store, filtered_data, selected_commodities, start_date, end_date):
+    """
+    Price Charts tab with its chart options. Runs as a fragment: changing the chart type, volume
+    or moving averages redraws only these charts, without reloading data or recomputing the
+    Comparison and Performance tabs.
+    """
+    # --- CHART OPTIONS ---
+    type_col, toggle_col, ma_col = st.columns([3, 2, 3])
+    with type_col:
+        chart_type = st.radio(
+            "Chart Type",
+            options=["Line Chart", "Area Chart", "Column Chart", "Candlestick"],
+            index=0,
+            horizontal=True,
+            key="chart_type"
+        )
+    with toggle_col:
+        show_volume = st.checkbox("Show Trading Volume", value=False, key="show_volume")
+        show_ma = st.checkbox("Show Moving Averages", value=True, key="show_ma")
+    ma_periods = []
+    if show_ma:
+        with ma_col:
+            ma_periods = st.multiselect(
+                "Moving Average Periods",
+                options=[10, 20, 50, 100, 200],
+                default=[10, 20],
+                key="ma_periods"
+            )
+    overlay_col, benchmark_col = st.columns([3, 3])
+    with overlay_col:
+        overlay = st.selectbox("Risk overlay", options=["None", *RISK_OVERLAYS], key="risk_overlay")
+    benchmark = None
+    if RISK_OVERLAYS.get(overlay) == 'Beta':
+        names = list(store.names)
+        with benchmark_col:
+            benchmark = st.selectbox(
+                "Beta benchmark",
+                options=names,
+                index=names.index(DEFAULT_BENCHMARK) if DEFAULT_BENCHMARK in names else 0,
+                key="chart_benchmark"
+            )
+
+    def risk_overlay(commodity):
+        # Daily series from the risk panel cached per data version, cut to the chart's dates
+        if overlay == "None":
+            return None
+        history = build_risk_panel(store, store.version).series(commodity, benchmark, start_date, end_date)
+        return history[RISK_OVERLAYS[overlay]].rename(overlay)
+
+    # Create individual charts for each commodity
+    num_commodities = len(selected_commodities)
+    rows = (num_commodities + 1) // 2  # 2 columns layout
+
+    # Finest bar size that fits the plot (daily, else weekly, else monthly); weekly/monthly bars come pre-built from the pyramid
+    resolution = choose_resolution(start_date, end_date, target_points=400 if num_commodities == 1 else 200)
+    if resolution == 'D':
+        chart_bars = daily_ohlc(filtered_data)
+        if chart_type == "Candlestick":
+            # One close per day makes flat candles (open = high = low = close), so daily ranges are drawn as lines
+            st.caption("Candlesticks need weekly or monthly bars; widen the date range to see them. Daily closes are shown as a line.")
+            chart_type = "Line Chart"
+    else:
+        pyramid = build_ohlc_pyramid(store, store.version)
+        chart_bars = pyramid.bars(resolution, selected_commodities, start_date, end_date)
+        st.caption(f"Showing {RESOLUTION_LABELS[resolution].lower()} bars for this date range (moving averages are counted in bars).")
+    chart_bars = chart_bars.rename(columns={'Close': 'Price'})
+
+    if show_volume and 'Volume' not in chart_bars.columns:
+        st.info("`Data.csv` has no Volume column, so there is no trading volume to show.")
+
+    if num_commodities == 1:
+        # Single large chart
+        commodity = selected_commodities[0]
+        commodity_data = chart_bars[chart_bars['Commodities'] == commodity].sort_values('Date')
+
+        fig = create_price_chart(commodity_data, commodity, chart_type, show_ma, ma_periods if show_ma else [], show_volume, resolution, risk_overlay(commodity))
+        st.plotly_chart(fig, use_container_width=True)
+
+    else:
+        # Multiple charts in grid
+        fig = subplots.make_subplots(
+            rows=rows, cols=2,
+            subplot_titles=selected_commodities[:num_commodities],
+            vertical_spacing=0.1,
+            horizontal_spacing=0.05,
+            specs=[[{"secondary_y": overlay != "None"}] * 2] * rows
+        )
+
+        for idx, commodity in enumerate(selected_commodities):
+            row = idx // 2 + 1
+            col = idx % 2 + 1
+
+            commodity_data = chart_bars[chart_bars['Commodities'] == commodity].sort_values('Date')
+
+            # Add main price line (or candles)
+            if chart_type == "Candlestick":
+                price_trace = go.Candlestick(
+                    x=commodity_data['Date'],
+                    open=commodity_data['Open'],
+                    high=commodity_data['High'],
+                    low=commodity_data['Low'],
+                    close=commodity_data['Price'],
+                    name=commodity,
+                    increasing_line_color='#10b981',
+                    decreasing_line_color='#e11d48',
+                    showlegend=False
+                )
+            else:
+                price_trace = go.Scatter(
+                    x=commodity_data['Date'],
+                    y=commodity_data['Price'],
+                    mode='lines',
+                    name=commodity,
+                    line=dict(width=2,shape='spline', smoothing=0.2),
+                    showlegend=False
+                )
+            fig.add_trace(price_trace, row=row, col=col)
+
+            # Add moving averages if selected
+            if show_ma and ma_periods:
+                for period in ma_periods:
+                    if len(commodity_data) >= period:
+                        ma_values = commodity_data['Price'].rolling(window=period).mean()
+                        fig.add_trace(
+                            go.Scatter(
+                                x=commodity_data['Date'],
+                                y=ma_values,
+                                mode='lines',
+                                name=f'MA{period}',
+                                line=dict(width=1, dash='dot'),
+                                opacity=0.7,
+                                showlegend=False
+                            ),
+                            row=row, col=col
+                        )
+
+            if overlay != "None":
+                _add_risk_overlay(fig, risk_overlay(commodity), row=row, col=col, showlegend=False)
+
+        fig.update_xaxes(rangeslider_visible=False)
+        fig.update_layout(
+            height=300 * rows,
+            showlegend=False,
+            template="plotly_white",
+            font=dict(family="Manrope, sans-serif")
+        )
+
+        st.plotly_chart(fig, use_container_width=True)
+
+
 
 # --- DATA LOADING ---
-df_data, df_list = load_data()
+# "Latest", or an earlier recorded data version for point-in-time snapshots
+as_of = select_data_version()
+# The first run in a process records these stages in the cold-start breakdown
+with timed("load price data"):
+    store = load_price_source(as_of)
+with timed("load commodity list"):
+    df_list = load_commodity_list()
 
-if df_data is not None and df_list is not None:
+if store is not None and df_list is not None:
     # --- SIDEBAR FILTERS ---
     st.sidebar.header("Chart Filters")
     
     # Date Range Selector
     
-    min_date = df_data['Date'].min()
-    max_date = df_data['Date'].max()
+    min_date, max_date = store.date_bounds()
 
     # Sử dụng st.columns để tạo 2 cột cho 2 ô chọn ngày
     col1, col2 = st.sidebar.columns(2)
@@ -135,55 +420,27 @@ if df_data is not None and df_list is not None:
     
     # Sector Filter
     
-    unique_sectors = sorted(df_list['Sector'].astype(str).unique())
+    catalog = build_catalog(df_list)
     selected_sectors = st.sidebar.multiselect(
         "Select Sectors",
-        options=unique_sectors,
+        options=catalog.sectors,
         default=[]
     )
     
     # Commodity Filter based on selected sectors
     
-    if selected_sectors:
-        commodity_options = sorted(
-            df_list[df_list['Sector'].isin(selected_sectors)]['Commodities'].astype(str).unique()
-        )
-    else:
-        commodity_options = sorted(df_list['Commodities'].astype(str).unique())
-    
     selected_commodities = st.sidebar.multiselect(
         "Select Commodities (max 10)",
-        options=commodity_options,
+        options=catalog.commodity_options(selected_sectors),
         default=[],
         max_selections=10
     )
     
-    # Chart Type Selector
-    st.sidebar.subheader("📈 Chart Options")
-    chart_type = st.sidebar.radio(
-        "Chart Type",
-        options=["Line Chart", "Area Chart", "Column Chart"],
-        index=0
-    )
-    
-    show_volume = st.sidebar.checkbox("Show Trading Volume", value=False)
-    show_ma = st.sidebar.checkbox("Show Moving Averages", value=True)
-    
-    if show_ma:
-        ma_periods = st.sidebar.multiselect(
-            "Moving Average Periods",
-            options=[10, 20, 50, 100, 200],
-            default=[10, 20]
-        )
-    
     # --- FILTER DATA ---
     if selected_commodities:
         # Filter data based on selections
-        filtered_data = df_data[
-            (df_data['Commodities'].isin(selected_commodities)) &
-            (df_data['Date'] >= pd.to_datetime(start_date)) &
-            (df_data['Date'] <= pd.to_datetime(end_date))
-        ].copy()
+        # Only the selected commodities' date ranges are read from the store
+        filtered_data = store.to_frame(selected_commodities, start_date, end_date)
         
         if not filtered_data.empty:
             # --- CREATE TABS ---
@@ -249,77 +506,12 @@ if df_data is not None and df_list is not None:
             </style>
             """, unsafe_allow_html=True)
 
-            tab1, tab2, tab3 = st.tabs(["📈 Price Charts", "📊 Comparison", "📉 Performance Analysis"])
+            tab1, tab2, tab3, tab4 = st.tabs(["📈 Price Charts", "📊 Comparison", "📉 Performance Analysis", "🗓️ Seasonality"])
             
             # --- TAB 1: INDIVIDUAL PRICE CHARTS ---
             with tab1:
-                               
-                # Create individual charts for each commodity
-                num_commodities = len(selected_commodities)
-                rows = (num_commodities + 1) // 2  # 2 columns layout
-                
-                if num_commodities == 1:
-                    # Single large chart
-                    commodity = selected_commodities[0]
-                    commodity_data = filtered_data[filtered_data['Commodities'] == commodity].sort_values('Date')
-                    
-                    fig = create_price_chart(commodity_data, commodity, chart_type, show_ma, ma_periods if show_ma else [])
-                    st.plotly_chart(fig, use_container_width=True)
-                    
-                else:
-                    # Multiple charts in grid
-                    fig = make_subplots(
-                        rows=rows, cols=2,
-                        subplot_titles=selected_commodities[:num_commodities],
-                        vertical_spacing=0.1,
-                        horizontal_spacing=0.05
-                    )
-                    
-                    for idx, commodity in enumerate(selected_commodities):
-                        row = idx // 2 + 1
-                        col = idx % 2 + 1
-                        
-                        commodity_data = filtered_data[filtered_data['Commodities'] == commodity].sort_values('Date')
-                        
-                        # Add main price line
-                        fig.add_trace(
-                            go.Scatter(
-                                x=commodity_data['Date'],
-                                y=commodity_data['Price'],
-                                mode='lines',
-                                name=commodity,
-                                line=dict(width=2,shape='spline', smoothing=0.2),
-                                showlegend=False
-                            ),
-                            row=row, col=col
-                        )
-                        
-                        # Add moving averages if selected
-                        if show_ma and ma_periods:
-                            for period in ma_periods:
-                                if len(commodity_data) >= period:
-                                    ma_values = commodity_data['Price'].rolling(window=period).mean()
-                                    fig.add_trace(
-                                        go.Scatter(
-                                            x=commodity_data['Date'],
-                                            y=ma_values,
-                                            mode='lines',
-                                            name=f'MA{period}',
-                                            line=dict(width=1, dash='dot'),
-                                            opacity=0.7,
-                                            showlegend=False
-                                        ),
-                                        row=row, col=col
-                                    )
-                    
-                    fig.update_layout(
-                        height=300 * rows,
-                        showlegend=False,
-                        template="plotly_white",
-                        font=dict(family="Manrope, sans-serif")
-                    )
-                    
-                    st.plotly_chart(fig, use_container_width=True)
+                # Chart options and charts rerun on their own (see render_price_charts)
+                render_price_charts(store, filtered_data, selected_commodities, start_date, end_date)
             
             # --- TAB 2: COMPARISON CHART ---
             with tab2:
@@ -371,22 +563,24 @@ if df_data is not None and df_list is not None:
                     </h3>
                 """, unsafe_allow_html=True)
                 
+                stats = calculate_performance_metrics(filtered_data)
+                # Return-based risk as of the end of the range, from the panel cached per data version
+                risk = build_risk_panel(store, store.version).snapshot(end_date)
                 metrics_data = []
                 for commodity in selected_commodities:
-                    commodity_data = filtered_data[filtered_data['Commodities'] == commodity].sort_values('Date')
-                    if len(commodity_data) > 1:
-                        first_price = commodity_data.iloc[0]['Price']
-                        last_price = commodity_data.iloc[-1]['Price']
-                        change_pct = ((last_price - first_price) / first_price) * 100
-                        
+                    if commodity in stats.index:
+                        row = stats.loc[commodity]
+                        risk_row = risk.loc[commodity] if commodity in risk.index else None
                         metrics_data.append({
                             'Commodity': commodity,
-                            'Start Price': f"{first_price:,.0f}",
-                            'End Price': f"{last_price:,.0f}",
-                            'Change (%)': f"{change_pct:.1f}%",
-                            'Min Price': f"{commodity_data['Price'].min():,.0f}",
-                            'Max Price': f"{commodity_data['Price'].max():,.0f}",
-                            'Volatility': f"{commodity_data['Price'].std():,.0f}"
+                            'Start Price': f"{row['first']:,.0f}",
+                            'End Price': f"{row['last']:,.0f}",
+                            'Change (%)': f"{row['change_pct']:.1f}%",
+                            'Min Price': f"{row['min']:,.0f}",
+                            'Max Price': f"{row['max']:,.0f}",
+                            'Price Std Dev': f"{row['std']:,.0f}",
+                            'Volatility (1Y)': f"{risk_row['Vol 1Y']:.1%}" if risk_row is not None and pd.notna(risk_row['Vol 1Y']) else "—",
+                            'Max Drawdown': f"{risk_row['Max DD']:.1%}" if risk_row is not None and pd.notna(risk_row['Max DD']) else "—"
                         })
                 
                 if metrics_data:
@@ -406,14 +600,7 @@ if df_data is not None and df_list is not None:
                 if len(selected_commodities) > 1:
                                         
                     # Calculate monthly returns
-                    monthly_returns = pd.DataFrame()
-                    
-                    for commodity in selected_commodities:
-                        commodity_data = filtered_data[filtered_data['Commodities'] == commodity].sort_values('Date')
-                        commodity_data.set_index('Date', inplace=True)
-                        monthly_prices = commodity_data['Price'].resample('M').last()
-                        monthly_pct = monthly_prices.pct_change() * 100
-                        monthly_returns[commodity] = monthly_pct
+                    monthly_returns = calculate_monthly_returns(filtered_data).reindex(columns=selected_commodities)
                     
                     # Create heatmap
                     # 1. Sao chép dữ liệu để xử lý riêng cho việc hiển thị
@@ -481,6 +668,10 @@ if df_data is not None and df_list is not None:
                     
                     st.plotly_chart(fig_corr, use_container_width=True)
         
+            # --- TAB 4: SEASONALITY ---
+            with tab4:
+                render_seasonality(store, selected_commodities)
+        
         else:
             st.warning("No data available for the selected filters.")
     else:
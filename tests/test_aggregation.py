@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from modules.aggregation import OHLCPyramid, LEVELS, choose_resolution
+from modules.store import PriceStore
+
+
+@pytest.fixture(scope="module")
+def prices():
+    # Daily random walks with gaps, long enough for a few dozen monthly bars
+    rng = np.random.default_rng(3)
+    dates = pd.date_range("2021-01-01", "2023-12-31", freq="D")
+    frames = []
+    for i in range(5):
+        walk = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(dates))))
+        frame = pd.DataFrame({'Date': dates, 'Commodities': f"Commodity {i}", 'Price': walk}).iloc[i * 20:]
+        frames.append(frame[rng.random(len(frame)) > 0.1])
+    return pd.concat(frames).sort_values(['Date', 'Commodities'], ignore_index=True)
+
+
+def assert_same_bars(result, expected, names):
+    for level in LEVELS:
+        assert_frame_equal(result.bars(level, names), expected.bars(level, names), check_dtype=False)
+
+
+@pytest.mark.parametrize("cutoff", ["2023-12-20", "2023-11-30", "2022-06-15"])
+def test_extended_pyramid_matches_a_fresh_build(prices, cutoff):
+    names = sorted(prices['Commodities'].unique())
+    previous = OHLCPyramid.from_source(PriceStore.from_frame(prices[prices['Date'] <= cutoff]))
+    assert_same_bars(OHLCPyramid.from_source(PriceStore.from_frame(prices), previous=previous), OHLCPyramid(prices), names)
+
+
+def test_unchanged_commodities_share_their_bars(prices):
+    previous = OHLCPyramid.from_source(PriceStore.from_frame(prices[prices['Date'] <= "2023-06-30"]))
+    appended = prices[(prices['Date'] <= "2023-06-30") | (prices['Commodities'] == "Commodity 0")]
+    pyramid = OHLCPyramid.from_source(PriceStore.from_frame(appended), previous=previous)
+    assert pyramid._bars['M']["Commodity 1"] is previous._bars['M']["Commodity 1"]
+    assert pyramid._bars['M']["Commodity 0"] is not previous._bars['M']["Commodity 0"]
+
+
+def test_corrected_history_is_rebuilt(prices):
+    names = sorted(prices['Commodities'].unique())
+    previous = OHLCPyramid.from_source(PriceStore.from_frame(prices[prices['Date'] <= "2023-06-30"]))
+    corrected = prices.copy()
+    corrected.loc[(corrected['Commodities'] == "Commodity 2") & (corrected['Date'] == "2022-03-01"), 'Price'] *= 2
+    pyramid = OHLCPyramid.from_source(PriceStore.from_frame(corrected), previous=previous)
+    assert pyramid._bars['M']["Commodity 2"] is not previous._bars['M']["Commodity 2"]
+    assert_same_bars(pyramid, OHLCPyramid(corrected), names)
+
+
+def test_update_rejects_overlapping_rows(prices):
+    pyramid = OHLCPyramid(prices[prices['Date'] <= "2023-06-30"])
+    with pytest.raises(ValueError, match="overlap"):
+        pyramid.update(prices[prices['Date'] >= "2023-06-30"])
+
+
+@pytest.mark.parametrize("start, end, target_points, level", [
+    ("2023-01-01", "2023-12-31", 400, 'D'),
+    ("2023-01-01", "2023-12-31", 200, 'W'),
+    ("2020-01-01", "2023-12-31", 400, 'W'),
+    ("2010-01-01", "2023-12-31", 400, 'M'),
+    ("2018-01-01", "2023-12-31", 200, 'M'),
+])
+def test_choose_resolution_steps_down_only_when_the_finer_level_fits(start, end, target_points, level):
+    assert choose_resolution(start, end, target_points) == level
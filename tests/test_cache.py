@@ -0,0 +1,39 @@
+import pandas as pd
+
+from modules.cache import ResultCache, bounded_cache, estimate_nbytes
+from modules.trading_calendar import TradingCalendar
+
+
+def test_structures_count_against_the_budget_by_what_they_hold():
+    calendar = TradingCalendar(pd.date_range("2020-01-01", "2023-12-31", freq="D"))
+    arrays = [calendar.days, *calendar.anchors.values(), *calendar.window_starts.values()]
+    assert estimate_nbytes(calendar) >= sum(array.nbytes for array in arrays)
+
+    cache = ResultCache(max_bytes=estimate_nbytes(calendar) * 1.5)
+    build = bounded_cache(lambda version: TradingCalendar(pd.date_range("2020-01-01", "2023-12-31", freq="D")), cache=cache)
+    first = build("v1")
+    assert build("v1") is first
+    build("v2")
+    # Two calendars don't fit the budget, so the older one is evicted
+    assert cache.stats()['entries'] == 1
+    assert build("v1") is not first
+
+
+def test_per_version_results_are_limited_to_the_versions_kept_in_memory():
+    cache = ResultCache(max_bytes=1024 ** 2)
+
+    @bounded_cache(max_entries=2, cache=cache)
+    def build(_store, store_version):
+        return [store_version] * 10
+
+    @bounded_cache(cache=cache)
+    def other(key):
+        return key
+
+    for version in ("v1", "v2", "v3"):
+        build(None, version)
+        other(version)
+    namespaces = cache.stats()['namespaces']
+    assert namespaces[build.namespace]['entries'] == 2
+    assert namespaces[build.namespace]['evictions'] == 1
+    assert build.cache_key(None, "v1") not in [key for _, key in cache._entries]
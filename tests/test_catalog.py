@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+
+from modules.catalog import CommodityCatalog
+
+
+def test_listed_twice_keeps_the_sector_of_its_first_row():
+    df_list = pd.DataFrame({
+        'Commodities': ['Brent', 'Urea', 'Ammonia', 'Urea'],
+        'Sector': ['Energy', 'Fertilizers', 'Chemicals', 'Chemicals'],
+        'Nation': 'Global',
+        'Impact': '',
+    })
+    catalog = CommodityCatalog(df_list)
+
+    assert catalog.commodity_options(['Chemicals']) == ['Ammonia']
+    assert catalog.commodity_options(['Fertilizers']) == ['Urea']
+    # Rows of a table whose Sector column comes from the first listing of each commodity
+    table = df_list.drop_duplicates('Commodities', keep='first')
+    for sector in catalog.sectors:
+        mask = catalog.filter_mask(catalog.codes_for(table['Commodities']), [sector])
+        np.testing.assert_array_equal(mask, (table['Sector'] == sector).to_numpy())
@@ -0,0 +1,41 @@
+import logging
+import os
+
+import pandas as pd
+
+from modules import data_loader
+
+
+def test_derived_series_need_known_legs_and_are_reported_once(monkeypatch, caplog):
+    definitions = pd.DataFrame({
+        'Commodities': ['Brent-WTI Spread', 'Ghost Spread', 'WTI'],
+        'Expression': ['Brent - WTI', 'Brent - Unobtainium', 'WTI * 1'],
+        'Sector': 'Derived',
+    })
+    monkeypatch.setattr(data_loader, "load_derived_definitions", lambda fingerprint=None: (definitions, []))
+    data_loader.usable_derived_definitions.clear()
+
+    with caplog.at_level(logging.WARNING, logger=data_loader.__name__):
+        for _ in range(3):
+            usable = data_loader.usable_derived_definitions(('Brent', 'WTI'))
+
+    assert usable == {'Brent-WTI Spread': ('Brent - WTI', 'Derived')}
+    assert [record.getMessage() for record in caplog.records if record.name == data_loader.__name__] == [
+        "Derived series skipped (Ghost Spread: unknown commodity Unobtainium).",
+        "Derived series skipped (WTI: the name is already a commodity).",
+    ]
+
+
+def test_edited_derived_file_is_read_again(monkeypatch, tmp_path):
+    path = tmp_path / "Derived.csv"
+    monkeypatch.setattr(data_loader, "DERIVED_PATH", str(path))
+    path.write_text("Commodities,Expression\nBrent-WTI Spread,Brent - WTI\n")
+    first = data_loader.usable_derived_definitions(('Brent', 'WTI'), data_loader.derived_fingerprint())
+
+    path.write_text("Commodities,Expression\nBrent-WTI Spread,Brent - WTI\nBrent/WTI Ratio,Brent / WTI\n")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    second = data_loader.usable_derived_definitions(('Brent', 'WTI'), data_loader.derived_fingerprint())
+
+    assert list(first) == ['Brent-WTI Spread']
+    assert list(second) == ['Brent-WTI Spread', 'Brent/WTI Ratio']
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.database import DatabasePriceStore, connect, upsert_prices
+from modules.risk import RiskPanel
+from modules.seasonality import SeasonalityCube
+
+
+@pytest.fixture(scope="module")
+def prices():
+    # Daily random walks with gaps and staggered starts, spanning a few calendar years
+    rng = np.random.default_rng(11)
+    dates = pd.date_range("2020-03-01", "2023-08-31", freq="D")
+    frames = []
+    for i in range(5):
+        walk = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(dates))))
+        frame = pd.DataFrame({'Date': dates, 'Commodities': f"Commodity {i}", 'Price': walk}).iloc[i * 60:]
+        frames.append(frame[rng.random(len(frame)) > 0.1])
+    return pd.concat(frames).sort_values(['Date', 'Commodities'], ignore_index=True)
+
+
+@pytest.fixture(scope="module")
+def database(prices, tmp_path_factory):
+    db_path = tmp_path_factory.mktemp("db") / "prices.sqlite"
+    connection = connect(str(db_path))
+    try:
+        upsert_prices(connection, prices, source="test")
+    finally:
+        connection.close()
+    return DatabasePriceStore(str(db_path))
+
+
+@pytest.mark.parametrize("frequency", ['M', 'W'])
+def test_seasonality_from_the_database_matches_the_full_frame(prices, database, frequency):
+    cube = SeasonalityCube.from_source(database, frequency, batch_size=2)
+    expected = SeasonalityCube(prices, frequency)
+    assert list(cube.names) == list(expected.names)
+    np.testing.assert_array_equal(cube.years, expected.years)
+    np.testing.assert_allclose(cube.returns, expected.returns)
+
+
+def test_risk_panel_from_the_database_matches_the_full_frame(prices, database):
+    panel = RiskPanel.from_source(database, batch_size=2)
+    expected = RiskPanel(prices)
+    assert panel.dates.equals(expected.dates)
+    assert list(panel.names) == list(expected.names)
+    for date in ("2021-12-31", "2023-08-31"):
+        pd.testing.assert_frame_equal(panel.snapshot(date, "Commodity 0"), expected.snapshot(date, "Commodity 0"))
+    pd.testing.assert_frame_equal(panel.series("Commodity 3", "Commodity 0"), expected.series("Commodity 3", "Commodity 0"))
@@ -0,0 +1,24 @@
+import os
+
+import pytest
+
+from modules import loadtest
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_only_the_pinned_streamlit_release_is_spoken():
+    loadtest.check_streamlit_version(f"{loadtest.PINNED_STREAMLIT}.9")
+    with pytest.raises(RuntimeError, match="PINNED_STREAMLIT"):
+        loadtest.check_streamlit_version("1.99.0")
+
+
+def test_one_session_against_a_local_server(monkeypatch, tmp_path):
+    # The server inherits the environment: keep its data-version log out of the project
+    monkeypatch.setenv("COMMO_VERSIONS_DIR", str(tmp_path))
+    report = loadtest.run_load_test(['sector_filter'], sessions=1, iterations=1, timeout=60, project_dir=PROJECT_DIR,
+                                    warm=False, startup_timeout=120, log=lambda message: None)
+
+    assert report['errors'] == 0
+    assert list(report['reruns']['step']) == ['initial_load'] + ['sector_filter'] * 5
+    assert report['rss_after'] is None or report['rss_after'] > 0
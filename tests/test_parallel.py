@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from modules.calculations import compute_price_changes, calculate_performance_metrics, calculate_monthly_returns
+
+SECTORS = ['Energy', 'Metals', 'Agriculture']
+SHARDED = [(backend, workers) for backend in ("thread", "process") for workers in (1, 2, 8)]
+
+
+@pytest.fixture(scope="module")
+def prices():
+    # Daily random walks for a dozen commodities, with gaps and staggered first dates like the real data
+    rng = np.random.default_rng(7)
+    dates = pd.date_range("2023-01-01", "2024-06-30", freq="D")
+    frames = []
+    for i in range(12):
+        walk = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(dates))))
+        frame = pd.DataFrame({'Date': dates, 'Commodities': f"Commodity {i:02d}", 'Price': walk})
+        frame = frame.iloc[i * 10:]
+        frames.append(frame[rng.random(len(frame)) > 0.05])
+    return pd.concat(frames).sort_values(['Date', 'Commodities'], kind='stable', ignore_index=True)
+
+
+@pytest.fixture(scope="module")
+def commodity_list(prices):
+    names = sorted(prices['Commodities'].unique())
+    return pd.DataFrame({
+        'Commodities': names,
+        'Sector': [SECTORS[i % len(SECTORS)] for i in range(len(names))],
+        'Nation': 'Global',
+        'Impact': '',
+    })
+
+
+@pytest.mark.parametrize("backend, workers", SHARDED)
+@pytest.mark.parametrize("selected_date", ["2024-06-30", "2024-01-01", "2023-03-15"])
+def test_price_changes_match_serial(prices, commodity_list, selected_date, backend, workers):
+    expected = compute_price_changes(prices, commodity_list, selected_date, backend="serial")
+    result = compute_price_changes(prices, commodity_list, selected_date, backend=backend, workers=workers)
+    assert_frame_equal(result, expected)
+
+
+@pytest.mark.parametrize("backend, workers", SHARDED)
+def test_performance_metrics_match_serial(prices, backend, workers):
+    expected = calculate_performance_metrics(prices, backend="serial")
+    assert_frame_equal(calculate_performance_metrics(prices, backend=backend, workers=workers), expected)
+
+
+@pytest.mark.parametrize("backend, workers", SHARDED)
+def test_monthly_returns_match_serial(prices, backend, workers):
+    expected = calculate_monthly_returns(prices, backend="serial")
+    assert_frame_equal(calculate_monthly_returns(prices, backend=backend, workers=workers), expected)
+
+
+def test_unknown_backend_is_rejected(prices):
+    with pytest.raises(ValueError, match="Unknown execution backend"):
+        calculate_performance_metrics(prices, backend="gpu", workers=2)
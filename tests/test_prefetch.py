@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+
+from modules.prefetch import Prefetcher
+from modules.store import PriceStore
+from modules.trading_calendar import TradingCalendar
+
+
+def test_owners_are_forgotten_once_their_work_is_done():
+    rng = np.random.default_rng(5)
+    dates = pd.date_range("2023-01-01", "2023-12-31", freq="D")
+    frame = pd.concat([
+        pd.DataFrame({'Date': dates, 'Commodities': f"Commodity {i}", 'Price': 100 + rng.normal(0, 1, len(dates)).cumsum()})
+        for i in range(3)
+    ]).sort_values(['Date', 'Commodities'], ignore_index=True)
+    store = PriceStore.from_frame(frame, version="test-prefetch")
+    commodity_list = pd.DataFrame({'Commodities': store.names, 'Sector': 'Energy', 'Nation': 'Global', 'Impact': ''})
+    calendar = TradingCalendar(dates)
+
+    prefetcher = Prefetcher(workers=2)
+    for session in range(12):
+        # Sessions that schedule once or twice and then go away without calling `forget`
+        prefetcher.schedule(f"session {session}", store, commodity_list, dates[100 + session], calendar)
+        if session % 2:
+            prefetcher.schedule(f"session {session}", store, commodity_list, dates[200 + session], calendar)
+    prefetcher._executor.shutdown(wait=True)
+
+    assert prefetcher.stats['computed'] > 0
+    assert prefetcher._generations == {}
+    assert prefetcher._pending == {}
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.testing import assert_frame_equal
+
+from modules.calculations import compute_store_price_changes
+from modules.screening import ScreeningEngine, ENGINE_COLUMNS, screen_range, register_screen, SCREEN_RULES
+from modules.store import PriceStore
+from modules.trading_calendar import TradingCalendar
+
+
+@pytest.fixture(scope="module")
+def store():
+    # Two years of daily random walks with gaps, so highs and lows leave the 52W window and prices are carried over missing days
+    rng = np.random.default_rng(11)
+    dates = pd.date_range("2022-01-01", "2023-12-31", freq="D")
+    frames = []
+    for i in range(8):
+        walk = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(dates))))
+        frame = pd.DataFrame({'Date': dates, 'Commodities': f"Commodity {i}", 'Price': walk}).iloc[i * 30:]
+        frames.append(frame[rng.random(len(frame)) > 0.2])
+    return PriceStore.from_frame(pd.concat(frames).sort_values(['Date', 'Commodities'], ignore_index=True))
+
+
+@pytest.fixture(scope="module")
+def commodity_list(store):
+    return pd.DataFrame({'Commodities': store.names, 'Sector': 'Energy', 'Nation': 'Global', 'Impact': ''})
+
+
+def test_advanced_engine_matches_snapshot(store, commodity_list):
+    calendar = TradingCalendar(pd.to_datetime(store.to_frame()['Date']))
+    first = calendar.position_of(pd.Timestamp("2022-06-01"))
+    engine = ScreeningEngine.from_store(store, calendar, calendar.dates[first])
+    for position in range(first, len(calendar)):
+        date = calendar.dates[position]
+        if position > first:
+            engine.advance(date, store.to_frame(start=date, end=date))
+        if position % 37 == 0 or position == len(calendar) - 1:
+            expected = compute_store_price_changes(store, commodity_list, date, calendar)
+            result = engine.metrics(commodity_list)
+            columns = ['Commodities', *ENGINE_COLUMNS]
+            assert_frame_equal(result[columns], expected[columns], check_dtype=False)
+
+
+def test_rules_outside_the_engine_use_the_full_snapshot(store, commodity_list):
+    register_screen('Weekly gain above 5%', "`%Week` > 0.05")
+    try:
+        matches = screen_range(store, commodity_list, "2023-12-01", "2023-12-31", rules=['Weekly gain above 5%'])
+    finally:
+        del SCREEN_RULES['Weekly gain above 5%']
+    assert not matches.empty
+    assert (matches['Rule'] == 'Weekly gain above 5%').all()
@@ -0,0 +1,23 @@
+import numpy as np
+import pandas as pd
+
+from modules import trading_calendar
+from modules.calculations import compute_price_changes
+from modules.store import PriceStore
+
+
+def test_horizon_registered_after_the_calendar_is_cached(monkeypatch):
+    monkeypatch.setattr(trading_calendar, "HORIZONS", dict(trading_calendar.HORIZONS))
+    dates = pd.date_range("2023-01-02", "2023-12-29", freq="B")
+    frame = pd.DataFrame({'Date': dates, 'Commodities': "Brent", 'Price': np.linspace(70, 90, len(dates))})
+    store = PriceStore.from_frame(frame, version="test-late-horizon")
+    calendar = trading_calendar.build_trading_calendar(store, store.version)
+
+    trading_calendar.register_horizon('Since Mar', trading_calendar.since('2023-03-31'))
+    cached = trading_calendar.build_trading_calendar(store, store.version)
+    assert cached is calendar
+
+    result = compute_price_changes(frame, pd.DataFrame({'Commodities': ["Brent"], 'Sector': "Energy", 'Nation': "Global", 'Impact': ""}),
+                                   "2023-12-29", calendar=cached, horizons=('Week', 'Since Mar'))
+    base = frame.loc[frame['Date'] == "2023-03-31", 'Price'].iloc[0]
+    assert result.loc[0, '%Since Mar'] == frame['Price'].iloc[-1] / base - 1